@@ -1,30 +1,72 @@
 import os
+import re
 import time
 import json
-import socket
 import subprocess
 from datetime import datetime
 from pathlib import Path
 import threading
-import queue
 import sys
 import traceback
 
-from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_from_directory
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_from_directory, send_file
 
 # 导入配置文件
 from config import (
     SEND_WECHAT_NOTIFICATIONS,  # 添加此行
     BASE_DIR, JMETER_HOME, JMETER_BIN, JMX_DIR, HTML_DIR, JTL_DIR, LOG_DIR,
-    REMOTE_SERVERS, REPORT_URL, get_wechat_webhook,
-    LOG_LEVEL_DEBUG, LOG_LEVEL_INFO, LOG_LEVEL_WARN, LOG_LEVEL_ERROR, CURRENT_LOG_LEVEL,
+    REMOTE_SERVERS, REPORT_URL, TRANSFER_METRICS_FILE, get_wechat_webhook,
+    JTL_CHECKPOINT_INTERVAL, JTL_CHECKPOINT_COPY_DATA, JTL_CHECKPOINT_RETENTION_DAYS,
+    JTL_TRANSFER_IDLE_TIMEOUT, JTL_TRANSFER_MAX_WAIT,
+    COLUMNAR_STORE_ENABLED, DEFER_HTML_REPORT, REPORT_WORKERS, JOB_QUEUE_FILE, SLAVE_POOL_FILE,
+    SLAVE_PROBE_TIMEOUT, SLAVE_PROBE_DEADLINE, SLAVE_HEALTH_TTL, SLAVE_PROBE_INTERVAL, SLAVE_RMI_CHECK,
+    SSE_SERVER_ENABLED, SSE_SERVER_HOST, SSE_SERVER_PORT, REPORT_INDEX_FILE,
+    REPORT_PRECOMPRESS, REPORT_CACHE_MAX_AGE, REPORT_X_SENDFILE,
+    COMPARE_CACHE_DIR, COMPARE_CACHE_MAX_ENTRIES, COMPARE_CACHE_MAX_MB,
+    CAPACITY_SEARCH_FILE, CAPACITY_STEP_DURATION, CAPACITY_SLO_P95, CAPACITY_SLO_ERROR_PCT,
+    CAPACITY_PLATEAU_PCT, CAPACITY_STEP_PAUSE, STEADY_STATE_ENABLED, SLAVE_BREAKDOWN_ENABLED,
+    TIMESERIES_ENABLED, RUNNER_METRICS_ENABLED,
+    RESOURCE_MONITOR_ENABLED, RESOURCE_LOCAL_AGENT, RESOURCE_SAMPLE_INTERVAL,
+    METRICS_RECEIVER_ENABLED, METRICS_RECEIVER_HOST, METRICS_RECEIVER_PORT, METRICS_ADVERTISE_HOST, RAW_JTL_ENABLED,
+    APP_DEBUG, LOG_LEVEL_DEBUG, LOG_LEVEL_INFO, LOG_LEVEL_WARN, LOG_LEVEL_ERROR, CURRENT_LOG_LEVEL,
     create_required_directories
 )
+from jtl_stream import (
+    scan_jtl, JtlTailer, JtlCheckpoint, wait_for_transfer, read_log_summary_count,
+    cleanup_checkpoints, SUMMARY_PATTERN
+)
+from jtl_store import convert_jtl_to_columnar, load_jtl
+from jtl_stats import statistics_for_jtl, write_statistics_json
+from steady_state import steady_statistics, write_steady_window, STEADY_STATISTICS_FILE, STEADY_WINDOW_FILE
+from slave_breakdown import slave_breakdown, write_slave_breakdown, SLAVE_BREAKDOWN_FILE
+from timeseries import (
+    build_timeseries, write_timeseries, timeseries_path, TimeSeries, RESOLUTIONS, TOTAL_LABEL as TIMESERIES_TOTAL,
+    MAX_POINTS, is_timeseries_fresh
+)
+from report_jobs import ReportJobQueue
+from scheduler import JobScheduler
+from slave_pool import SlavePool, SlavePoolError, machine_ip
+from slave_probe import SlaveHealthCache
+from log_bus import LogBus
+from sse_server import SseServer
+from output_ingest import OutputIngester
+from report_index import ReportIndex, METRIC_COLUMNS
+from report_assets import precompress_report, pick_variant, mime_type, is_immutable_asset
+from compare_cache import CompareCache
+from trend import build_trend, AGGREGATES
+from resource_monitor import ResourceCollector, ResourceAgent, resources_path, load_resources, align_with_jtl
+from regression import compare_runs, ALPHA, MIN_EFFECT_PCT, MIN_ERROR_DELTA, PERCENTILE
+from capacity_search import CapacitySearchManager, MODES as CAPACITY_MODES
+from metrics import Counter, Gauge, Histogram, REGISTRY as METRICS_REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from metrics_receiver import (
+    MetricsReceiver, metrics_path, load_metrics, statistics_from_arrays, series_from_arrays, GRAPHITE_SETTLE
+)
 
 # 创建必要的目录
 create_required_directories()
 
 app = Flask(__name__)
+app.config['USE_X_SENDFILE'] = REPORT_X_SENDFILE
 
 # Import performance analysis module
 sys.path.append(str(BASE_DIR / "reportdiff" / "analysis"))
@@ -47,23 +89,30 @@ LOG_LEVEL_WARN = 2
 LOG_LEVEL_ERROR = 3
 CURRENT_LOG_LEVEL = int(os.environ.get('LOG_LEVEL', LOG_LEVEL_INFO))
 
-# Global test process and log queue
-active_test = None
-log_queue = queue.Queue()
+# Global test processes and log bus
+# 正在运行的测试，key 为运行ID（即报告目录名 "{test_name}_{date_dir}"）
+active_tests = {}
+active_tests_lock = threading.Lock()
+# 日志广播总线，每个 /api/logs 客户端都能收到完整的日志流
+log_bus = LogBus()
+# Live stats of the most recently finished test, kept for /api/live-stats
+last_live_stats = None
+
+LOG_LEVEL_NAMES = {
+    LOG_LEVEL_DEBUG: "DEBUG",
+    LOG_LEVEL_INFO: "INFO",
+    LOG_LEVEL_WARN: "WARN",
+    LOG_LEVEL_ERROR: "ERROR"
+}
 
 def log_message(level, message):
-    """Add a log message to the queue with timestamp and level"""
+    """Publish a log message to the log bus with timestamp and level"""
     if level >= CURRENT_LOG_LEVEL:
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        level_name = {
-            LOG_LEVEL_DEBUG: "DEBUG",
-            LOG_LEVEL_INFO: "INFO",
-            LOG_LEVEL_WARN: "WARN",
-            LOG_LEVEL_ERROR: "ERROR"
-        }.get(level, "INFO")
+        level_name = LOG_LEVEL_NAMES.get(level, "INFO")
         
         log_entry = f"[{timestamp}] [{level_name}] {message}"
-        log_queue.put(log_entry)
+        log_bus.publish(log_entry)
         print(log_entry)  # Also print to console for debugging
         return log_entry
     return None
@@ -80,27 +129,168 @@ def log_warn(message):
 def log_error(message):
     return log_message(LOG_LEVEL_ERROR, message)
 
-def check_jmeter_servers(servers):
-    """Check if JMeter servers are running"""
+def log_output_batch(lines, sampled=0):
+    """Publish a batch of JMeter output lines as a single log event
+
+    lines 为 [(level, line), ...]；sampled 为输出过快时被采样丢弃的行数。
+    """
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    text = '\n'.join(f"[{timestamp}] [{LOG_LEVEL_NAMES.get(level, 'INFO')}] JMeter: {line}" for level, line in lines)
+    if sampled:
+        text += f"{chr(10) if text else ''}[{timestamp}] [WARN] JMeter output too fast, {sampled} lines sampled out"
+    log_bus.publish({'message': text, 'count': len(lines), 'sampled': sampled})
+    print(text)
+    # 每批更新一次计数，读取输出的线程中没有逐行的统计开销
+    OUTPUT_BATCHES.inc()
+    OUTPUT_LINES.inc(len(lines))
+    if sampled:
+        OUTPUT_SAMPLED_LINES.inc(sampled)
+
+# 报告对比结果缓存
+compare_cache = CompareCache(COMPARE_CACHE_DIR, max_entries=COMPARE_CACHE_MAX_ENTRIES,
+                             max_bytes=COMPARE_CACHE_MAX_MB * 1024 * 1024)
+
+# 报告元数据索引
+report_index = ReportIndex(REPORT_INDEX_FILE, HTML_DIR)
+
+def finalize_report(report_dir):
+    """Index a completed report and precompress its assets"""
+    report_index.update(os.path.basename(str(report_dir)))
+    if REPORT_PRECOMPRESS and os.path.exists(os.path.join(str(report_dir), 'index.html')):
+        start = time.time()
+        created = precompress_report(report_dir)
+        log_debug(f"Precompressed {created} report assets in {time.time() - start:.1f} seconds")
+
+# 异步HTML报告生成队列，报告生成完成后更新索引并预压缩
+def report_job_complete(job):
+    REPORT_GENERATION_SECONDS.observe(job['duration'])
+    finalize_report(job['report_dir'])
+
+report_jobs = ReportJobQueue(JMETER_BIN, LOG_DIR, REPORT_WORKERS, on_log=log_message,
+                             on_complete=report_job_complete)
+
+# 测试期间各主机推送的资源监控数据
+resource_collector = ResourceCollector(on_log=log_warn)
+
+# Backend Listener 指标接收，按运行聚合每个标签每秒的数据
+metrics_receiver = MetricsReceiver(METRICS_RECEIVER_HOST, METRICS_RECEIVER_PORT, on_log=log_info)
+
+def metrics_advertise_host():
+    """Address the slaves use to reach the metrics receiver"""
+    if METRICS_ADVERTISE_HOST:
+        return METRICS_ADVERTISE_HOST
+    return re.sub(r'^\w+://', '', REPORT_URL).split('/')[0].rsplit(':', 1)[0]
+
+# slave资源池
+slave_pool = SlavePool(SLAVE_POOL_FILE, [server.strip() for server in REMOTE_SERVERS.split(',') if server.strip()])
+
+# SSE推送服务（启用时由 start_background_services 创建）
+sse_server = None
+
+# 运行器自身的监控指标，通过 /metrics 以 Prometheus 文本格式提供
+CHECK_SERVERS_SECONDS = Histogram('jmeter_runner_check_servers_seconds',
+                                  'Duration of check_jmeter_servers (cached health probes)')
+RUN_START_SECONDS = Histogram('jmeter_runner_run_start_seconds',
+                              'Duration of run_jmeter_test: slave allocation until the JMeter process is started')
+RUNS_STARTED = Counter('jmeter_runner_runs_started_total', 'JMeter runs started')
+RUN_START_FAILURES = Counter('jmeter_runner_run_start_failures_total', 'JMeter runs that failed to start',
+                             ['reason'])
+RUNS_FINISHED = Counter('jmeter_runner_runs_finished_total', 'JMeter runs finished', ['result'])
+RUN_DURATION_SECONDS = Histogram('jmeter_runner_run_duration_seconds',
+                                 'Wall time of a run from start until results were handed off',
+                                 buckets=(30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400, 28800))
+TRANSFER_WAIT_SECONDS = Histogram('jmeter_runner_transfer_wait_seconds',
+                                  'Time spent waiting for slave JTL data transfer after JMeter exited', ['complete'])
+OUTPUT_LINES = Counter('jmeter_runner_output_lines_total', 'JMeter stdout lines published to the log bus')
+OUTPUT_SAMPLED_LINES = Counter('jmeter_runner_output_sampled_lines_total',
+                               'JMeter stdout lines sampled out because output was too fast')
+OUTPUT_BATCHES = Counter('jmeter_runner_output_batches_total', 'JMeter stdout batches published to the log bus')
+COMPARE_SECONDS = Histogram('jmeter_runner_compare_seconds', 'Duration of /compare requests')
+COMPARE_REQUESTS = Counter('jmeter_runner_compare_requests_total', 'Report comparisons by outcome', ['result'])
+REPORT_FILE_SECONDS = Histogram('jmeter_runner_report_file_seconds', 'Duration of report file requests',
+                                buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+REPORT_FILE_REQUESTS = Counter('jmeter_runner_report_file_requests_total', 'Report file requests',
+                               ['status', 'encoding'])
+REPORT_GENERATION_SECONDS = Histogram('jmeter_runner_report_generation_seconds',
+                                      'Duration of background HTML report generation jobs')
+Gauge('jmeter_runner_report_jobs', 'Report generation jobs by status', ['status']).set_function(
+    lambda: {(status,): sum(1 for job in report_jobs.list() if job['status'] == status)
+             for status in ('queued', 'running', 'done', 'failed')})
+Gauge('jmeter_runner_active_tests', 'Tests currently running').set_function(lambda: len(active_tests))
+Counter('jmeter_runner_log_events_total', 'Events published to the log bus').set_function(
+    lambda: log_bus.last_seq)
+Gauge('jmeter_runner_log_subscribers', 'Log bus subscribers').set_function(log_bus.subscriber_count)
+Gauge('jmeter_runner_log_queue_depth', 'Events waiting in log subscriber buffers (sum and deepest buffer)',
+      ['kind']).set_function(lambda: dict(zip([('total',), ('max',)], log_bus.queue_depth())))
+Gauge('jmeter_runner_sse_clients', 'Connected SSE clients by stream', ['stream']).set_function(
+    lambda: {('logs',): len(sse_server.clients), ('live_stats',): sse_server.live_clients} if sse_server else {})
+Counter('jmeter_runner_metrics_receiver_lines_total', 'Backend Listener lines received').set_function(
+    lambda: metrics_receiver.lines)
+
+def get_active_test(run_id=None):
+    """Return a running test by id, or the most recently started one"""
+    with active_tests_lock:
+        if run_id:
+            return active_tests.get(run_id)
+        if not active_tests:
+            return None
+        return max(active_tests.values(), key=lambda test: test['start_time'])
+
+def get_busy_servers():
+    """Slaves used by the tests that are currently running"""
+    with active_tests_lock:
+        return set(server for test in active_tests.values() for server in test['servers'])
+
+def release_active_test(run_id):
+    with active_tests_lock:
+        active_tests.pop(run_id, None)
+
+def pool_servers():
+    """Enabled slaves of the pool"""
+    return [slave['host'] for slave in slave_pool.list() if slave['enabled']]
+
+def preferred_pool_servers():
+    """Enabled slaves in the order the scheduler assigns them: healthy first, then by capacity"""
+    slaves = [slave for slave in slave_pool.list() if slave['enabled']]
+    slaves.sort(key=lambda slave: (slave['healthy'] is False, -slave['capacity']))
+    return [slave['host'] for slave in slaves]
+
+# slave健康状态缓存，后台线程定期并发探测资源池中的全部节点
+slave_health = SlaveHealthCache(
+    lambda: slave_pool.ports(pool_servers()),
+    ttl=SLAVE_HEALTH_TTL,
+    interval=SLAVE_PROBE_INTERVAL,
+    timeout=SLAVE_PROBE_TIMEOUT,
+    deadline=SLAVE_PROBE_DEADLINE,
+    rmi_check=SLAVE_RMI_CHECK,
+    on_update=slave_pool.update_health,
+    on_log=log_warn
+)
+
+@CHECK_SERVERS_SECONDS.time()
+def check_jmeter_servers(servers, force=False):
+    """Check if JMeter servers are running
+
+    使用健康检查缓存，只有过期或没有记录的节点才会重新并发探测。
+
+    Returns:
+        dict: {server: (是否正常, 说明)}
+    """
     log_info("Starting to check remote JMeter Server status...")
-    server_list = servers.split(',')
-    for server in server_list:
-        log_info(f"Checking JMeter Server status on {server}...")
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            result = sock.connect_ex((server, 1099))
-            sock.close()
-            if result != 0:
-                log_error(f"JMeter Server on {server} is not running or cannot be connected")
-                return False
-            log_info(f"JMeter Server on {server} is running normally")
-        except Exception as e:
-            log_error(f"Error checking JMeter Server on {server}: {str(e)}")
-            return False
+    entries = slave_health.check(slave_pool.ports(servers), force=force)
+    results = {}
+    for server, entry in entries.items():
+        if entry['healthy']:
+            log_info(f"JMeter Server on {server} is running normally ({entry['latency_ms']} ms)")
+        else:
+            log_error(f"JMeter Server on {server} is not available: {entry['message']}")
+        results[server] = (entry['healthy'], entry['message'])
     
     log_info("All remote JMeter Slave Server status checks completed")
-    return True
+    return results
+
+def remote_address(server, port):
+    return server if port == 1099 else f"{server}:{port}"
 
 def send_wechat_message(message, script_name=None):
     """Send a message to WeChat robot
@@ -145,41 +335,115 @@ def send_wechat_message(message, script_name=None):
         log_error(f"Failed to send WeChat notification: {str(e)}")
         return False
 
-def run_jmeter_test(jmx_file, thread_num, test_duration, step_num=None, remote_servers=REMOTE_SERVERS):
-    """Run a JMeter test with the given parameters"""
-    global active_test
+@RUN_START_SECONDS.time()
+def run_files_exist(run_id):
+    """True if a run id is taken: running, or its report directory, JTL or JMeter log exists
+
+    调用时需持有 active_tests_lock。JTL 和 JMeter 日志按运行ID命名，与报告目录一一对应，
+    同一秒启动的不同脚本不会共用文件。
+    """
+    return (run_id in active_tests or (HTML_DIR / run_id).exists()
+            or (JTL_DIR / f"{run_id}.jtl").exists() or (LOG_DIR / f"{run_id}.log").exists())
+
+def run_jmeter_test(jmx_file, thread_num, test_duration, step_num=None, remote_servers=None,
+                    defer_report=None, slave_count=None, raw_jtl=None):
+    """Run a JMeter test with the given parameters
+
+    remote_servers 为空时从slave资源池中选择空闲的健康节点（slave_count 限制节点数）；
+    指定的节点不健康时会用池中其他空闲节点替换。
+    defer_report 为 True 时只写 JTL，HTML 报告在测试结束后由报告生成队列异步生成；
+    为 None 时使用配置 DEFER_HTML_REPORT。
+    raw_jtl 为 False 时slave不回传原始JTL（不生成HTML报告），统计数据来自 Backend Listener
+    发送到指标接收端的聚合数据；为 None 时使用配置 RAW_JTL_ENABLED。
+    """
+    if defer_report is None:
+        defer_report = DEFER_HTML_REPORT
+    if raw_jtl is None:
+        raw_jtl = RAW_JTL_ENABLED
+    if not raw_jtl and not METRICS_RECEIVER_ENABLED:
+        log_warn("Metrics receiver is disabled, raw JTL transfer stays enabled")
+        raw_jtl = True
     
     # Log level is now globally controlled, not per test
         
     if not Path(f"{JMX_DIR}/{jmx_file}.jmx").exists():
         log_error(f"JMX file not found: {jmx_file}.jmx")
+        RUN_START_FAILURES.inc(reason='jmx_not_found')
         return False
     
-    # Check if remote servers are available
-    if not check_jmeter_servers(remote_servers):
+    requested = None
+    if remote_servers:
+        requested = [server.strip() for server in remote_servers.split(',') if server.strip()]
+    
+    # 从资源池分配健康的空闲slave，并按各节点承载能力分配线程数
+    try:
+        allocation = slave_pool.allocate(thread_num, check_jmeter_servers, servers=requested,
+                                         slave_count=slave_count, exclude=get_busy_servers())
+    except SlavePoolError as e:
+        log_error(f"Failed to allocate JMeter servers: {str(e)}")
+        RUN_START_FAILURES.inc(reason='allocation')
         return False
+    if allocation['dropped']:
+        log_warn(f"Unhealthy JMeter servers dropped: {', '.join(allocation['dropped'])}")
+    for old, new in allocation['replaced'].items():
+        log_warn(f"JMeter server {old} replaced by {new}")
+    if allocation['unused']:
+        log_info(f"Fewer users than JMeter servers, not using: {', '.join(allocation['unused'])}")
+    server_list = allocation['servers']
+    server_threads = allocation['threads']
+    ports = slave_pool.ports(server_list)
+    remote_servers = ','.join(remote_address(server, ports[server]) for server in server_list)
     
     # Calculate actual thread count
-    server_count = len(remote_servers.split(','))
-    threads_per_server = -(-thread_num // server_count)  # Ceiling division to round up
-    actual_thread_num = threads_per_server * server_count
+    actual_thread_num = sum(server_threads.values())
+    threads_per_server = -(-actual_thread_num // len(server_list))
+    test_name = f"{jmx_file}-{actual_thread_num}Vuser"
+    log_info(f"Thread distribution: {', '.join(f'{server}={count}' for server, count in server_threads.items())}")
+    
+    # 预留slave并分配唯一的运行ID，使用相同slave的测试不能同时运行
+    with active_tests_lock:
+        busy = set(server for test in active_tests.values() for server in test['servers'])
+        if busy & set(server_list):
+            log_error(f"JMeter servers already in use by another test: {', '.join(sorted(busy & set(server_list)))}")
+            RUN_START_FAILURES.inc(reason='servers_busy')
+            return False
+        date_dir = datetime.now().strftime('%Y%m%d%H%M%S')
+        while run_files_exist(f"{test_name}_{date_dir}"):
+            time.sleep(1)
+            date_dir = datetime.now().strftime('%Y%m%d%H%M%S')
+        run_id = f"{test_name}_{date_dir}"
+        run = {
+            'id': run_id,
+            'process': None,
+            'start_time': datetime.now(),
+            'jmx_file': jmx_file,
+            'thread_num': thread_num,
+            'test_duration': test_duration,
+            'test_name': test_name,
+            'date_dir': date_dir,
+            'servers': server_list,
+            'threads': server_threads,
+            'done': threading.Event(),
+            'exit_code': None
+        }
+        active_tests[run_id] = run
     
     # Create test name and report directory
-    test_name = f"{jmx_file}-{actual_thread_num}Vuser"
-    date_dir = datetime.now().strftime('%Y%m%d%H%M%S')
-    report_dir = HTML_DIR / f"{test_name}_{date_dir}"
+    report_dir = HTML_DIR / run_id
     
     try:
         os.makedirs(report_dir, exist_ok=True)
         log_info(f"Created report directory: {report_dir}")
     except Exception as e:
         log_error(f"Failed to create report directory: {str(e)}")
+        release_active_test(run_id)
+        RUN_START_FAILURES.inc(reason='report_dir')
         return False
     
     # Construct JMeter command
     target_jmx = f"{JMX_DIR}/{jmx_file}.jmx"
-    jtl_file = f"{JTL_DIR}/report-{actual_thread_num}_{date_dir}.jtl"
-    jmeter_log = f"{LOG_DIR}/report-{actual_thread_num}_{date_dir}.log"
+    jtl_file = f"{JTL_DIR}/{run_id}.jtl"
+    jmeter_log = f"{LOG_DIR}/{run_id}.log"
     
     cmd = [
         f"{JMETER_BIN}/jmeter",
@@ -189,11 +453,36 @@ def run_jmeter_test(jmx_file, thread_num, test_duration, step_num=None, remote_s
         "-Ghold_time", str(test_duration),
         "-Gserver.rmi.ssl.disable=true",
         "-R", remote_servers,
-        "-l", jtl_file,
-        "-e",
-        "-o", str(report_dir),
         "-j", jmeter_log
     ]
+    if raw_jtl:
+        cmd.extend(["-l", jtl_file])
+    
+    # Backend Listener 发送指标的地址，application 用于把数据归入本次运行
+    if METRICS_RECEIVER_ENABLED:
+        cmd.extend([
+            "-Gmetrics_host", metrics_advertise_host(),
+            "-Gmetrics_port", str(METRICS_RECEIVER_PORT),
+            "-Gmetrics_application", run_id
+        ])
+    
+    # -G 属性对所有slave相同：users 为平均线程数；节点承载能力不同时额外传入每台的
+    # users_<ip>，脚本使用 ${__P(users_${__machineIP()},${__P(users)})} 即可按权重分配。
+    # __machineIP() 返回IP地址，以主机名登记的slave需要先解析
+    if len(set(server_threads.values())) > 1:
+        for server, count in server_threads.items():
+            ip = machine_ip(server)
+            if ip is None:
+                log_warn(f"Cannot resolve JMeter server {server} to an IP address, "
+                         f"it will run the average of {threads_per_server} users instead of {count}")
+                continue
+            if ip != server:
+                log_debug(f"JMeter server {server} resolved to {ip} for users_{ip}")
+            cmd.append(f"-Gusers_{ip}={count}")
+    
+    # 非延迟模式下由JMeter在测试结束后直接生成HTML报告
+    if raw_jtl and not defer_report:
+        cmd.extend(["-e", "-o", str(report_dir)])
 
     if step_num is not None:
         cmd.extend([
@@ -205,97 +494,322 @@ def run_jmeter_test(jmx_file, thread_num, test_duration, step_num=None, remote_s
     log_info(f"Test start time: {test_start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     
     # Start JMeter process
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-        bufsize=1
-    )
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+    except Exception as e:
+        log_error(f"Failed to start JMeter process: {str(e)}")
+        release_active_test(run_id)
+        RUN_START_FAILURES.inc(reason='process')
+        return False
+    RUNS_STARTED.inc()
+    
+    # 测试期间收到的资源监控数据写入 JTL 旁边的 .resources.jsonl
+    if RESOURCE_MONITOR_ENABLED:
+        resource_collector.begin(run_id, resources_path(jtl_file), server_list)
+    run_metrics = metrics_receiver.begin(run_id, metrics_path(jtl_file)) if METRICS_RECEIVER_ENABLED else None
+    
+    # 运行期间从输出中收集的状态，例如最新的 "summary =" 样本数
+    run_state = {'expected_samples': None}
     
-    # 添加输出读取线程
+    # 添加输出读取线程：按块读取并按时间窗口批量发布，输出过快时采样
     def read_output(process):
-        for line in process.stdout:
-            line = line.strip()
-            if line:
-                # Process JMeter output with appropriate log level
-                if "ERROR" in line or "FATAL" in line:
-                    log_error(f"JMeter: {line}")
-                elif "WARN" in line:
-                    log_warn(f"JMeter: {line}")
-                elif "DEBUG" in line or "INFO" in line or CURRENT_LOG_LEVEL <= LOG_LEVEL_DEBUG:
-                    # Always show DEBUG lines if in debug mode
-                    log_debug(f"JMeter: {line}")
-                else:
-                    # Default to INFO for other lines
-                    log_info(f"JMeter: {line}")
+        def parse_summary(text):
+            if 'summary =' in text:
+                matches = SUMMARY_PATTERN.findall(text)
+                if matches:
+                    run_state['expected_samples'] = int(matches[-1])
+        
+        ingester = OutputIngester(process.stdout.fileno(), log_output_batch, on_text=parse_summary,
+                                  min_level=CURRENT_LOG_LEVEL)
+        total_lines, sampled = ingester.run()
+        run_state['output_lines'] = total_lines
+        run_state['output_sampled'] = sampled
+        if sampled:
+            log_warn(f"JMeter output: {sampled} of {total_lines} lines were sampled out under load")
     
     # 启动读取输出的线程
     output_thread = threading.Thread(target=read_output, args=(process,))
     output_thread.daemon = True
     output_thread.start()
     
-    active_test = {
+    # 测试运行期间实时跟踪JTL文件并汇总统计数据；不回传JTL时使用接收到的聚合指标
+    tailer = JtlTailer(jtl_file).start() if raw_jtl else run_metrics
+    
+    run.update({
         'process': process,
         'start_time': test_start_time,
-        'jmx_file': jmx_file,
-        'thread_num': thread_num,
         'actual_thread_num': actual_thread_num,
-        'test_duration': test_duration,
-        'test_name': test_name,
-        'date_dir': date_dir,
         'jtl_file': jtl_file,
         'jmeter_log': jmeter_log,
-        'report_dir': str(report_dir)
-    }
+        'report_dir': str(report_dir),
+        'tailer': tailer,
+        'run_state': run_state,
+        'defer_report': defer_report,
+        'raw_jtl': raw_jtl
+    })
     
     # Start a thread to monitor the process and tail the log
     monitor_thread = threading.Thread(
         target=monitor_jmeter_process,
-        args=(process, jmeter_log, jtl_file, test_name, date_dir, test_start_time, actual_thread_num)
+        args=(process, jmeter_log, jtl_file, test_name, date_dir, test_start_time, actual_thread_num, run)
     )
     monitor_thread.daemon = True
     monitor_thread.start()
     
-    return True
+    return run
 
 def validate_jtl_file(jtl_file):
     """验证JTL文件的完整性"""
     try:
-        if not os.path.exists(jtl_file):
-            return False, "文件不存在"
-        
-        file_size = os.path.getsize(jtl_file)
-        if file_size == 0:
-            return False, "文件大小为0"
-        
-        with open(jtl_file, 'r') as f:
-            # 检查第一行（标题行）
-            header = f.readline().strip()
-            if not header or 'timeStamp' not in header:
-                return False, "文件格式不正确，缺少timeStamp列"
-            
-            # 计算数据行数
-            data_lines = sum(1 for _ in f)
-            
-            # 回到文件开头
-            f.seek(0)
-            
-            # 检查最后一行是否包含完整数据
-            lines = f.readlines()
-            if lines and len(lines) > 1:
-                last_line = lines[-1].strip()
-                if not last_line or len(last_line.split(',')) < 5:  # 简单检查CSV格式是否完整
-                    return False, "最后一行数据不完整"
-            
-            return True, f"文件验证通过，包含{data_lines}条数据记录"
-            
+        result = scan_jtl(jtl_file)
+        if result['malformed']:
+            log_warn(f"JTL file {jtl_file} has {result['malformed']} malformed rows, "
+                     f"byte offsets: {result['malformed_offsets']}")
+        return result['valid'], result['message']
     except Exception as e:
         return False, f"验证过程出错: {str(e)}"
 
-def monitor_jmeter_process(process, log_file, jtl_file, test_name, date_dir, start_time, actual_thread_num):
+def record_transfer_metrics(test_name, date_dir, transfer, transfer_duration, expected_rows):
+    """Append the timing of the JTL transfer phase to the transfer metrics file"""
+    entry = {
+        'test_name': test_name,
+        'date_dir': date_dir,
+        'transfer_seconds': round(transfer_duration, 3),
+        'complete': transfer['complete'],
+        'reason': transfer['reason'],
+        'mode': transfer['mode'],
+        'events': transfer['events'],
+        'rows': transfer['rows'],
+        'expected_rows': expected_rows,
+        'bytes': transfer['bytes']
+    }
+    try:
+        with open(TRANSFER_METRICS_FILE, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+    except Exception as e:
+        log_warn(f"Failed to record transfer metrics: {str(e)}")
+
+def report_jtl_path(report_dir_name):
+    """JTL path that belongs to a report directory, whether or not the file exists
+
+    JTL 与报告目录同名（"{jmx}-{N}Vuser_{date}.jtl"）；旧版本生成的报告对应
+    "report-{N}_{date}.jtl"，只有旧文件存在而新文件不存在时才返回旧路径。
+    """
+    if '_' not in report_dir_name:
+        return None
+    jtl_file = JTL_DIR / f"{report_dir_name}.jtl"
+    test_name, date_str = report_dir_name.rsplit('_', 1)
+    match = re.search(r'-(\d+)Vuser$', test_name)
+    if match and not jtl_file.exists():
+        legacy = JTL_DIR / f"report-{match.group(1)}_{date_str}.jtl"
+        if legacy.exists():
+            return legacy
+    return jtl_file
+
+def find_report_jtl(report_dir_name):
+    """Locate the JTL file that belongs to a report directory"""
+    jtl_file = report_jtl_path(report_dir_name)
+    return jtl_file if jtl_file is not None and jtl_file.exists() else None
+
+# 同一报告的派生文件（statistics.json、稳态统计、时间序列、slave拆分）由测试结束后的
+# 后台处理和按需分析接口共同生成，按报告串行化
+report_locks = {}
+report_locks_guard = threading.Lock()
+# 测试进程已结束、结果仍在后台处理中的报告
+post_processing = set()
+
+def report_lock(report_dir_name):
+    with report_locks_guard:
+        lock = report_locks.get(report_dir_name)
+        if lock is None:
+            lock = report_locks[report_dir_name] = threading.RLock()
+        return lock
+
+def ensure_report_statistics(report_dir_name):
+    """Return the statistics.json path of a report, computing it from the JTL if missing"""
+    with report_lock(report_dir_name):
+        statistics_file = HTML_DIR / report_dir_name / "statistics.json"
+        if statistics_file.exists():
+            return statistics_file
+        jtl_file = find_report_jtl(report_dir_name)
+        if jtl_file is None:
+            return None
+        start = time.time()
+        statistics = statistics_for_jtl(str(jtl_file))
+        os.makedirs(statistics_file.parent, exist_ok=True)
+        write_statistics_json(statistics, statistics_file)
+        log_info(f"Computed statistics.json for {report_dir_name} from JTL in {time.time() - start:.1f} seconds")
+        return statistics_file
+
+def ensure_steady_statistics(report_dir_name):
+    """Return the statistics_steady.json path of a report, detecting the steady-state window if missing"""
+    with report_lock(report_dir_name):
+        statistics_file = HTML_DIR / report_dir_name / STEADY_STATISTICS_FILE
+        if statistics_file.exists() and (statistics_file.parent / STEADY_WINDOW_FILE).exists():
+            return statistics_file
+        jtl_file = find_report_jtl(report_dir_name)
+        if jtl_file is None:
+            return None
+        start = time.time()
+        window, statistics, samples = steady_statistics(load_jtl(str(jtl_file)))
+        if not statistics:
+            return None
+        os.makedirs(statistics_file.parent, exist_ok=True)
+        write_steady_window(window, statistics_file.parent)
+        write_statistics_json(statistics, statistics_file)
+        log_info(f"Steady-state window of {report_dir_name}: {window['start_offset_s']}s-{window['end_offset_s']}s "
+                 f"of {window['total_duration_s']}s ({window['method']}), {samples} samples, "
+                 f"computed in {time.time() - start:.1f} seconds")
+        if not window['reliable']:
+            log_warn(f"Steady-state window of {report_dir_name} is short, trimmed statistics may not be representative")
+        return statistics_file
+
+def ensure_slave_breakdown(report_dir_name):
+    """Return the per-slave breakdown of a report, computing slave_breakdown.json if missing
+
+    JTL 中没有 slave 信息（非分布式测试或只有一台 slave）时返回 None
+    """
+    with report_lock(report_dir_name):
+        breakdown_file = HTML_DIR / report_dir_name / SLAVE_BREAKDOWN_FILE
+        if breakdown_file.exists():
+            with open(breakdown_file, 'r') as f:
+                return json.load(f)
+        jtl_file = find_report_jtl(report_dir_name)
+        if jtl_file is None:
+            return None
+        start = time.time()
+        breakdown = slave_breakdown(load_jtl(str(jtl_file)))
+        if breakdown is None:
+            return None
+        os.makedirs(breakdown_file.parent, exist_ok=True)
+        write_slave_breakdown(breakdown, breakdown_file.parent)
+        log_info(f"Per-slave breakdown of {report_dir_name}: {len(breakdown['hosts'])} slaves "
+                 f"computed in {time.time() - start:.1f} seconds")
+        for entry in breakdown['hosts']:
+            if entry['outlier']:
+                log_warn(f"Slave {entry['host']} deviates from the other slaves ({', '.join(entry['reasons'])}): "
+                         f"p95 {entry['p95']:.0f} ms, connect {entry['connect_mean'] or 0:.1f} ms, "
+                         f"error rate {entry['error_pct']:.2f}%; the load generator may be the bottleneck")
+        return breakdown
+
+def ensure_timeseries(report_dir_name):
+    """Return the time-series pyramid path of a report, building it from the JTL if missing or outdated"""
+    with report_lock(report_dir_name):
+        jtl_file = find_report_jtl(report_dir_name)
+        if jtl_file is None:
+            return None
+        path = timeseries_path(jtl_file)
+        if is_timeseries_fresh(path, jtl_file):
+            return path
+        start = time.time()
+        pyramid = build_timeseries(load_jtl(str(jtl_file)))
+        if pyramid is None:
+            return None
+        write_timeseries(pyramid, path)
+        log_info(f"Time-series rollups of {report_dir_name} built in {time.time() - start:.1f} seconds "
+                 f"({os.path.getsize(path)} bytes)")
+        return path
+
+def process_run_results(jtl_file, report_dir, defer_report=False):
+    """Post-process a finished run's JTL in the background"""
+    try:
+        if COLUMNAR_STORE_ENABLED:
+            try:
+                start = time.time()
+                store = convert_jtl_to_columnar(jtl_file)
+                log_info(f"JTL converted to columnar store {store} in {time.time() - start:.1f} seconds")
+            except Exception as e:
+                log_warn(f"Failed to convert JTL to columnar store: {str(e)}")
+    
+        # JMeter未生成statistics.json时（例如HTML报告生成失败），用统计引擎直接从JTL计算
+        if report_dir:
+            try:
+                ensure_report_statistics(os.path.basename(report_dir))
+            except Exception as e:
+                log_warn(f"Failed to compute statistics from JTL: {str(e)}")
+    
+        # 去掉加压/减压阶段后的稳态统计，与完整统计一起保存
+        if report_dir and STEADY_STATE_ENABLED:
+            try:
+                ensure_steady_statistics(os.path.basename(report_dir))
+            except Exception as e:
+                log_warn(f"Failed to compute steady-state statistics: {str(e)}")
+    
+        # 预先计算 1s/10s/1min/10min 时间序列，供随时间变化的图表缩放查询
+        if report_dir and TIMESERIES_ENABLED:
+            try:
+                ensure_timeseries(os.path.basename(report_dir))
+            except Exception as e:
+                log_warn(f"Failed to build time-series rollups: {str(e)}")
+    
+        # 按slave拆分统计，找出自身成为瓶颈的压测机
+        if report_dir and SLAVE_BREAKDOWN_ENABLED:
+            try:
+                ensure_slave_breakdown(os.path.basename(report_dir))
+            except Exception as e:
+                log_warn(f"Failed to compute per-slave breakdown: {str(e)}")
+    
+        if report_dir:
+            try:
+                finalize_report(report_dir)
+            except Exception as e:
+                log_warn(f"Failed to finalize report: {str(e)}")
+    
+        # 延迟模式：统计数据已可用于对比，HTML报告交给后台队列生成
+        if defer_report and report_dir:
+            report_jobs.submit(jtl_file, report_dir)
+    finally:
+        if report_dir:
+            with active_tests_lock:
+                post_processing.discard(os.path.basename(report_dir))
+
+def process_metrics_results(jtl_file, report_dir):
+    """Write statistics.json of a run without raw JTL from its Backend Listener metrics"""
+    arrays = load_metrics(metrics_path(jtl_file))
+    if arrays is None or not len(arrays['second']):
+        log_warn("No Backend Listener metrics were received, the run has no statistics")
+        return
+    statistics = statistics_from_arrays(arrays)
+    write_statistics_json(statistics, os.path.join(report_dir, "statistics.json"))
+    finalize_report(report_dir)
+    log_info(f"Computed statistics.json from Backend Listener metrics for {len(statistics) - 1} labels")
+
+def monitor_jmeter_process(process, log_file, jtl_file, test_name, date_dir, start_time, actual_thread_num, run):
     """Monitor JMeter process and handle completion"""
-    global active_test
+    try:
+        handle_jmeter_exit(process, log_file, jtl_file, test_name, date_dir, start_time, actual_thread_num, run)
+    except Exception as e:
+        log_error(f"Error while finishing test {run['id']}: {str(e)}")
+        log_debug(traceback.format_exc())
+    finally:
+        # 无论结果处理是否出错都要释放slave，并通知调度器启动下一个排队的任务
+        exit_code = run.get('exit_code')
+        if exit_code is None:
+            exit_code = run['exit_code'] = process.poll()
+        success = exit_code == 0
+        RUNS_FINISHED.inc(result='success' if success else 'failure')
+        RUN_DURATION_SECONDS.observe((datetime.now() - start_time).total_seconds())
+        try:
+            # 正常结束时已经停止和保存，这里只清理异常中断后遗留的状态
+            if run.get('tailer'):
+                run['tailer'].stop()
+            if METRICS_RECEIVER_ENABLED:
+                metrics_receiver.end(run['id'])
+            resource_collector.end(run['id'])
+            slave_pool.record_run(run['threads'], success)
+        except Exception as e:
+            log_warn(f"Failed to clean up test {run['id']}: {str(e)}")
+        release_active_test(run['id'])
+        run['done'].set()
+        job_scheduler.notify_finished(run['id'], success)
+
+def handle_jmeter_exit(process, log_file, jtl_file, test_name, date_dir, start_time, actual_thread_num, run):
+    """Wait for JMeter to exit, collect the results and send the notification"""
+    global last_live_stats
     
     # 创建诊断日志文件
     transfer_log_file = f"{LOG_DIR}/transfer_{test_name}_{date_dir}.log"
@@ -317,7 +831,7 @@ def monitor_jmeter_process(process, log_file, jtl_file, test_name, date_dir, sta
             pass  # 忽略记录诊断日志的错误
     
     # Wait for process to complete
-    exit_code = process.wait()
+    exit_code = run['exit_code'] = process.wait()
     log_info(f"JMeter process completed with exit code: {exit_code}")
     write_transfer_log(f"JMeter进程退出，退出码: {exit_code}")
     
@@ -342,109 +856,158 @@ def monitor_jmeter_process(process, log_file, jtl_file, test_name, date_dir, sta
         except Exception as e:
             log_warn(f"Could not read JMeter log file: {str(e)}")
     
-    # Wait for JTL file to stabilize (data transfer completion)
-    log_info("Waiting for slave data transfer to complete...")
-    write_transfer_log("开始等待从节点数据回传...")
-    
-    prev_size = 0
-    stable_count = 0
-    wait_count = 0  # 添加等待计数
-    max_wait = 60   # 最多等待60次，约120秒
+    tailer = run.get('tailer')
     jtl_file_exists = False
-    transfer_start_time = datetime.now()
+    if not run['raw_jtl']:
+        # 未回传原始JTL，无需等待数据回传；等待 Backend Listener 最后一批指标到达
+        log_info("Raw JTL transfer disabled, using Backend Listener metrics")
+        write_transfer_log("未回传原始JTL，统计数据来自 Backend Listener 指标")
+        time.sleep(GRAPHITE_SETTLE)
+    else:
+        # Wait for JTL file to stabilize (data transfer completion)
+        log_info("Waiting for slave data transfer to complete...")
+        write_transfer_log("开始等待从节点数据回传...")
+    
+        # 文件持续增长时一直等待，连续 JTL_TRANSFER_IDLE_TIMEOUT 秒无变化才放弃
+        idle_timeout = JTL_TRANSFER_IDLE_TIMEOUT
+        transfer_start_time = datetime.now()
     
-    # JTL文件回传检测
-    while True:
+        # 期望样本数优先取JMeter标准输出中的"summary ="行，其次从日志文件末尾查找
+        expected_rows = run['run_state'].get('expected_samples')
+        if expected_rows is None:
+            try:
+                expected_rows = read_log_summary_count(log_file)
+            except Exception as e:
+                log_debug(f"Could not read summary count from JMeter log: {str(e)}")
+        if expected_rows is not None:
+            log_info(f"Expecting at least {expected_rows} samples in JTL file (JMeter summary)")
+            write_transfer_log(f"JMeter汇总样本数: {expected_rows}")
+    
+        def count_rows():
+            if tailer:
+                tailer.poll()
+                return tailer.rows
+            return scan_jtl(jtl_file)['rows']
+    
+        # 清理过期的检查点，并为本次测试创建增量检查点
         try:
-            if os.path.exists(jtl_file):
-                jtl_file_exists = True
-                current_size = os.path.getsize(jtl_file)
-                log_info(f"JTL file size: {current_size} bytes (previous: {prev_size} bytes)")
-                write_transfer_log(f"JTL文件大小: {current_size} 字节 (之前: {prev_size} 字节)")
-                
-                # 定期备份JTL文件
-                if wait_count % 10 == 0 and current_size > 0:
-                    try:
-                        backup_file = f"{jtl_file}.{wait_count}.bak"
-                        import shutil
-                        shutil.copy2(jtl_file, backup_file)
-                        write_transfer_log(f"创建JTL文件备份: {backup_file}")
-                    except Exception as e:
-                        write_transfer_log(f"创建JTL文件备份失败: {str(e)}")
-                
-                if current_size == prev_size:
-                    stable_count += 1
-                    log_info(f"JTL file size stable for {stable_count} checks")
-                    write_transfer_log(f"JTL文件大小已稳定 {stable_count} 次检查")
-                    
-                    if stable_count >= 3:
-                        log_info(f"Data transfer complete, final file size: {current_size} bytes")
-                        write_transfer_log(f"数据回传完成，最终文件大小: {current_size} 字节")
-                        
-                        # 验证JTL文件完整性
+            removed = cleanup_checkpoints(JTL_DIR, JTL_CHECKPOINT_RETENTION_DAYS * 86400)
+            if removed:
+                log_info(f"Removed {removed} expired JTL checkpoint files")
+        except Exception as e:
+            log_warn(f"Failed to clean up JTL checkpoints: {str(e)}")
+        checkpoint = JtlCheckpoint(jtl_file, copy_data=JTL_CHECKPOINT_COPY_DATA)
+        progress = {'size': -1, 'last_log': 0, 'last_checkpoint': time.monotonic()}
+    
+        def on_progress(rows, size):
+            now = time.monotonic()
+            if size != progress['size'] and now - progress['last_log'] >= 2:
+                log_info(f"JTL file size: {size} bytes, {rows} samples")
+                write_transfer_log(f"JTL文件大小: {size} 字节，{rows} 条记录")
+                progress['size'], progress['last_log'] = size, now
+        
+            # 定期增量检查点，只处理上次检查点之后新增的数据
+            if size > 0 and now - progress['last_checkpoint'] >= JTL_CHECKPOINT_INTERVAL:
+                progress['last_checkpoint'] = now
+                try:
+                    added = checkpoint.update()
+                    if added:
+                        write_transfer_log(f"JTL增量检查点: +{added} 字节，累计 {checkpoint.size} 字节")
+                except Exception as e:
+                    write_transfer_log(f"创建JTL检查点失败: {str(e)}")
+    
+        # JTL文件回传检测：由文件变更事件驱动，不再固定间隔轮询
+        try:
+            transfer = wait_for_transfer(jtl_file, count_rows, expected_rows=expected_rows,
+                                         timeout=idle_timeout, on_progress=on_progress,
+                                         max_wait=JTL_TRANSFER_MAX_WAIT)
+        except Exception as e:
+            log_warn(f"Failed to watch JTL file: {str(e)}")
+            write_transfer_log(f"监听JTL文件失败: {str(e)}")
+            transfer = {'complete': False, 'reason': 'error', 'rows': 0, 'bytes': 0,
+                        'events': 0, 'mode': 'none', 'seconds': 0.0}
+        jtl_file_exists = os.path.exists(jtl_file)
+    
+        if transfer['complete']:
+            log_info(f"Data transfer complete ({transfer['reason']}), final file size: {transfer['bytes']} bytes")
+            write_transfer_log(f"数据回传完成（{transfer['reason']}），最终文件大小: {transfer['bytes']} 字节")
+        elif jtl_file_exists:
+            log_warn(f"JTL transfer stopped ({transfer['reason']}), proceeding with potentially incomplete JTL file")
+            write_transfer_log(f"数据回传等待结束（{transfer['reason']}），将继续处理可能不完整的JTL文件")
+        else:
+            log_warn(f"JTL file {jtl_file} not found after {idle_timeout} seconds, giving up")
+            write_transfer_log(f"在{idle_timeout}秒后仍未找到JTL文件，放弃等待")
+    
+        if jtl_file_exists:
+            # 验证JTL文件完整性
+            is_valid, message = validate_jtl_file(jtl_file)
+            write_transfer_log(f"JTL文件验证: {message}")
+            if not is_valid and checkpoint.segments:
+                # JTL与检查点不一致时尝试从检查点恢复
+                try:
+                    recovered, recover_message = checkpoint.recover()
+                    write_transfer_log(recover_message)
+                    if recovered:
+                        log_warn(f"JTL file recovered from checkpoint: {recover_message}")
                         is_valid, message = validate_jtl_file(jtl_file)
-                        write_transfer_log(f"JTL文件验证: {message}")
-                        
-                        if is_valid:
-                            log_info(f"JTL file validation: {message}")
-                            # 通过所有检查，数据回传完成
-                            break
-                        else:
-                            log_warn(f"JTL file validation failed: {message}")
-                            write_transfer_log(f"警告: JTL文件验证失败: {message}")
-                            
-                            if wait_count < max_wait:
-                                # 继续等待
-                                stable_count = 0
-                                wait_count += 1
-                                time.sleep(2)
-                                continue
-                            else:
-                                log_warn("Max wait time reached, proceeding with potentially incomplete JTL file")
-                                write_transfer_log("已达到最大等待时间，将继续处理可能不完整的JTL文件")
-                                break
-                else:
-                    # 文件大小变化，重置稳定计数
-                    stable_count = 0
-                    # 如果文件在增长，重置等待计数
-                    if current_size > prev_size:
-                        wait_count = 0
-                        
-                prev_size = current_size
+                        write_transfer_log(f"恢复后JTL文件验证: {message}")
+                except Exception as e:
+                    log_warn(f"Failed to recover JTL file from checkpoint: {str(e)}")
+                    write_transfer_log(f"从检查点恢复JTL文件失败: {str(e)}")
+            if is_valid:
+                log_info(f"JTL file validation: {message}")
+                checkpoint.discard()
             else:
-                # JTL文件不存在
-                wait_count += 1
-                log_info(f"Waiting for JTL file to be created... ({wait_count}/{max_wait})")
-                write_transfer_log(f"等待JTL文件创建... ({wait_count}/{max_wait})")
-                
-                if wait_count >= max_wait:
-                    log_warn(f"JTL file {jtl_file} not found after {max_wait} attempts, giving up")
-                    write_transfer_log(f"在{max_wait}次尝试后仍未找到JTL文件，放弃等待")
-                    break
+                log_warn(f"JTL file validation failed: {message}")
+                write_transfer_log(f"警告: JTL文件验证失败: {message}")
+    
+        # 计算数据回传总时间
+        transfer_end_time = datetime.now()
+        transfer_duration = (transfer_end_time - transfer_start_time).total_seconds()
+        log_info(f"Data transfer monitoring completed in {transfer_duration:.1f} seconds")
+        write_transfer_log(f"数据回传监控完成，耗时 {transfer_duration:.1f} 秒")
+        record_transfer_metrics(test_name, date_dir, transfer, transfer_duration, expected_rows)
+        TRANSFER_WAIT_SECONDS.observe(transfer_duration, complete=str(bool(transfer['complete'])).lower())
+    
+    # 指标接收结束，保存本次运行的时间序列
+    if METRICS_RECEIVER_ENABLED:
+        try:
+            run_metrics = metrics_receiver.end(run['id'])
+            if run_metrics is not None and run_metrics.records:
+                log_info(f"Backend Listener metrics: {run_metrics.records} records, {run_metrics.rows} samples "
+                         f"saved to {run_metrics.path}")
         except Exception as e:
-            log_warn(f"Failed to get file size: {str(e)}")
-            write_transfer_log(f"获取文件大小失败: {str(e)}")
-            
-            wait_count += 1
-            if wait_count >= max_wait:
-                log_warn(f"Failed to get file size after {max_wait} attempts, giving up")
-                write_transfer_log(f"在{max_wait}次尝试后仍无法获取文件大小，放弃等待")
-                break
-        
-        time.sleep(2)
+            log_warn(f"Failed to save Backend Listener metrics: {str(e)}")
     
-    # 计算数据回传总时间
-    transfer_end_time = datetime.now()
-    transfer_duration = (transfer_end_time - transfer_start_time).total_seconds()
-    log_info(f"Data transfer monitoring completed in {transfer_duration:.1f} seconds")
-    write_transfer_log(f"数据回传监控完成，耗时 {transfer_duration:.1f} 秒")
+    # 读取剩余数据并保留最终的实时统计结果
+    if tailer:
+        try:
+            tailer.stop()
+            last_live_stats = tailer.snapshot()
+        except Exception as e:
+            log_warn(f"Failed to finalize live stats: {str(e)}")
     
     # JTL数据回传处理完毕，检查是否成功
-    if not jtl_file_exists and exit_code == 0:
+    if run['raw_jtl'] and not jtl_file_exists and exit_code == 0:
         log_warn("JMeter process completed successfully, but JTL file was not created")
         write_transfer_log("警告: JMeter进程成功完成，但未创建JTL文件")
         # 这种情况可能是JMeter配置问题，或者存储权限问题
     
+    # 后台处理测试结果（列式存储转换等），不阻塞下一次测试
+    if jtl_file_exists:
+        # 运行释放后报告仍视为未完成，直到后台处理结束
+        with active_tests_lock:
+            post_processing.add(run['id'])
+        results_thread = threading.Thread(target=process_run_results,
+                                          args=(jtl_file, run['report_dir'], run['defer_report']))
+        results_thread.daemon = True
+        results_thread.start()
+    elif not run['raw_jtl']:
+        try:
+            process_metrics_results(jtl_file, run['report_dir'])
+        except Exception as e:
+            log_warn(f"Failed to compute statistics from Backend Listener metrics: {str(e)}")
+    
     # Test completed
     end_time = datetime.now()
     duration_seconds = (end_time - start_time).total_seconds()
@@ -475,7 +1038,7 @@ def monitor_jmeter_process(process, log_file, jtl_file, test_name, date_dir, sta
         
         # 从测试名称中提取脚本名称 for WeChat webhook routing
         # Default to 'default' if jmx_file is not found or is empty
-        jmx_file_for_notification = active_test.get('jmx_file') if active_test else None
+        jmx_file_for_notification = run.get('jmx_file')
         script_name_for_notification = jmx_file_for_notification if jmx_file_for_notification else 'default'
         
         # 使用提取或默认的脚本名称发送微信通知
@@ -516,8 +1079,6 @@ def monitor_jmeter_process(process, log_file, jtl_file, test_name, date_dir, sta
         wechat_message += f"- 失败原因: JMeter进程异常终止，退出码: {exit_code}\n"
         wechat_message += f"- 请检查日志文件: {log_file}\n"
         send_wechat_message(wechat_message)
-    
-    active_test = None
 
 def tail_log_file(log_file):
     """Generator to tail a log file and yield new lines"""
@@ -600,30 +1161,20 @@ def get_performance_data():
     response.headers['Expires'] = '0'
     return response
 
-@app.route('/performance_data_<timestamp>.json')
-def get_timestamped_performance_data(timestamp):
-    """Serve timestamped performance data files"""
-    filename = f'performance_data_{timestamp}.json'
+@app.route('/performance_data_<key>.json')
+def get_timestamped_performance_data(key):
+    """Serve a comparison result from the comparison cache"""
+    file_path = compare_cache.path(key)
+    if file_path is None:
+        return jsonify({'error': f'File performance_data_{key}.json not found'}), 404
     
-    # First look in the reportdiff web_report directory
-    file_path = f'reportdiff/analysis/web_report/{filename}'
-    if os.path.exists(file_path):
-        response = send_from_directory('reportdiff/analysis/web_report', filename)
-    else:
-        # Try nested web_report directory as fallback
-        nested_file_path = f'reportdiff/analysis/web_report/web_report/{filename}'
-        if os.path.exists(nested_file_path):
-            response = send_from_directory('reportdiff/analysis/web_report/web_report', filename)
-        else:
-            return jsonify({'error': f'File {filename} not found'}), 404
-    
-    # Add cache control headers
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    # 内容按输入哈希寻址，同一个键的内容不会变化
+    response = send_file(file_path, mimetype='application/json', conditional=True, etag=True, max_age=86400)
+    response.headers.pop('Content-Disposition', None)
     return response
 
 @app.route('/compare', methods=['POST'])
+@COMPARE_SECONDS.time()
 def compare():
     """Endpoint to compare two JMeter test reports"""
     data = request.get_json()
@@ -644,60 +1195,115 @@ def compare():
     report1_dir = report1_relative_path.split('/')[-2]  # Get the second last segment
     report2_dir = report2_relative_path.split('/')[-2]  # Get the second last segment
 
+    # steady 为 true 时对比去掉加压/减压阶段后的稳态统计
+    steady = bool(data.get('steady'))
+    statistics_name = STEADY_STATISTICS_FILE if steady else "statistics.json"
+    ensure_statistics = ensure_steady_statistics if steady else ensure_report_statistics
+
     # Build absolute paths to statistics.json files
-    file1_path = HTML_DIR / report1_dir / "statistics.json"
-    file2_path = HTML_DIR / report2_dir / "statistics.json"
+    file1_path = HTML_DIR / report1_dir / statistics_name
+    file2_path = HTML_DIR / report2_dir / statistics_name
+
+    # statistics.json 不存在时直接从JTL计算
+    try:
+        file1_path = ensure_statistics(report1_dir) or file1_path
+        file2_path = ensure_statistics(report2_dir) or file2_path
+    except Exception as e:
+        print(f"Failed to compute statistics from JTL: {str(e)}")
 
     # Debug log the constructed paths
     print(f"Statistics file 1: {file1_path}")
     print(f"Statistics file 2: {file2_path}")
 
     if not os.path.exists(file1_path) or not os.path.exists(file2_path):
-        error_msg = f'报告的 statistics.json 文件未找到. 路径1: {file1_path}, 路径2: {file2_path}'
+        error_msg = f'报告的 {statistics_name} 文件未找到. 路径1: {file1_path}, 路径2: {file2_path}'
         print(error_msg)
         return jsonify({'error': error_msg}), 404
 
     try:
-        # Create output directory in reportdiff/analysis/web_report
-        output_dir = BASE_DIR / 'reportdiff' / 'analysis'
-        
-        # Use timestamp for unique output filename
-        timestamp = int(time.time())
-        output_filename = f'performance_data_{timestamp}.json'
+        # 对比结果按两个 statistics.json 的内容哈希缓存，相同的报告对直接返回已有结果
+        def generate(output_dir, output_filename):
+            return generate_comparison_report(
+                file1_path=str(file1_path),
+                file2_path=str(file2_path),
+                output_dir=output_dir,
+                output_filename=output_filename
+            )
         
-        # Generate comparison report
-        performance_data_path = generate_comparison_report(
-            file1_path=str(file1_path),
-            file2_path=str(file2_path),
-            output_dir=str(output_dir),
-            output_filename=output_filename
-        )
+        key, performance_data_path, cached = compare_cache.get_or_create(file1_path, file2_path, generate)
+        print(f"Comparison {key} {'served from cache' if cached else 'generated'}: {performance_data_path}")
+        COMPARE_REQUESTS.inc(result='cached' if cached else 'generated')
         
         # Return success response
         return jsonify({
             'success': True, 
-            'redirect': f'result.html?t={timestamp}&data_file=performance_data_{timestamp}.json'
+            'cached': cached,
+            'steady': steady,
+            'redirect': f'result.html?t={key}&data_file=performance_data_{key}.json'
         })
     
     except Exception as e:
         print(f"Error in comparison: {str(e)}")
+        COMPARE_REQUESTS.inc(result='error')
         import traceback
         print(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/regression', methods=['POST'])
+def regression_api():
+    """Endpoint to test a run against a baseline for statistically significant regressions
+
+    请求体: baseline, current（报告目录名）, 可选 alpha, min_effect_pct, min_error_delta,
+    percentile, labels。响应中 passed 为 false 时表示检测到回归，可用作 CI 门禁。
+    """
+    data = request.get_json() or {}
+    names = [data.get('baseline'), data.get('current')]
+    if not all(names) or any('/' in name or '..' in name for name in names):
+        return jsonify({'error': '请提供基线和本次测试的报告目录名'}), 400
+    jtl_files = [find_report_jtl(name) for name in names]
+    for name, jtl_file in zip(names, jtl_files):
+        if jtl_file is None:
+            return jsonify({'error': f'未找到报告 {name} 对应的JTL文件'}), 404
+    try:
+        start = time.time()
+        result = compare_runs(
+            jtl_files[0], jtl_files[1],
+            labels=data.get('labels'),
+            alpha=float(data.get('alpha', ALPHA)),
+            percentile=float(data.get('percentile', PERCENTILE)),
+            min_effect_pct=float(data.get('min_effect_pct', MIN_EFFECT_PCT)),
+            min_error_delta=float(data.get('min_error_delta', MIN_ERROR_DELTA))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'参数格式错误: {str(e)}'}), 400
+    except Exception as e:
+        log_error(f"Regression analysis failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    result.update({'baseline': names[0], 'current': names[1], 'seconds': round(time.time() - start, 3)})
+    log_info(f"Regression analysis {names[0]} -> {names[1]}: {result['verdict']} in {result['seconds']}s")
+    return jsonify(result)
+
 @app.route('/api/start-test', methods=['POST'])
 def start_test():
     """API endpoint to start a JMeter test"""
-    global active_test
-    
-    if active_test:
+    data = request.json
+    # 未指定slave时从资源池中分配
+    remote_servers = data.get('remote_servers')
+    requested_servers = set(server.strip() for server in (remote_servers or '').split(',') if server.strip())
+    busy_servers = get_busy_servers()
+    if (requested_servers & busy_servers) or (not requested_servers and not set(pool_servers()) - busy_servers):
         return jsonify({"success": False, "message": "A test is already running"}), 400
     
-    data = request.json
     jmx_file = data.get('jmx_file')
     thread_num = int(data.get('thread_num', 100))
     test_duration = int(data.get('test_duration', 30))
     step_num = data.get('step_num') # Get step_num from request
+    defer_report = data.get('defer_report')  # None 表示使用配置 DEFER_HTML_REPORT
+    raw_jtl = data.get('raw_jtl')  # None 表示使用配置 RAW_JTL_ENABLED
+    try:
+        slave_count = int(data['slave_count']) if data.get('slave_count') else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": f"参数格式错误: {str(e)}"}), 400
     
     if not jmx_file:
         return jsonify({"success": False, "message": "JMX file name is required"}), 400
@@ -710,49 +1316,195 @@ def start_test():
             log_warn(f"Invalid step_num value: {step_num}. Ignoring.")
             step_num = None
 
-    success = run_jmeter_test(jmx_file, thread_num, test_duration, step_num=step_num) # Pass step_num
+    run = run_jmeter_test(jmx_file, thread_num, test_duration, step_num=step_num, remote_servers=remote_servers,
+                          defer_report=defer_report if defer_report is None else bool(defer_report),
+                          slave_count=slave_count,
+                          raw_jtl=raw_jtl if raw_jtl is None else bool(raw_jtl))
     
-    if success:
+    if run:
         return jsonify({
             "success": True, 
             "message": "Test started successfully",
-            "test_info": {
-                "jmx_file": jmx_file,
-                "thread_num": thread_num,
-                "test_duration": test_duration,
-                "start_time": active_test['start_time'].strftime('%Y-%m-%d %H:%M:%S')
-            }
+            "test_info": test_info(run)
         })
     else:
         return jsonify({"success": False, "message": "Failed to start test"}), 500
 
+def test_info(run):
+    """JSON-serializable summary of a running test"""
+    return {
+        "run_id": run['id'],
+        "jmx_file": run['jmx_file'],
+        "thread_num": run['thread_num'],
+        "test_duration": run['test_duration'],
+        "servers": run['servers'],
+        "threads": run['threads'],
+        "start_time": run['start_time'].strftime('%Y-%m-%d %H:%M:%S')
+    }
+
 @app.route('/api/test-status')
 def test_status():
-    """API endpoint to get the status of the current test"""
-    if active_test:
+    """API endpoint to get the status of the running tests"""
+    current = get_active_test()
+    if current:
+        with active_tests_lock:
+            tests = [test_info(run) for run in active_tests.values()]
         return jsonify({
             "running": True,
-            "test_info": {
-                "jmx_file": active_test['jmx_file'],
-                "thread_num": active_test['thread_num'],
-                "test_duration": active_test['test_duration'],
-                "start_time": active_test['start_time'].strftime('%Y-%m-%d %H:%M:%S')
-            }
+            "test_info": test_info(current),
+            "tests": tests
         })
     else:
-        return jsonify({"running": False})
+        return jsonify({"running": False, "tests": []})
+
+def live_stats_payload(run_id=None):
+    """Live per-label aggregates of a running test, or of the last finished one"""
+    current = get_active_test(run_id)
+    tailer = current.get('tailer') if current else None
+    if tailer:
+        return {"running": True, "stats": tailer.snapshot()}
+    return {"running": False, "stats": last_live_stats}
+
+@app.route('/api/live-stats')
+def live_stats():
+    """API endpoint to get live per-label aggregates parsed from the growing JTL"""
+    return jsonify(live_stats_payload(request.args.get('run_id')))
+
+@app.route('/api/transfer-metrics')
+def transfer_metrics():
+    """API endpoint to get the JTL transfer phase timings of recent runs"""
+    limit = request.args.get('limit', 50, type=int)
+    entries = []
+    if os.path.exists(TRANSFER_METRICS_FILE):
+        with open(TRANSFER_METRICS_FILE, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+    return jsonify({"metrics": entries[-limit:]})
+
+@app.route('/api/report-jobs', methods=['GET', 'POST'])
+def report_jobs_api():
+    """API endpoint to list report generation jobs, or queue one for an existing report"""
+    if request.method == 'GET':
+        return jsonify({"workers": report_jobs.workers, "jobs": report_jobs.list()})
+    
+    data = request.get_json() or {}
+    report_name = data.get('report')
+    if not report_name or '/' in report_name or '..' in report_name:
+        return jsonify({"success": False, "message": "请提供报告目录名称"}), 400
+    jtl_file = find_report_jtl(report_name)
+    if jtl_file is None:
+        return jsonify({"success": False, "message": f"未找到报告 {report_name} 对应的JTL文件"}), 404
+    if report_in_progress(report_name):
+        # 同一报告目录同时只允许一个写入者；已有生成任务时返回该任务
+        existing = report_jobs.find(report_name)
+        return jsonify({"success": False, "message": f"报告 {report_name} 正在生成中", "job": existing}), 409
+    job = report_jobs.submit(jtl_file, HTML_DIR / report_name)
+    return jsonify({"success": True, "job": job})
+
+@app.route('/api/report-jobs/<job_id>')
+def report_job_status(job_id):
+    """API endpoint to get the status of one report generation job"""
+    job = report_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job)
+
+def stop_run(run_id):
+    """Terminate the JMeter process of a running test"""
+    run = get_active_test(run_id)
+    if run and run['process']:
+        run['process'].terminate()
+        log_warn(f"Test {run_id} was manually terminated")
+
+def launch_queued_job(job):
+    """Start a job from the scheduler queue; returns the run id or None"""
+    # 按数量分配的任务使用调度器选定的节点，不健康的节点仍由资源池替换
+    servers = job['servers'] or job.get('assigned')
+    run = run_jmeter_test(job['jmx_file'], job['thread_num'], job['test_duration'],
+                          step_num=job['step_num'], remote_servers=','.join(servers) if servers else None,
+                          defer_report=job['defer_report'], raw_jtl=job.get('raw_jtl'))
+    return run['id'] if run else None
+
+@app.route('/api/queue', methods=['GET', 'POST'])
+def queue_api():
+    """API endpoint to list the job queue or add a run to it"""
+    if request.method == 'GET':
+        return jsonify({"jobs": job_scheduler.list(), "busy_servers": sorted(get_busy_servers())})
+    
+    data = request.get_json() or {}
+    jmx_file = data.get('jmx_file')
+    if not jmx_file:
+        return jsonify({"success": False, "message": "JMX file name is required"}), 400
+    if not Path(f"{JMX_DIR}/{jmx_file}.jmx").exists():
+        return jsonify({"success": False, "message": f"JMX file not found: {jmx_file}.jmx"}), 400
+    try:
+        thread_num = int(data.get('thread_num', 100))
+        test_duration = int(data.get('test_duration', 30))
+        step_num = int(data['step_num']) if data.get('step_num') is not None else None
+        priority = int(data.get('priority', 0))
+        slave_count = int(data['slave_count']) if data.get('slave_count') else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": f"参数格式错误: {str(e)}"}), 400
+    servers = data.get('remote_servers')
+    if isinstance(servers, str):
+        servers = [server.strip() for server in servers.split(',') if server.strip()]
+    defer_report = data.get('defer_report')
+    raw_jtl = data.get('raw_jtl')  # None 表示使用配置 RAW_JTL_ENABLED
+    
+    job = job_scheduler.enqueue(jmx_file, thread_num, test_duration, step_num=step_num,
+                                servers=servers or None, priority=priority,
+                                defer_report=defer_report if defer_report is None else bool(defer_report),
+                                slave_count=slave_count, raw_jtl=raw_jtl if raw_jtl is None else bool(raw_jtl))
+    log_info(f"Queued job {job['id']}: {jmx_file}, {thread_num} users, {test_duration}s")
+    return jsonify({"success": True, "job": job})
+
+@app.route('/api/queue/<job_id>', methods=['GET', 'DELETE'])
+def queue_job_api(job_id):
+    """API endpoint to get or cancel a queued job"""
+    if request.method == 'GET':
+        job = job_scheduler.get(job_id)
+    else:
+        job = job_scheduler.cancel(job_id)
+    if not job:
+        return jsonify({"success": False, "message": f"Job {job_id} not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+@app.route('/api/queue/<job_id>/priority', methods=['POST'])
+def queue_job_priority(job_id):
+    """API endpoint to change the priority of a queued job"""
+    data = request.get_json() or {}
+    try:
+        priority = int(data.get('priority'))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "请提供整数优先级"}), 400
+    job = job_scheduler.reprioritize(job_id, priority)
+    if not job:
+        return jsonify({"success": False, "message": f"Job {job_id} not found or not queued"}), 404
+    return jsonify({"success": True, "job": job})
 
 @app.route('/api/stop-test', methods=['POST'])
 def stop_test():
-    """API endpoint to stop the current test"""
-    global active_test
+    """API endpoint to stop the running test(s)
+
+    请求体中带 run_id 时只终止该测试，否则终止所有正在运行的测试
+    """
+    data = request.get_json(silent=True) or {}
+    run_id = data.get('run_id')
+    if run_id:
+        run = get_active_test(run_id)
+        runs = [run] if run else []
+    else:
+        with active_tests_lock:
+            runs = list(active_tests.values())
     
-    if not active_test:
+    if not runs:
         return jsonify({"success": False, "message": "No test is running"}), 400
     
     try:
-        active_test['process'].terminate()
-        log_warn("Test was manually terminated")
+        for run in runs:
+            stop_run(run['id'])
         return jsonify({"success": True, "message": "Test terminated"})
     except Exception as e:
         log_error(f"Failed to terminate test: {str(e)}")
@@ -760,19 +1512,33 @@ def stop_test():
 
 @app.route('/api/logs')
 def stream_logs():
-    """Stream logs to the client"""
+    """Stream logs to the client
+
+    每条消息带 SSE id（日志序号），浏览器重连时通过 Last-Event-ID 请求头（或
+    ?last_event_id=）从断点继续；客户端处理不过来时丢弃最旧的消息并发送 dropped 计数。
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    subscription = log_bus.subscribe(last_event_id)
+    
     def generate():
-        while True:
-            try:
-                # Get message from queue if available, otherwise wait
-                log_message = log_queue.get(timeout=1)
-                yield f"data: {json.dumps({'message': log_message})}\n\n"
-            except queue.Empty:
-                # If queue is empty, send a heartbeat
-                yield f"data: {json.dumps({'heartbeat': True})}\n\n"
-            except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                break
+        try:
+            while True:
+                events, dropped = subscription.get(timeout=1)
+                if dropped:
+                    yield f"data: {json.dumps({'dropped': dropped})}\n\n"
+                if not events:
+                    # If there is no new message, send a heartbeat
+                    yield f"data: {json.dumps({'heartbeat': True})}\n\n"
+                for seq, payload in events:
+                    # 批量发布的 JMeter 输出是 {'message', 'count', 'sampled'}，其余为单条日志
+                    data = payload if isinstance(payload, dict) else {'message': payload}
+                    yield f"id: {seq}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            subscription.close()
     
     return Response(stream_with_context(generate()), mimetype="text/event-stream")
 
@@ -788,45 +1554,284 @@ def get_jmx_files():
 
 @app.route('/api/reports')
 def get_reports():
-    """API endpoint to get a list of test reports"""
+    """API endpoint to get a list of test reports
+
+    数据来自报告索引。支持的查询参数:
+        q: 目录名包含的文本; jmx: 脚本名; min_users/max_users: 并发数范围
+        date_from/date_to: 日期范围（yyyymmdd[HHMMSS]）
+        sort: date/name/jmx/users/duration/samples/error_pct/mean/p90/p95/p99/throughput
+        order: asc/desc; page/page_size: 分页; refresh=1: 强制全量同步
+    不带 page 参数时返回数组，与 report_list.html 的格式保持一致。
+    """
+    try:
+        report_index.sync(force=request.args.get('refresh') in ('1', 'true'))
+        page = request.args.get('page', type=int)
+        page_size = min(max(request.args.get('page_size', 50, type=int), 1), 1000)
+        total, rows = report_index.query(
+            search=request.args.get('q'),
+            jmx=request.args.get('jmx'),
+            min_users=request.args.get('min_users', type=int),
+            max_users=request.args.get('max_users', type=int),
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to'),
+            sort=request.args.get('sort', 'date'),
+            order=request.args.get('order', 'desc'),
+            page=page,
+            page_size=page_size,
+            include_incomplete=request.args.get('include_incomplete') in ('1', 'true')
+        )
+    except Exception as e:
+        log_error(f"Error querying report index: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
     reports = []
-    for dir_name in os.listdir(HTML_DIR):
-        dir_path = HTML_DIR / dir_name
-        if os.path.isdir(dir_path) and os.path.exists(dir_path / "index.html"):
-            # 处理不同的目录命名格式
-            if '-' in dir_name and '_' in dir_name:  # 格式为 "jmx-200Vuser_20250506165136"
-                # 提取测试名称和日期
-                name_parts = dir_name.split('_')
-                if len(name_parts) >= 2:
-                    test_name = name_parts[0]  # 例如 "xiaocao-200Vuser"
-                    date_str = name_parts[1]   # 例如 "20250506165136"
-                    reports.append({
-                        "name": test_name,
-                        "date": date_str,
-                        "path": f"/report/html/{dir_name}/index.html"
-                    })
-            elif '_' in dir_name:  # 格式为 "xiaocao_20250417174523"
-                name_parts = dir_name.split('_')
-                if len(name_parts) >= 2:
-                    test_name = name_parts[0]  # 例如 "xiaocao"
-                    date_str = name_parts[1]   # 例如 "20250417174523"
-                    reports.append({
-                        "name": test_name,
-                        "date": date_str,
-                        "path": f"/report/html/{dir_name}/index.html"
-                    })
-    
-    # Sort reports by date (newest first)
-    reports.sort(key=lambda x: x['date'], reverse=True)
-    # Return array directly to match report_list.html's expected format
-    return jsonify(reports)
+    for row in rows:
+        report = {
+            "name": row['name'],
+            "date": row['date'],
+            "path": f"/report/html/{row['dir_name']}/{'index.html' if row['has_index'] else 'statistics.json'}",
+            "dir_name": row['dir_name'],
+            "jmx": row['jmx'],
+            "users": row['users'],
+            "duration": row['duration'],
+            "complete": bool(row['has_index'] or row['has_statistics']),
+            "html": bool(row['has_index'])
+        }
+        report.update({column: row[column] for column in METRIC_COLUMNS})
+        reports.append(report)
+    
+    if page is None:
+        # Return array directly to match report_list.html's expected format
+        return jsonify(reports)
+    return jsonify({"total": total, "page": page, "page_size": page_size, "reports": reports})
+
+@app.route('/api/trend')
+def get_trend():
+    """API endpoint for the users-vs-metric trend of many runs of one test plan
+
+    查询参数:
+        jmx: 脚本名（与 reports 二选一）; reports: 逗号分隔的报告目录名
+        label: 逗号分隔的标签，默认全部; aggregate: median/latest/best
+        date_from/date_to: 日期范围; min_users/max_users: 并发数范围
+    """
+    jmx = request.args.get('jmx')
+    report_names = [name for name in request.args.get('reports', '').split(',') if name.strip()]
+    if not jmx and not report_names:
+        return jsonify({'error': '请提供脚本名 jmx 或报告列表 reports'}), 400
+    aggregate = request.args.get('aggregate', 'median')
+    if aggregate not in AGGREGATES:
+        return jsonify({'error': f"aggregate 必须是 {', '.join(AGGREGATES)} 之一"}), 400
+    labels = [label for label in request.args.get('label', '').split(',') if label.strip()] or None
+    try:
+        report_index.sync()
+        _, rows = report_index.query(
+            jmx=jmx,
+            min_users=request.args.get('min_users', type=int),
+            max_users=request.args.get('max_users', type=int),
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to'),
+            sort='users',
+            order='asc',
+            # 不回传原始JTL的运行没有HTML报告，按下面的样本数筛选
+            include_incomplete=True
+        )
+        if report_names:
+            wanted = set(name.strip() for name in report_names)
+            rows = [row for row in rows if row['dir_name'] in wanted]
+        rows = [row for row in rows if row['users'] is not None and row['samples']]
+        if not rows:
+            return jsonify({'error': '没有符合条件的测试报告'}), 404
+        label_metrics = report_index.label_metrics([row['dir_name'] for row in rows], labels)
+        trend = build_trend(rows, label_metrics, labels, aggregate)
+    except Exception as e:
+        log_error(f"Error building trend: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    trend['jmx'] = jmx or sorted(set(row['jmx'] for row in rows))
+    trend['run_count'] = len(rows)
+    return jsonify(trend)
+
+@app.route('/api/runs/<run_id>/steady-state')
+def run_steady_state(run_id):
+    """API endpoint to get the steady-state window of a run with trimmed and untrimmed statistics"""
+    if '/' in run_id or '..' in run_id:
+        return jsonify({'error': '无效的报告名称'}), 400
+    if report_in_progress(run_id):
+        return jsonify({'error': f'测试 {run_id} 尚未结束'}), 409
+    try:
+        trimmed_file = ensure_steady_statistics(run_id)
+        untrimmed_file = ensure_report_statistics(run_id)
+    except Exception as e:
+        log_error(f"Error computing steady-state statistics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    if trimmed_file is None or untrimmed_file is None:
+        return jsonify({'error': f'未找到报告 {run_id} 对应的JTL文件或统计数据'}), 404
+    result = {'run_id': run_id}
+    for key, path in (('window', trimmed_file.parent / STEADY_WINDOW_FILE),
+                      ('trimmed', trimmed_file), ('untrimmed', untrimmed_file)):
+        with open(path, 'r') as f:
+            result[key] = json.load(f)
+    return jsonify(result)
+
+@app.route('/api/runs/<run_id>/timeseries')
+def run_timeseries(run_id):
+    """API endpoint to get a run's over-time series at one resolution
+
+    查询参数:
+        resolution: 1s/10s/1m/10m 或 auto（默认，按范围选择点数不超过 max_points 的最细级别）
+        from/to: 时间范围（毫秒时间戳），默认整个测试
+        label: 标签，可重复，默认 Total
+    """
+    if '/' in run_id or '..' in run_id:
+        return jsonify({'error': '无效的报告名称'}), 400
+    if report_in_progress(run_id):
+        return jsonify({'error': f'测试 {run_id} 尚未结束'}), 409
+    resolution = request.args.get('resolution', 'auto')
+    if resolution != 'auto' and resolution not in dict(RESOLUTIONS):
+        return jsonify({'error': f'resolution 必须是 auto 或 {"/".join(name for name, _ in RESOLUTIONS)}'}), 400
+    time_from = request.args.get('from', type=int)
+    time_to = request.args.get('to', type=int)
+    labels = request.args.getlist('label') or [TIMESERIES_TOTAL]
+    try:
+        path = ensure_timeseries(run_id)
+        if path is None:
+            return jsonify({'error': f'未找到报告 {run_id} 对应的JTL文件'}), 404
+        with TimeSeries(path) as series:
+            first, last = series.time_range()
+            time_from = first if time_from is None else max(time_from, first)
+            time_to = last if time_to is None else min(time_to, last)
+            if resolution == 'auto':
+                resolution = series.pick_resolution(time_from, time_to,
+                                                    request.args.get('max_points', MAX_POINTS, type=int))
+            result = {
+                'run_id': run_id,
+                'resolution': resolution,
+                'resolutions': [name for name, _ in RESOLUTIONS],
+                'from': time_from,
+                'to': time_to,
+                'range': [first, last],
+                'labels': {label: series.series(label, resolution, time_from, time_to) for label in labels
+                           if label in series.labels},
+                'available_labels': series.labels,
+                'threads': series.threads(resolution, time_from, time_to)
+            }
+    except Exception as e:
+        log_error(f"Error reading time-series rollups: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify(result)
+
+@app.route('/api/runs/<run_id>/slaves')
+def run_slaves(run_id):
+    """API endpoint to get a run's per-slave latency, connect time and throughput with outlier flags"""
+    if '/' in run_id or '..' in run_id:
+        return jsonify({'error': '无效的报告名称'}), 400
+    if report_in_progress(run_id):
+        return jsonify({'error': f'测试 {run_id} 尚未结束'}), 409
+    if find_report_jtl(run_id) is None:
+        return jsonify({'error': f'未找到报告 {run_id} 对应的JTL文件'}), 404
+    try:
+        breakdown = ensure_slave_breakdown(run_id)
+    except Exception as e:
+        log_error(f"Error computing per-slave breakdown: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    if breakdown is None:
+        return jsonify({'error': f'测试 {run_id} 的JTL中没有多台slave的数据'}), 404
+    breakdown['run_id'] = run_id
+    return jsonify(breakdown)
+
+@app.route('/api/resources', methods=['GET', 'POST'])
+def resources_api():
+    """Endpoint for resource collector agents to push sample batches; GET lists known agents"""
+    if request.method == 'GET':
+        return jsonify({"enabled": RESOURCE_MONITOR_ENABLED, "agents": resource_collector.agents()})
+    if not RESOURCE_MONITOR_ENABLED:
+        return jsonify({"success": False, "message": "资源监控未启用"}), 404
+    try:
+        runs = resource_collector.ingest(request.get_json(force=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": f"数据格式错误: {str(e)}"}), 400
+    return jsonify({"success": True, "runs": runs})
+
+@app.route('/api/runs/<run_id>/resources')
+def run_resources(run_id):
+    """API endpoint to get a run's resource samples aligned per second with its JTL"""
+    if '/' in run_id or '..' in run_id:
+        return jsonify({'error': '无效的报告名称'}), 400
+    if report_in_progress(run_id):
+        return jsonify({'error': f'测试 {run_id} 尚未结束'}), 409
+    jtl_file = find_report_jtl(run_id)
+    if jtl_file is None:
+        return jsonify({'error': f'未找到报告 {run_id} 对应的JTL文件'}), 404
+    try:
+        resources = load_resources(resources_path(jtl_file))
+        if not resources:
+            return jsonify({'error': f'测试 {run_id} 没有资源监控数据'}), 404
+        result = align_with_jtl(resources, load_jtl(str(jtl_file)))
+    except Exception as e:
+        log_error(f"Error aligning resource samples: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    result['run_id'] = run_id
+    return jsonify(result)
+
+@app.route('/write', methods=['POST'])
+def metrics_write():
+    """InfluxDB HTTP write endpoint for JMeter's InfluxdbBackendListenerClient"""
+    if not METRICS_RECEIVER_ENABLED:
+        return jsonify({'error': '指标接收未启用'}), 404
+    metrics_receiver.ingest(request.get_data(as_text=True), request.remote_addr)
+    return '', 204
+
+@app.route('/api/metrics-receiver')
+def metrics_receiver_status():
+    """API endpoint to get the state of the Backend Listener metrics receiver"""
+    status = metrics_receiver.stats()
+    status.update({'enabled': METRICS_RECEIVER_ENABLED, 'host': metrics_advertise_host(), 'raw_jtl': RAW_JTL_ENABLED})
+    return jsonify(status)
+
+@app.route('/api/runs/<run_id>/metrics')
+def run_metrics(run_id):
+    """API endpoint to get a run's per-label per-second Backend Listener series
+
+    测试进行中返回已接收的数据，结束后读取保存的 .metrics.npz
+    """
+    if '/' in run_id or '..' in run_id:
+        return jsonify({'error': '无效的报告名称'}), 400
+    live = metrics_receiver.get(run_id)
+    try:
+        if live is not None:
+            arrays = live.arrays()
+        else:
+            jtl_file = report_jtl_path(run_id)
+            arrays = load_metrics(metrics_path(jtl_file)) if jtl_file is not None else None
+        if arrays is None:
+            return jsonify({'error': f'测试 {run_id} 没有 Backend Listener 指标数据'}), 404
+        result = series_from_arrays(arrays)
+        result['statistics'] = statistics_from_arrays(arrays)
+    except Exception as e:
+        log_error(f"Error reading Backend Listener metrics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    result.update({'run_id': run_id, 'running': live is not None})
+    return jsonify(result)
+
+def report_in_progress(report_name):
+    """True while a report is still being written by a run, its post-processing or a report job"""
+    with active_tests_lock:
+        if report_name in active_tests or report_name in post_processing:
+            return True
+    return report_jobs.is_pending(report_name)
 
 @app.route('/report/html/<path:report_path>')
+@REPORT_FILE_SECONDS.time()
 def serve_report_files(report_path):
-    """Serve files from the report/html directory"""
+    """Serve files from the report/html directory
+
+    通过 send_file 流式发送（支持 ETag/Last-Modified 条件请求和 Range），客户端支持时
+    返回预压缩的 .br/.gz 副本。已完成报告中随 JMeter 附带的第三方资源使用 immutable 长缓存，
+    报告数据文件（html/json/dashboard.js 等）每次校验 ETag。
+    """
     try:
         # 构建完整路径，但检查是否包含不安全的路径元素
         if '..' in report_path or report_path.startswith('/'):
+            REPORT_FILE_REQUESTS.inc(status=403, encoding='identity')
             return "Access denied: Invalid path", 403
         
         full_path = os.path.join(HTML_DIR, report_path)
@@ -836,81 +1841,70 @@ def serve_report_files(report_path):
             full_path = os.path.join(full_path, 'index.html')
             
         # 检查文件是否存在
-        if not os.path.exists(full_path):
+        if not os.path.isfile(full_path):
             log_error(f"Report file not found: {full_path}")
+            REPORT_FILE_REQUESTS.inc(status=404, encoding='identity')
             return f"Report file not found: {report_path}", 404
-            
-        # 读取文件内容
-        with open(full_path, 'rb') as f:
-            content = f.read()
-            
-        # 根据文件扩展名设置合适的MIME类型
-        mime_types = {
-            '.html': 'text/html',
-            '.css': 'text/css',
-            '.js': 'application/javascript',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.svg': 'image/svg+xml',
-            '.json': 'application/json',
-            '.woff': 'font/woff',
-            '.woff2': 'font/woff2',
-            '.ttf': 'font/ttf',
-            '.eot': 'application/vnd.ms-fontobject',
-            '.otf': 'font/otf',
-            '.txt': 'text/plain'
-        }
         
-        # 获取文件扩展名并设置MIME类型
-        _, ext = os.path.splitext(full_path)
-        mime_type = mime_types.get(ext.lower(), 'application/octet-stream')
+        # Range 请求按原始内容处理
+        encoding = None
+        send_path = full_path
+        if 'Range' not in request.headers:
+            send_path, encoding = pick_variant(full_path, request.headers.get('Accept-Encoding'))
         
-        return Response(content, mimetype=mime_type)
+        report_name, _, relative_path = report_path.partition('/')
+        immutable = is_immutable_asset(relative_path) and not report_in_progress(report_name)
+        response = send_file(send_path, mimetype=mime_type(full_path), conditional=True, etag=True,
+                             max_age=REPORT_CACHE_MAX_AGE if immutable else 0)
+        # 报告文件在浏览器中直接打开，不需要 send_file 附带的 Content-Disposition
+        response.headers.pop('Content-Disposition', None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        if immutable:
+            response.headers['Cache-Control'] = f"public, max-age={REPORT_CACHE_MAX_AGE}, immutable"
+        else:
+            response.headers['Cache-Control'] = "no-cache"
+        REPORT_FILE_REQUESTS.inc(status=response.status_code, encoding=encoding or 'identity')
+        return response
     except Exception as e:
+        REPORT_FILE_REQUESTS.inc(status=500, encoding='identity')
         log_error(f"Error serving report file {report_path}: {str(e)}")
         return f"Error serving report file: {str(e)}", 500
 
+@app.route('/metrics')
+def runner_metrics():
+    """Prometheus text-format metrics of the runner itself"""
+    if not RUNNER_METRICS_ENABLED:
+        return "Metrics endpoint disabled", 404
+    return Response(METRICS_REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/check-servers')
 def check_servers_api():
-    """API endpoint to check the status of JMeter servers"""
+    """API endpoint to check the status of JMeter servers
+
+    默认返回缓存的检查结果；?refresh=1 强制重新探测，?servers=a,b 只检查指定节点
+    """
     try:
-        remote_servers = REMOTE_SERVERS
-        server_statuses = []
-        
-        log_info("API: Starting to check remote JMeter Server status...")
-        server_list = remote_servers.split(',')
-        all_success = True
+        servers = request.args.get('servers')
+        if servers:
+            server_list = [server.strip() for server in servers.split(',') if server.strip()]
+        else:
+            server_list = pool_servers()
+        force = request.args.get('refresh') in ('1', 'true')
+        entries = slave_health.check(slave_pool.ports(server_list), force=force)
         
+        server_statuses = []
         for server in server_list:
-            log_info(f"API: Checking JMeter Server status on {server}...")
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5)
-                result = sock.connect_ex((server, 1099))
-                sock.close()
-                
-                status = result == 0
-                server_statuses.append({
-                    "server": server, 
-                    "status": status, 
-                    "message": "正常" if status else "无法连接"
-                })
-                
-                if not status:
-                    all_success = False
-                    log_error(f"API: JMeter Server on {server} is not running or cannot be connected")
-                else:
-                    log_info(f"API: JMeter Server on {server} is running normally")
-            except Exception as e:
-                server_statuses.append({
-                    "server": server, 
-                    "status": False, 
-                    "message": str(e)
-                })
-                all_success = False
-                log_error(f"API: Error checking JMeter Server on {server}: {str(e)}")
+            entry = entries[server]
+            server_statuses.append({
+                "server": server,
+                "status": entry['healthy'],
+                "message": entry['message'],
+                "latency_ms": entry['latency_ms'],
+                "checked_at": entry['checked_at']
+            })
+        all_success = all(status['status'] for status in server_statuses)
         
         error_message = None
         if not all_success:
@@ -929,5 +1923,149 @@ def check_servers_api():
             "servers": []
         }), 500
 
+@app.route('/api/slaves', methods=['GET', 'POST'])
+def slaves_api():
+    """API endpoint to list the slave pool, or register/update a slave
+
+    POST 请求体: {"host": "...", "port": 1099, "cores": 8, "heap_mb": 4096, "max_threads": 2000, "enabled": true}
+    """
+    if request.method == 'GET':
+        return jsonify({"slaves": slave_pool.list(), "busy_servers": sorted(get_busy_servers())})
+    
+    data = request.get_json() or {}
+    host = (data.get('host') or '').strip()
+    if not host:
+        return jsonify({"success": False, "message": "请提供slave地址"}), 400
+    try:
+        fields = {key: int(data[key]) for key in ('port', 'cores', 'heap_mb', 'max_threads')
+                  if data.get(key) is not None}
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": f"参数格式错误: {str(e)}"}), 400
+    if data.get('enabled') is not None:
+        fields['enabled'] = bool(data['enabled'])
+    slave = slave_pool.register(host, **fields)
+    log_info(f"Slave pool: registered {host} ({slave['cores']} cores, max threads {slave['max_threads']})")
+    return jsonify({"success": True, "slave": slave})
+
+@app.route('/api/slaves/<host>', methods=['DELETE'])
+def remove_slave(host):
+    """API endpoint to remove a slave from the pool"""
+    if host in get_busy_servers():
+        return jsonify({"success": False, "message": f"{host} 正在被测试使用"}), 400
+    if not slave_pool.remove(host):
+        return jsonify({"success": False, "message": f"Slave {host} not found"}), 404
+    log_info(f"Slave pool: removed {host}")
+    return jsonify({"success": True})
+
+# 压测任务队列调度器
+job_scheduler = JobScheduler(
+    JOB_QUEUE_FILE,
+    launch=launch_queued_job,
+    busy_servers=get_busy_servers,
+    default_servers=preferred_pool_servers,
+    stop_run=stop_run,
+    on_log=log_info
+)
+
+def launch_search_step(search, users):
+    """Start one step of a capacity search; returns the run or None"""
+    servers = ','.join(search['servers']) if search['servers'] else None
+    # 每一步只写 JTL，HTML 报告交给后台队列生成，下一步可以立即开始
+    return run_jmeter_test(search['jmx_file'], users, search['step_duration'],
+                           remote_servers=servers, defer_report=True)
+
+# 容量搜索
+capacity_search = CapacitySearchManager(
+    CAPACITY_SEARCH_FILE,
+    launch=launch_search_step,
+    stop_run=stop_run,
+    on_log=log_message,
+    pause=CAPACITY_STEP_PAUSE
+)
+
+@app.route('/api/capacity-search', methods=['GET', 'POST'])
+def capacity_search_api():
+    """API endpoint to list capacity searches or start one
+
+    请求体: jmx_file, min_users, max_users, step_duration, slo_p95 (ms), slo_error_pct (%),
+    mode (adaptive/binary), growth, precision, plateau_pct, max_steps, remote_servers
+    """
+    if request.method == 'GET':
+        return jsonify({"searches": capacity_search.list()})
+    
+    data = request.get_json() or {}
+    jmx_file = data.get('jmx_file')
+    if not jmx_file:
+        return jsonify({"success": False, "message": "JMX file name is required"}), 400
+    if not Path(f"{JMX_DIR}/{jmx_file}.jmx").exists():
+        return jsonify({"success": False, "message": f"JMX file not found: {jmx_file}.jmx"}), 400
+    mode = data.get('mode', 'adaptive')
+    if mode not in CAPACITY_MODES:
+        return jsonify({"success": False, "message": f"mode 必须是 {', '.join(CAPACITY_MODES)} 之一"}), 400
+    servers = data.get('remote_servers')
+    if isinstance(servers, str):
+        servers = [server.strip() for server in servers.split(',') if server.strip()]
+    try:
+        min_users = int(data.get('min_users', 10))
+        search = capacity_search.start(
+            jmx_file,
+            min_users=min_users,
+            max_users=int(data.get('max_users', min_users * 32)),
+            step_duration=int(data.get('step_duration', CAPACITY_STEP_DURATION)),
+            slo_p95=float(data.get('slo_p95', CAPACITY_SLO_P95)),
+            slo_error_pct=float(data.get('slo_error_pct', CAPACITY_SLO_ERROR_PCT)),
+            mode=mode,
+            growth=float(data.get('growth', 2.0)),
+            precision=int(data['precision']) if data.get('precision') is not None else None,
+            plateau_pct=float(data.get('plateau_pct', CAPACITY_PLATEAU_PCT)),
+            max_steps=int(data.get('max_steps', 12)),
+            servers=servers or None
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": f"参数格式错误: {str(e)}"}), 400
+    return jsonify({"success": True, "search": search})
+
+@app.route('/api/capacity-search/<search_id>', methods=['GET', 'DELETE'])
+def capacity_search_item(search_id):
+    """API endpoint to get or cancel a capacity search"""
+    if request.method == 'GET':
+        search = capacity_search.get(search_id)
+    else:
+        search = capacity_search.cancel(search_id)
+    if not search:
+        return jsonify({"success": False, "message": f"Capacity search {search_id} not found or finished"}), 404
+    return jsonify({"success": True, "search": search})
+
+_background_services_started = False
+_background_services_lock = threading.Lock()
+
+def start_background_services():
+    """Start the background threads of the app (only once per process)"""
+    global _background_services_started, sse_server
+    with _background_services_lock:
+        if _background_services_started:
+            return
+        _background_services_started = True
+    if SSE_SERVER_ENABLED:
+        sse_server = SseServer(SSE_SERVER_HOST, SSE_SERVER_PORT, log_bus, live_stats=live_stats_payload,
+                               on_log=log_info)
+        sse_server.start()
+    slave_health.start()
+    job_scheduler.start()
+    if METRICS_RECEIVER_ENABLED:
+        metrics_receiver.start()
+    if RESOURCE_MONITOR_ENABLED and RESOURCE_LOCAL_AGENT:
+        ResourceAgent(resource_collector.ingest, role='master', interval=RESOURCE_SAMPLE_INTERVAL,
+                      on_log=log_warn).start()
+
+def is_reloader_parent():
+    """True in the process that only watches files for the Werkzeug debug reloader"""
+    return __name__ == '__main__' and APP_DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+# 首次导入时启动后台服务，python app.py 和 WSGI 服务器都适用；debug 模式下 reloader 的
+# 父进程只负责重启子进程，由实际处理请求的子进程启动
+if not is_reloader_parent():
+    start_background_services()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, threaded=True, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5001, threaded=True, debug=APP_DEBUG)
\ No newline at end of file
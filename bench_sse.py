@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""SSE 推送服务压测脚本
+
+启动 N 个并发 SSE 客户端订阅日志流，按固定速率发布日志，统计送达率和延迟，
+用于评估一个实例能支撑的订阅者数量。
+
+用法:
+    python bench_sse.py --clients 500 --rate 200 --duration 20
+    python bench_sse.py --clients 500 --duration 20 --url http://127.0.0.1:5002/api/logs
+
+不指定 --url 时在本进程内启动 LogBus 和 SseServer 并由脚本发布日志；指定 --url 时
+只连接已运行的服务（日志由被测实例产生，只统计接收量）。客户端与服务端在同一
+进程时共享 GIL，结果偏保守。
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from log_bus import LogBus
+from sse_server import SseServer
+
+
+def raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+class ClientStats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.messages = 0
+        self.dropped = 0
+        self.latencies = []
+
+
+async def sse_client(host, port, path, stats):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats.failed += 1
+        return
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode('latin-1'))
+    stats.connected += 1
+    buffer = b''
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+        while True:
+            # 按块读取，只解析完整帧；延迟按每块最后一条消息采样
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            end = buffer.rfind(b'\n\n')
+            if end < 0:
+                continue
+            frames, buffer = buffer[:end], buffer[end + 2:]
+            stats.messages += frames.count(b'"message"')
+            for frame in frames.split(b'\n\n'):
+                if b'"dropped"' in frame:
+                    stats.dropped += json.loads(frame.split(b'data: ', 1)[1])['dropped']
+            last = frames.rsplit(b'data: ', 1)[-1]
+            if b'"bench ' in last:
+                message = json.loads(last)['message']
+                stats.latencies.append(time.time() - float(message[6:]))
+    except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def publisher(bus, rate, stop_at, counter):
+    interval = 1.0 / rate
+    next_time = time.time()
+    while time.time() < stop_at:
+        bus.publish(f"bench {time.time():.6f}")
+        counter[0] += 1
+        next_time += interval
+        delay = next_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def percentile(values, percent):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+async def run_clients(host, port, path, clients, duration, stats, ramp):
+    stop_at = time.time() + duration + ramp
+    tasks = []
+    for i in range(clients):
+        tasks.append(asyncio.ensure_future(sse_client(host, port, path, stats)))
+        if ramp and i % 50 == 49:
+            await asyncio.sleep(ramp * 50.0 / clients)
+    await asyncio.sleep(max(0, stop_at - time.time()))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SSE log subscribers")
+    parser.add_argument('--clients', type=int, default=200, help="并发客户端数")
+    parser.add_argument('--rate', type=float, default=100, help="每秒发布的日志条数（仅内置服务）")
+    parser.add_argument('--duration', type=float, default=10, help="测试时长（秒）")
+    parser.add_argument('--ramp', type=float, default=2, help="建立全部连接所用时间（秒）")
+    parser.add_argument('--url', help="已运行的 SSE 服务地址，例如 http://127.0.0.1:5002/api/logs")
+    args = parser.parse_args()
+
+    fd_limit = raise_fd_limit()
+    published = [0]
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port, path = url.hostname, url.port or 80, url.path or '/api/logs'
+    else:
+        bus = LogBus()
+        server = SseServer('127.0.0.1', 0, bus).start()
+        host, port, path = '127.0.0.1', server.port, '/api/logs'
+        # 等待全部客户端连上之后再开始发布
+        stop_at = time.time() + args.ramp + 0.5 + args.duration
+        threading.Timer(args.ramp + 0.5, publisher, args=(bus, args.rate, stop_at, published)).start()
+
+    stats = ClientStats()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    start = time.time()
+    loop.run_until_complete(run_clients(host, port, path, args.clients, args.duration + 1, stats, args.ramp))
+    elapsed = time.time() - start
+
+    print(f"clients requested: {args.clients}, connected: {stats.connected}, failed: {stats.failed}"
+          f" (fd limit {fd_limit})")
+    print(f"duration: {elapsed:.1f}s, messages received: {stats.messages}, dropped: {stats.dropped}")
+    if server is not None:
+        expected = published[0] * stats.connected
+        ratio = stats.messages * 100.0 / expected if expected else 0.0
+        print(f"published: {published[0]} ({args.rate:g}/s), expected deliveries: {expected}, "
+              f"delivered: {ratio:.1f}%")
+        print(f"server threads: 2 (event loop + log bridge), process threads: {threading.active_count()}")
+    if stats.latencies:
+        print(f"latency ms: p50 {percentile(stats.latencies, 50) * 1000:.1f}, "
+              f"p99 {percentile(stats.latencies, 99) * 1000:.1f}, "
+              f"max {max(stats.latencies) * 1000:.1f}")
+
+
+if __name__ == '__main__':
+    main()
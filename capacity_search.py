@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+# 容量搜索
+#
+# 自动执行一系列短时压测来寻找最大可持续并发数: 先按倍数增加并发数（adaptive），
+# 遇到 SLO（p95 响应时间、错误率）不达标后在最后一个达标点和失败点之间二分；
+# binary 模式直接在 [min_users, max_users] 之间二分。每一步结束后用该步的实时
+# 统计判断 SLO，吞吐量不再随并发数增长（平台期）或区间收敛到指定精度时停止，
+# 结果中给出拐点（满足 SLO 且吞吐量仍在增长的最大并发数）。
+
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from config import LOG_LEVEL_INFO, LOG_LEVEL_WARN, LOG_LEVEL_ERROR
+
+# 搜索状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+MODES = ('adaptive', 'binary')
+# 持久化文件中保留的已结束搜索数量
+MAX_FINISHED_SEARCHES = 100
+# 一步启动失败（例如 slave 被其他任务占用）时的重试次数
+LAUNCH_RETRIES = 3
+# 一步完成至少该比例的时长后才允许按实时统计提前结束
+EARLY_STOP_FRACTION = 0.5
+# 提前结束所需的最少样本数
+EARLY_STOP_MIN_SAMPLES = 200
+
+
+def evaluate_step(stats, slo_p95, slo_error_pct):
+    """Check one step's aggregates against the SLOs
+
+    Returns:
+        tuple: (是否达标, 不达标原因列表)
+    """
+    violations = []
+    if not stats or not stats.get('count'):
+        return False, ['没有采集到样本']
+    p95 = stats.get('p95')
+    if slo_p95 is not None and p95 is not None and p95 > slo_p95:
+        violations.append(f"p95 {p95:.0f}ms > {slo_p95:g}ms")
+    error_pct = stats.get('error_pct') or 0.0
+    if slo_error_pct is not None and error_pct > slo_error_pct:
+        violations.append(f"错误率 {error_pct:.2f}% > {slo_error_pct:g}%")
+    return not violations, violations
+
+
+class CapacitySearchManager:
+    """Runs capacity searches one step (test run) at a time
+
+    Args:
+        search_file: 持久化文件路径
+        launch: launch(search, users) -> run 或 None，启动一步压测；run 需包含
+                id、done (threading.Event)、tailer、actual_thread_num、exit_code
+        stop_run: stop_run(run_id)，终止正在运行的一步
+    """
+
+    def __init__(self, search_file, launch, stop_run, on_log=None, pause=5):
+        self.search_file = str(search_file)
+        self.launch = launch
+        self.stop_run = stop_run
+        self.on_log = on_log
+        self.pause = pause
+        self.lock = threading.Lock()
+        self.searches = []
+        self._cancel = {}
+        self._seq = itertools.count(1)
+        self._load()
+
+    def _log(self, level, message):
+        if self.on_log:
+            self.on_log(level, message)
+
+    def _load(self):
+        if not os.path.exists(self.search_file):
+            return
+        with open(self.search_file, 'r') as f:
+            self.searches = json.load(f)
+        for search in self.searches:
+            if search['status'] in (QUEUED, RUNNING):
+                search['status'] = FAILED
+                search['reason'] = 'interrupted'
+                search['message'] = "服务重启时搜索中断"
+        if self.searches:
+            self._seq = itertools.count(max(int(search['id']) for search in self.searches) + 1)
+
+    def _save(self):
+        finished = [search for search in self.searches if search['status'] in FINISHED_STATES]
+        if len(finished) > MAX_FINISHED_SEARCHES:
+            drop = set(search['id'] for search in finished[:len(finished) - MAX_FINISHED_SEARCHES])
+            self.searches = [search for search in self.searches if search['id'] not in drop]
+        tmp_file = f"{self.search_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.searches, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.search_file)
+
+    def _find(self, search_id):
+        for search in self.searches:
+            if search['id'] == str(search_id):
+                return search
+        return None
+
+    def start(self, jmx_file, min_users, max_users, step_duration, slo_p95=None, slo_error_pct=None,
+              mode='adaptive', growth=2.0, precision=None, plateau_pct=5.0, max_steps=12, servers=None):
+        """Start a search in a background thread; returns a copy of the search"""
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if min_users < 1 or max_users < min_users:
+            raise ValueError("require 1 <= min_users <= max_users")
+        if growth <= 1:
+            raise ValueError("growth must be greater than 1")
+        if precision is None:
+            # 默认精度为搜索区间的 5%
+            precision = max(1, (max_users - min_users) // 20)
+        with self.lock:
+            search = {
+                'id': str(next(self._seq)),
+                'jmx_file': jmx_file,
+                'mode': mode,
+                'min_users': min_users,
+                'max_users': max_users,
+                'step_duration': step_duration,
+                'slo_p95': slo_p95,
+                'slo_error_pct': slo_error_pct,
+                'growth': growth,
+                'precision': precision,
+                'plateau_pct': plateau_pct,
+                'max_steps': max_steps,
+                'servers': servers,
+                'status': QUEUED,
+                'submitted': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'started': None,
+                'finished': None,
+                'steps': [],
+                'current_run': None,
+                'knee': None,
+                'reason': None,
+                'message': None
+            }
+            self.searches.append(search)
+            self._cancel[search['id']] = threading.Event()
+            self._save()
+        thread = threading.Thread(target=self._run, args=(search,))
+        thread.daemon = True
+        thread.start()
+        self._log(LOG_LEVEL_INFO, f"Capacity search {search['id']} started for {jmx_file}: "
+                                  f"{min_users}-{max_users} users, {mode}")
+        return dict(search)
+
+    def list(self):
+        with self.lock:
+            return [dict(search) for search in self.searches]
+
+    def get(self, search_id):
+        with self.lock:
+            search = self._find(search_id)
+            return dict(search) if search else None
+
+    def cancel(self, search_id):
+        """Cancel a search and stop its running step"""
+        with self.lock:
+            search = self._find(search_id)
+            if not search or search['status'] in FINISHED_STATES:
+                return None
+            self._cancel[search['id']].set()
+            run_id = search['current_run']
+        if run_id:
+            self.stop_run(run_id)
+        return dict(search)
+
+    def _update(self, search, **fields):
+        with self.lock:
+            search.update(fields)
+            self._save()
+
+    def _run_step(self, search, users, cancel):
+        """Run one step; returns the step record or None when it could not be launched"""
+        run = None
+        for attempt in range(LAUNCH_RETRIES):
+            run = self.launch(search, users)
+            if run or cancel.wait(self.pause):
+                break
+        if not run:
+            return None
+        self._update(search, current_run=run['id'])
+        self._log(LOG_LEVEL_INFO, f"Capacity search {search['id']}: step {len(search['steps']) + 1} "
+                                  f"with {run['actual_thread_num']} users ({run['id']})")
+        started = time.time()
+        early_stop = None
+        while not run['done'].wait(1.0):
+            if cancel.is_set():
+                self.stop_run(run['id'])
+                break
+            # 步骤过半后若 SLO 已明显不达标则提前结束该步，节省时间
+            if time.time() - started < search['step_duration'] * EARLY_STOP_FRACTION or early_stop:
+                continue
+            stats = run['tailer'].snapshot()['total']
+            if stats['count'] >= EARLY_STOP_MIN_SAMPLES:
+                ok, violations = evaluate_step(stats, search['slo_p95'], search['slo_error_pct'])
+                if not ok:
+                    early_stop = violations
+                    self._log(LOG_LEVEL_WARN, f"Capacity search {search['id']}: stopping step early "
+                                              f"({'; '.join(violations)})")
+                    self.stop_run(run['id'])
+        run['done'].wait()
+        stats = run['tailer'].snapshot()['total']
+        ok, violations = evaluate_step(stats, search['slo_p95'], search['slo_error_pct'])
+        step = {
+            'users': run['actual_thread_num'],
+            'run_id': run['id'],
+            'samples': stats.get('count'),
+            'throughput': round(stats.get('throughput') or 0.0, 3),
+            'mean': stats.get('mean'),
+            'p95': stats.get('p95'),
+            'p99': stats.get('p99'),
+            'error_pct': round(stats.get('error_pct') or 0.0, 3),
+            'exit_code': run['exit_code'],
+            'slo_ok': ok,
+            'violations': violations,
+            'early_stop': bool(early_stop),
+            'duration': round(time.time() - started, 1)
+        }
+        with self.lock:
+            search['steps'].append(step)
+            search['current_run'] = None
+            self._save()
+        return step
+
+    def _run(self, search):
+        cancel = self._cancel[search['id']]
+        self._update(search, status=RUNNING, started=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        try:
+            reason, good = self._search(search, cancel)
+            if cancel.is_set():
+                status, reason = CANCELLED, 'cancelled'
+            else:
+                status = FAILED if reason == 'failed' else DONE
+        except Exception as e:
+            self._log(LOG_LEVEL_ERROR, f"Capacity search {search['id']} failed: {str(e)}")
+            status, reason, good = FAILED, 'failed', None
+            search['message'] = str(e)
+        knee = None
+        if good is not None:
+            knee = dict((key, good[key]) for key in ('users', 'throughput', 'p95', 'error_pct', 'run_id'))
+        messages = {
+            'slo': "SLO 不达标，拐点为最后一个达标的并发数",
+            'plateau': "吞吐量不再随并发数增长",
+            'max_users': "达到最大并发数时仍满足 SLO",
+            'max_steps': "达到最大步数",
+            'cancelled': "搜索已取消",
+            'failed': search.get('message') or "压测启动失败"
+        }
+        self._update(search, status=status, reason=reason, knee=knee, current_run=None,
+                     message=messages.get(reason),
+                     finished=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with self.lock:
+            self._cancel.pop(search['id'], None)
+        if knee:
+            self._log(LOG_LEVEL_INFO, f"Capacity search {search['id']} finished ({reason}): knee at "
+                                      f"{knee['users']} users, {knee['throughput']:.1f}/s")
+        else:
+            self._log(LOG_LEVEL_WARN, f"Capacity search {search['id']} finished ({reason}) without a passing step")
+
+    def _search(self, search, cancel):
+        """Search loop; returns (stop reason, best passing step or None)"""
+        plateau = search['plateau_pct'] / 100.0
+        good = None    # 满足 SLO 且吞吐量仍在增长的最大并发数对应的步骤
+        upper = None   # 已知不满足条件的最小并发数
+
+        def step(users):
+            if len(search['steps']) >= search['max_steps'] or cancel.is_set():
+                return None
+            if len(search['steps']) and cancel.wait(self.pause):
+                return None
+            return self._run_step(search, users, cancel)
+
+        def gains(result):
+            # 与当前最好的达标点相比吞吐量是否有明显增长
+            return good is None or result['throughput'] > good['throughput'] * (1 + plateau)
+
+        def stop_reason():
+            if cancel.is_set():
+                return 'cancelled'
+            if len(search['steps']) >= search['max_steps']:
+                return 'max_steps'
+            return 'failed'
+
+        users = search['min_users']
+        if search['mode'] == 'binary':
+            result = step(users)
+            if result is None:
+                return stop_reason(), good
+            if not result['slo_ok']:
+                return 'slo', None
+            good = result
+            if result['users'] >= search['max_users']:
+                return 'max_users', good
+            users = search['max_users']
+        # adaptive: 按倍数增加，直到 SLO 不达标、吞吐量不再增长或到达最大并发数
+        # （binary 模式下这一阶段只执行 max_users 一步）
+        upper_reason = None
+        while upper is None:
+            result = step(users)
+            if result is None:
+                return stop_reason(), good
+            if not result['slo_ok'] or not gains(result):
+                upper = result['users']
+                upper_reason = 'slo' if not result['slo_ok'] else 'plateau'
+            else:
+                good = result
+                if result['users'] >= search['max_users']:
+                    return 'max_users', good
+                users = min(search['max_users'], max(result['users'] + 1, int(result['users'] * search['growth'])))
+        if good is None:
+            return upper_reason, None
+        # 二分: good 满足条件且吞吐量仍在增长，upper 不满足
+        while upper - good['users'] > search['precision']:
+            low, high = good['users'], upper
+            result = step((low + high) // 2)
+            if result is None:
+                return stop_reason(), good
+            if result['slo_ok'] and gains(result):
+                good = result
+            else:
+                upper = result['users']
+                upper_reason = 'slo' if not result['slo_ok'] else 'plateau'
+            # 线程数按 slave 数向上取整后可能落在区间之外，此时无法继续细分
+            if not low < result['users'] < high:
+                break
+        return upper_reason, good
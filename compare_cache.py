@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# 报告对比结果缓存
+#
+# 对比结果按两个 statistics.json 的内容哈希寻址: 同一对报告再次对比时直接返回已有
+# 结果，报告重新生成（内容变化）后自然得到新的键。缓存目录按条目数和总大小限制，
+# 超出时淘汰最久未使用的结果（命中时更新文件 mtime）。
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{24}$')
+FILE_PREFIX = 'performance_data_'
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class CompareCache:
+    """Content-addressed, size-bounded LRU cache of comparison results"""
+
+    def __init__(self, cache_dir, max_entries=200, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = str(cache_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(file1_path, file2_path):
+        """Cache key of an ordered (baseline, current) statistics.json pair
+
+        除内容哈希外还包含报告目录名，对比结果中会显示报告名称。
+        """
+        names = [os.path.basename(os.path.dirname(os.path.abspath(str(path)))) for path in (file1_path, file2_path)]
+        pair = f"{file_digest(file1_path)}:{file_digest(file2_path)}:{names[0]}:{names[1]}"
+        return hashlib.sha256(pair.encode('utf-8')).hexdigest()[:24]
+
+    @staticmethod
+    def filename(key):
+        return f"{FILE_PREFIX}{key}.json"
+
+    def path(self, key):
+        """Path of a cached result, or None; a hit refreshes its LRU position"""
+        if not KEY_PATTERN.match(key):
+            return None
+        path = os.path.join(self.cache_dir, self.filename(key))
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def get_or_create(self, file1_path, file2_path, generate):
+        """Return (key, path, cached) for a report pair
+
+        Args:
+            generate: generate(output_dir, output_filename) -> 生成的文件路径，缓存未命中时调用
+        """
+        key = self.key(file1_path, file2_path)
+        with self.lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # 同一对报告同时请求时只生成一次
+        with key_lock:
+            try:
+                path = self.path(key)
+                if path:
+                    return key, path, True
+                filename = self.filename(key)
+                work_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+                try:
+                    produced = generate(work_dir, filename)
+                    if not produced or not os.path.exists(produced):
+                        produced = self._find(work_dir, filename)
+                    if produced is None:
+                        raise RuntimeError(f"comparison did not produce {filename}")
+                    path = os.path.join(self.cache_dir, filename)
+                    os.replace(produced, path)
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+            finally:
+                with self.lock:
+                    self._key_locks.pop(key, None)
+        self.evict()
+        return key, path, False
+
+    @staticmethod
+    def _find(directory, filename):
+        for root, _, files in os.walk(directory):
+            if filename in files:
+                return os.path.join(root, filename)
+        return None
+
+    def entries(self):
+        """Cached results as (path, size, mtime), least recently used first"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.startswith(FILE_PREFIX):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda item: item[2])
+        return entries
+
+    def evict(self):
+        """Drop least recently used results beyond the entry and size limits; returns removed count"""
+        with self.lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+                path, size, _ = entries.pop(0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes
+        }
@@ -12,9 +12,91 @@ JMX_DIR = BASE_DIR / "testplan"
 HTML_DIR = BASE_DIR / "report" / "html"
 JTL_DIR = BASE_DIR / "jtl"
 LOG_DIR = BASE_DIR / "log"
+# 每次压测数据回传阶段的耗时记录（JSON Lines）
+TRANSFER_METRICS_FILE = LOG_DIR / "transfer_metrics.jsonl"
+
+# JTL增量检查点配置
+JTL_CHECKPOINT_INTERVAL = 20         # 数据回传期间每隔多少秒做一次检查点
+JTL_CHECKPOINT_COPY_DATA = True      # True: 追加保存增量数据，可恢复; False: 只记录偏移和哈希
+JTL_CHECKPOINT_RETENTION_DAYS = 3    # 超过天数的检查点文件自动清理
+JTL_TRANSFER_IDLE_TIMEOUT = 120      # 数据回传期间JTL连续多少秒没有变化时停止等待
+JTL_TRANSFER_MAX_WAIT = None         # 数据回传总等待时间上限（秒），None 表示不限制
+
+# 测试结束后把JTL转换为列式存储（jtl/<运行ID>.cols/），供后续分析对比使用
+COLUMNAR_STORE_ENABLED = True
+
+# HTML报告生成配置
+DEFER_HTML_REPORT = False    # True: 压测只写JTL，结束后由后台队列执行 jmeter -g 生成报告
+REPORT_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # 同时生成报告的JMeter进程数
+
+# 异步SSE推送服务（日志流、实时统计），单独监听一个端口，一个事件循环线程服务所有订阅者
+SSE_SERVER_ENABLED = True
+SSE_SERVER_HOST = "0.0.0.0"
+SSE_SERVER_PORT = 5002
+
+# 报告静态文件配置
+REPORT_PRECOMPRESS = True        # 报告生成后预先生成 .gz（安装 brotli 时还有 .br）压缩副本
+REPORT_CACHE_MAX_AGE = 31536000  # 已完成报告中第三方静态资源（sbadmin2）的缓存时间（秒），标记为 immutable
+REPORT_X_SENDFILE = False        # 由前置 nginx/Apache 通过 X-Sendfile 发送文件
+
+# 报告对比结果缓存（按两个 statistics.json 的内容哈希寻址，超出限制时淘汰最久未使用的结果）
+COMPARE_CACHE_DIR = BASE_DIR / "reportdiff" / "analysis" / "compare_cache"
+COMPARE_CACHE_MAX_ENTRIES = 500
+COMPARE_CACHE_MAX_MB = 200
+
+# 资源监控: 测试期间接收各主机采集代理推送的资源数据（resource_monitor.py）
+RESOURCE_MONITOR_ENABLED = True
+RESOURCE_LOCAL_AGENT = True      # 在控制端本机启动进程内采集代理
+RESOURCE_SAMPLE_INTERVAL = 1     # 本机采样间隔（秒）
+
+# Backend Listener 指标接收（metrics_receiver.py）: 同一端口接收 UDP/TCP 的 Graphite/InfluxDB 行协议，
+# JMX 中 Backend Listener 的地址使用 ${__P(metrics_host)}:${__P(metrics_port)}，
+# application（Graphite 为 rootMetricsPrefix）使用 ${__P(metrics_application)}
+METRICS_RECEIVER_ENABLED = True
+METRICS_RECEIVER_HOST = "0.0.0.0"
+METRICS_RECEIVER_PORT = 2003
+METRICS_ADVERTISE_HOST = None    # slave 连接控制端使用的地址，为空时取 REPORT_URL 中的主机
+# 是否由slave回传原始JTL（可在启动测试时通过 raw_jtl 覆盖）；关闭时不再等待数据回传，
+# 统计数据和时间序列来自 Backend Listener 的聚合结果
+RAW_JTL_ENABLED = True
+
+# 稳态窗口检测: 测试结束后去掉加压/减压阶段，另外生成 statistics_steady.json
+STEADY_STATE_ENABLED = True
+
+# 按slave拆分统计: 测试结束后比较各压测机的响应时间、连接时间和错误率，生成 slave_breakdown.json
+SLAVE_BREAKDOWN_ENABLED = True
+
+# 多分辨率时间序列: 测试结束后预先计算 1s/10s/1min/10min 汇总（JTL 旁边的 .timeseries.npz）
+TIMESERIES_ENABLED = True
+
+# 运行器自身的监控指标（/metrics，Prometheus 文本格式）
+RUNNER_METRICS_ENABLED = True
+
+# 报告索引（SQLite），/api/reports 从索引查询
+REPORT_INDEX_FILE = LOG_DIR / "report_index.db"
+
+# 压测任务队列持久化文件
+JOB_QUEUE_FILE = LOG_DIR / "job_queue.json"
+
+# 容量搜索（自动阶梯加压寻找拐点）
+CAPACITY_SEARCH_FILE = LOG_DIR / "capacity_searches.json"
+CAPACITY_STEP_DURATION = 120     # 每一步的默认时长（秒）
+CAPACITY_SLO_P95 = 1000          # 默认 p95 响应时间上限（毫秒）
+CAPACITY_SLO_ERROR_PCT = 1.0     # 默认错误率上限（%）
+CAPACITY_PLATEAU_PCT = 5.0       # 吞吐量增长低于该百分比视为平台期
+CAPACITY_STEP_PAUSE = 5          # 两步之间的间隔（秒）
 
 # 远程服务器配置
 REMOTE_SERVERS = "192.168.89.158,192.168.89.176"
+# slave资源池注册表（CPU核数、堆内存、最大线程数、健康状态），首次启动时由 REMOTE_SERVERS 初始化
+SLAVE_POOL_FILE = LOG_DIR / "slave_pool.json"
+
+# slave健康检查配置
+SLAVE_PROBE_TIMEOUT = 3        # 单个slave连接/握手超时（秒）
+SLAVE_PROBE_DEADLINE = 5       # 一次并发检查的整体截止时间（秒）
+SLAVE_HEALTH_TTL = 30          # 健康检查结果缓存有效期（秒）
+SLAVE_PROBE_INTERVAL = 10      # 后台探测间隔（秒）
+SLAVE_RMI_CHECK = True         # True: TCP连接后再做RMI(JRMP)握手; False: 只检查端口
 REPORT_URL = "http://192.168.89.157:5001"
 
 # 微信机器人配置
@@ -38,6 +120,9 @@ LOG_LEVEL_WARN = 2
 LOG_LEVEL_ERROR = 3
 CURRENT_LOG_LEVEL = int(os.environ.get('LOG_LEVEL', LOG_LEVEL_INFO))
 
+# python app.py 是否以 Flask debug 模式（带自动重载）运行
+APP_DEBUG = os.environ.get('APP_DEBUG', 'true').lower() in ('1', 'true', 'yes')
+
 # 创建必要的目录
 def create_required_directories():
     """创建必要的目录结构"""
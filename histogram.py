@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# 可合并的响应时间直方图（HDR Histogram 的简化实现）
+#
+# 0~127ms 每毫秒一个桶，之后每个 2 的幂区间再均分为 64 个子桶，
+# 相对误差不超过 1/64。直方图之间可以直接相加合并，用于实时统计和时间序列汇总。
+
+import numpy as np
+
+SUB_BUCKET_BITS = 6
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS          # 64
+LINEAR_LIMIT = SUB_BUCKET_COUNT * 2              # 128
+# 覆盖到 2^40 ms，远超任何实际响应时间
+MAX_EXPONENT = 40
+BUCKET_COUNT = LINEAR_LIMIT + (MAX_EXPONENT - SUB_BUCKET_BITS - 1) * SUB_BUCKET_COUNT
+
+
+def bucket_index(values):
+    """Map non-negative integer latencies (ms) to histogram bucket indexes"""
+    values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+    index = values.copy()
+    large = values >= LINEAR_LIMIT
+    if large.any():
+        v = values[large]
+        # frexp 返回 v = m * 2**e, 0.5 <= m < 1，最高位为 e - 1
+        exponent = np.frexp(v.astype(np.float64))[1].astype(np.int64) - 1
+        shift = exponent - SUB_BUCKET_BITS
+        sub = (v >> shift) - SUB_BUCKET_COUNT
+        index[large] = LINEAR_LIMIT + (exponent - SUB_BUCKET_BITS - 1) * SUB_BUCKET_COUNT + sub
+    return np.minimum(index, BUCKET_COUNT - 1)
+
+
+def bucket_upper_value(index):
+    """Highest latency that falls into the given bucket(s)"""
+    index = np.asarray(index, dtype=np.int64)
+    linear = index < LINEAR_LIMIT
+    offset = np.maximum(index - LINEAR_LIMIT, 0)
+    exponent = offset // SUB_BUCKET_COUNT + SUB_BUCKET_BITS + 1
+    sub = offset % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT
+    shift = exponent - SUB_BUCKET_BITS
+    upper = ((sub + 1) << shift) - 1
+    return np.where(linear, index, upper)
+
+
+def percentiles_from_counts(counts, percents):
+    """Compute percentiles from a dense bucket-count array"""
+    counts = np.asarray(counts)
+    total = counts.sum()
+    if total == 0:
+        return [None for _ in percents]
+    cumulative = np.cumsum(counts)
+    ranks = np.ceil(np.asarray(percents, dtype=np.float64) / 100.0 * total)
+    ranks = np.clip(ranks, 1, total)
+    buckets = np.searchsorted(cumulative, ranks)
+    return [float(v) for v in bucket_upper_value(buckets)]
+
+
+class LatencyHistogram:
+    """Mergeable latency histogram with fixed log-linear buckets"""
+
+    def __init__(self, counts=None):
+        if counts is None:
+            counts = np.zeros(BUCKET_COUNT, dtype=np.int64)
+        self.counts = counts
+
+    def add(self, values):
+        """Record an array of latencies"""
+        if len(values) == 0:
+            return
+        self.counts += np.bincount(bucket_index(values), minlength=BUCKET_COUNT)
+
+    def merge(self, other):
+        """Add another histogram's counts into this one"""
+        self.counts += other.counts
+        return self
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def percentiles(self, percents):
+        return percentiles_from_counts(self.counts, percents)
+
+    def percentile(self, percent):
+        return self.percentiles([percent])[0]
+
+    def to_sparse(self):
+        """Return (bucket_indexes, counts) for the non-empty buckets"""
+        nonzero = np.nonzero(self.counts)[0]
+        return nonzero, self.counts[nonzero]
+
+    @classmethod
+    def from_sparse(cls, indexes, counts):
+        histogram = cls()
+        np.add.at(histogram.counts, np.asarray(indexes, dtype=np.int64), counts)
+        return histogram
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# JTL 统计引擎
+#
+# 直接从 JTL（列式存储）计算与 JMeter 报告中 statistics.json 相同的指标，
+# 不需要等待 JMeter 生成 HTML 报告。计算口径与 JMeter 报告生成器一致:
+#   - 百分位使用 Commons Math 的 LEGACY 估计方法
+#   - 百分位只基于最近 jmeter.reportgenerator.statistic_window 个样本（默认 20000）
+#   - 吞吐量 = 样本数 / (最晚结束时间 - 最早开始时间)
+
+import json
+import math
+
+import numpy as np
+
+from jtl_store import load_jtl
+
+# jmeter.reportgenerator.statistic_window 默认值，-1 表示使用全部样本
+STATISTIC_WINDOW = 20000
+# aggregate_rpt_pct1/2/3 默认值
+PERCENTILES = (90, 95, 99)
+TOTAL_LABEL = 'Total'
+
+
+def legacy_percentile(sorted_values, percent):
+    """Percentile with Apache Commons Math's LEGACY estimation (used by JMeter)"""
+    n = len(sorted_values)
+    if n == 0:
+        return float('nan')
+    if n == 1:
+        return float(sorted_values[0])
+    pos = percent * (n + 1) / 100.0
+    floor_pos = math.floor(pos)
+    int_pos = int(floor_pos)
+    dif = pos - floor_pos
+    if pos < 1:
+        return float(sorted_values[0])
+    if pos >= n:
+        return float(sorted_values[-1])
+    lower = float(sorted_values[int_pos - 1])
+    upper = float(sorted_values[int_pos])
+    return lower + dif * (upper - lower)
+
+
+def summarize_samples(name, elapsed, timestamps, success, received, sent,
+                      window_elapsed=None, percentiles=PERCENTILES, timestamp_is_start=True):
+    """Build one statistics.json entry from parallel sample arrays
+
+    Args:
+        window_elapsed: 用于计算百分位的样本（按 JTL 顺序的最后 window 个），默认全部
+    """
+    count = len(elapsed)
+    elapsed = np.asarray(elapsed)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if timestamp_is_start:
+        starts = timestamps
+    else:
+        starts = timestamps - elapsed
+    ends = starts + elapsed
+    duration_ms = float(ends.max() - starts.min())
+    seconds = duration_ms / 1000.0
+
+    errors = int(count - np.count_nonzero(success))
+    sorted_window = np.sort(elapsed if window_elapsed is None else np.asarray(window_elapsed))
+    entry = {
+        'transaction': name,
+        'sampleCount': count,
+        'errorCount': errors,
+        'errorPct': errors * 100.0 / count,
+        'meanResTime': float(elapsed.sum(dtype=np.int64)) / count,
+        'medianResTime': legacy_percentile(sorted_window, 50),
+        'minResTime': float(elapsed.min()),
+        'maxResTime': float(elapsed.max()),
+        'pct1ResTime': legacy_percentile(sorted_window, percentiles[0]),
+        'pct2ResTime': legacy_percentile(sorted_window, percentiles[1]),
+        'pct3ResTime': legacy_percentile(sorted_window, percentiles[2]),
+        'throughput': count / seconds if seconds > 0 else 0.0,
+        'receivedKBytesPerSec': float(np.sum(received, dtype=np.int64)) / 1024.0 / seconds if seconds > 0 else 0.0,
+        'sentKBytesPerSec': float(np.sum(sent, dtype=np.int64)) / 1024.0 / seconds if seconds > 0 else 0.0
+    }
+    return entry
+
+
+def _column(data, name, rows):
+    if name in data:
+        return data[name][rows]
+    return np.zeros(rows.stop - rows.start if isinstance(rows, slice) else len(rows), dtype=np.int64)
+
+
+def compute_statistics(data, window=STATISTIC_WINDOW, percentiles=PERCENTILES,
+                       timestamp_is_start=True, mask=None):
+    """Compute statistics.json content from a ColumnarJtl
+
+    Args:
+        data: jtl_store.ColumnarJtl
+        window: 百分位计算的滑动窗口大小，-1 表示全部样本
+        mask: 可选的布尔数组（与存储行一一对应），只统计为 True 的样本
+
+    Returns:
+        dict，结构与 JMeter statistics.json 相同（Total 在前，其余按标签名排序）
+    """
+    statistics = {}
+    if data.rows == 0:
+        return statistics
+
+    def entry_for(name, rows, row_numbers=None):
+        elapsed = data['elapsed'][rows]
+        timestamps = data['timeStamp'][rows]
+        success = data['success'][rows]
+        received = _column(data, 'bytes', rows)
+        sent = _column(data, 'sent_bytes', rows)
+        if mask is not None:
+            selected = mask[rows]
+            if not selected.any():
+                return None
+            elapsed, timestamps, success = elapsed[selected], timestamps[selected], success[selected]
+            received, sent = received[selected], sent[selected]
+            if row_numbers is not None:
+                row_numbers = row_numbers[selected]
+        window_elapsed = None
+        if window is not None and window > 0 and len(elapsed) > window:
+            if row_numbers is None:
+                window_elapsed = elapsed[-window:]
+            else:
+                # Total 的窗口是整个 JTL 中最后 window 个样本
+                threshold = np.partition(row_numbers, len(row_numbers) - window)[len(row_numbers) - window]
+                window_elapsed = elapsed[row_numbers >= threshold]
+        return summarize_samples(name, elapsed, timestamps, success, received, sent,
+                                 window_elapsed=window_elapsed, percentiles=percentiles,
+                                 timestamp_is_start=timestamp_is_start)
+
+    total = entry_for(TOTAL_LABEL, slice(0, data.rows), row_numbers=data['row'][:])
+    if total is None:
+        return statistics
+    statistics[TOTAL_LABEL] = total
+    for label in sorted(data.labels()):
+        entry = entry_for(label, data.label_slice(label))
+        if entry is not None:
+            statistics[label] = entry
+    return statistics
+
+
+def statistics_for_jtl(jtl_file, **kwargs):
+    """Compute statistics.json content straight from a JTL file"""
+    return compute_statistics(load_jtl(jtl_file), **kwargs)
+
+
+def write_statistics_json(statistics, path):
+    """Write statistics in the same layout JMeter uses for statistics.json"""
+    with open(path, 'w') as f:
+        f.write(json.dumps(statistics, indent=2, separators=(',', ' : '), ensure_ascii=False))
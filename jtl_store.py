@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# JTL 列式存储
+#
+# 压测结束后把 CSV 格式的 JTL 转换为按列存放的 NumPy .npy 文件（目录
+# <运行ID>.cols/），每列使用紧凑的定长类型，标签、响应码等字符串列
+# 存为整数编码。之后的分析和对比直接以内存映射方式加载，不再重复解析 CSV。
+#
+# 行按标签稳定排序（同一标签内保持 JTL 中的原始顺序），index.json 中记录每个
+# 标签的行范围，按标签读取时只需要切片。
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from jtl_stream import parse_header
+
+STORE_SUFFIX = '.cols'
+INDEX_FILE = 'index.json'
+FORMAT_VERSION = 1
+CHUNK_ROWS = 500000
+
+# 数值列: 名称 -> (JTL 列名, 存储类型)
+NUMERIC_COLUMNS = {
+    'timeStamp': ('timeStamp', np.int64),
+    'elapsed': ('elapsed', np.int32),
+    'latency': ('Latency', np.int32),
+    'connect': ('Connect', np.int32),
+    'bytes': ('bytes', np.int64),
+    'sent_bytes': ('sentBytes', np.int64),
+    'grp_threads': ('grpThreads', np.int32),
+    'all_threads': ('allThreads', np.int32),
+}
+# 分类列: 名称 -> JTL 列名（host 由 hostname 或 threadName 推导）
+CATEGORICAL_COLUMNS = {
+    'label': 'label',
+    'response_code': 'responseCode',
+    'host': 'hostname',
+}
+CODE_DTYPE = np.int32
+
+# 同一个列式存储目录的转换互斥，测试结束后的后台处理和按需分析接口可能同时触发转换
+_conversion_locks = {}
+_conversion_locks_guard = threading.Lock()
+
+
+def store_path(jtl_file):
+    """Directory holding the columnar copy of a JTL file"""
+    base = str(jtl_file)
+    if base.endswith('.jtl'):
+        base = base[:-4]
+    return base + STORE_SUFFIX
+
+
+def _conversion_lock(output_dir):
+    with _conversion_locks_guard:
+        lock = _conversion_locks.get(output_dir)
+        if lock is None:
+            lock = _conversion_locks[output_dir] = threading.RLock()
+        return lock
+
+
+def _bad_lines_kwargs():
+    """read_csv options to skip malformed rows across pandas versions"""
+    major, minor = (int(part) for part in pd.__version__.split('.')[:2])
+    if (major, minor) >= (1, 3):
+        return {'on_bad_lines': 'skip'}
+    return {'error_bad_lines': False, 'warn_bad_lines': False}
+
+
+def host_from_thread_names(thread_names):
+    """Derive the load generator from distributed thread names
+
+    分布式压测时线程名形如 "192.168.89.158-Thread Group 1-1"，取第一个 '-' 之前的部分。
+    """
+    names = thread_names.astype(str)
+    parts = names.str.split('-', n=1)
+    has_prefix = names.str.count('-') >= 2
+    return parts.str[0].where(has_prefix, '')
+
+
+class _CategoryEncoder:
+    """Assign stable integer codes to category values across chunks"""
+
+    def __init__(self):
+        self.mapping = {}
+        self.values = []
+
+    def encode(self, series):
+        codes, uniques = pd.factorize(series.fillna(''))
+        lookup = np.empty(len(uniques), dtype=CODE_DTYPE)
+        for i, value in enumerate(uniques):
+            value = str(value)
+            code = self.mapping.get(value)
+            if code is None:
+                code = self.mapping[value] = len(self.values)
+                self.values.append(value)
+            lookup[i] = code
+        return lookup[codes]
+
+
+def convert_jtl_to_columnar(jtl_file, output_dir=None, chunk_rows=CHUNK_ROWS):
+    """Convert a CSV JTL into the columnar store
+
+    Returns:
+        列式存储目录路径
+    """
+    jtl_file = str(jtl_file)
+    output_dir = output_dir or store_path(jtl_file)
+    with _conversion_lock(output_dir):
+        # 每次转换写入独立的临时目录，其他进程同时转换也不会互相删除文件
+        tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(output_dir) + '.', suffix='.tmp',
+                                   dir=os.path.dirname(os.path.abspath(output_dir)))
+        try:
+            _convert(jtl_file, tmp_dir, chunk_rows)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        # 先把旧目录移开再换入新目录，替换期间不会出现半个目录；已打开旧存储的
+        # 内存映射在删除后仍然有效
+        old_dir = tmp_dir + '.old'
+        try:
+            os.rename(output_dir, old_dir)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rename(tmp_dir, output_dir)
+        except OSError:
+            # 另一个进程已经换入了它的转换结果
+            if not os.path.exists(os.path.join(output_dir, INDEX_FILE)):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return output_dir
+
+
+def _convert(jtl_file, tmp_dir, chunk_rows):
+    """Write the columnar files of jtl_file into tmp_dir"""
+    with open(jtl_file, 'r', errors='replace') as f:
+        columns, delimiter = parse_header(f.readline())
+    source_stat = os.stat(jtl_file)
+
+    numeric = {name: spec for name, spec in NUMERIC_COLUMNS.items() if spec[0] in columns}
+    categorical = {name: col for name, col in CATEGORICAL_COLUMNS.items() if col in columns}
+    derive_host = 'host' not in categorical and 'threadName' in columns
+    usecols = [spec[0] for spec in numeric.values()] + list(categorical.values())
+    if 'success' in columns:
+        usecols.append('success')
+    if derive_host:
+        usecols.append('threadName')
+    dtypes = {col: str for col in categorical.values()}
+    dtypes.update({'success': str, 'threadName': str})
+
+    encoders = {name: _CategoryEncoder() for name in list(categorical) + (['host'] if derive_host else [])}
+    raw_files = {}
+    rows = 0
+
+    def append(name, values):
+        raw = raw_files.get(name)
+        if raw is None:
+            raw = raw_files[name] = open(os.path.join(tmp_dir, name + '.bin'), 'wb')
+        values.tofile(raw)
+
+    try:
+        reader = pd.read_csv(
+            jtl_file, sep=delimiter, usecols=usecols, dtype={k: v for k, v in dtypes.items() if k in usecols},
+            chunksize=chunk_rows, keep_default_na=False, low_memory=False, **_bad_lines_kwargs()
+        )
+        for chunk in reader:
+            timestamps = pd.to_numeric(chunk['timeStamp'], errors='coerce')
+            chunk = chunk[timestamps.notna()]
+            if chunk.empty:
+                continue
+            for name, (col, dtype) in numeric.items():
+                values = pd.to_numeric(chunk[col], errors='coerce').fillna(0)
+                append(name, values.to_numpy().astype(dtype))
+            for name, col in categorical.items():
+                append(name, encoders[name].encode(chunk[col]))
+            if derive_host:
+                append('host', encoders['host'].encode(host_from_thread_names(chunk['threadName'])))
+            if 'success' in chunk:
+                append('success', (chunk['success'].str.lower() == 'true').to_numpy())
+            else:
+                append('success', np.ones(len(chunk), dtype=bool))
+            append('row', np.arange(rows, rows + len(chunk), dtype=np.int64))
+            rows += len(chunk)
+    finally:
+        for raw in raw_files.values():
+            raw.close()
+
+    dtypes_out = {name: np.dtype(spec[1]) for name, spec in numeric.items()}
+    dtypes_out.update({name: np.dtype(CODE_DTYPE) for name in encoders})
+    dtypes_out['success'] = np.dtype(bool)
+    dtypes_out['row'] = np.dtype(np.int64)
+
+    # 按标签稳定排序，生成每个标签的行范围索引
+    label_ranges = {}
+    order = None
+    if 'label' in encoders and rows:
+        label_codes = np.fromfile(os.path.join(tmp_dir, 'label.bin'), dtype=CODE_DTYPE)
+        order = np.argsort(label_codes, kind='stable')
+        sorted_codes = label_codes[order]
+        for code, value in enumerate(encoders['label'].values):
+            start = int(np.searchsorted(sorted_codes, code, side='left'))
+            end = int(np.searchsorted(sorted_codes, code, side='right'))
+            label_ranges[value] = [start, end]
+        del label_codes, sorted_codes
+
+    for name, dtype in dtypes_out.items():
+        raw_path = os.path.join(tmp_dir, name + '.bin')
+        values = np.fromfile(raw_path, dtype=dtype) if os.path.exists(raw_path) else np.zeros(0, dtype=dtype)
+        out = np.lib.format.open_memmap(os.path.join(tmp_dir, name + '.npy'), mode='w+',
+                                        dtype=dtype, shape=(rows,))
+        if rows:
+            out[:] = values[order] if order is not None else values
+        out.flush()
+        del out, values
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+    index = {
+        'version': FORMAT_VERSION,
+        'source': os.path.basename(jtl_file),
+        'source_size': source_stat.st_size,
+        'source_mtime': source_stat.st_mtime,
+        'rows': rows,
+        'columns': {name: str(dtype) for name, dtype in dtypes_out.items()},
+        'categories': {name: encoder.values for name, encoder in encoders.items()},
+        'label_ranges': label_ranges
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILE), 'w') as f:
+        json.dump(index, f, ensure_ascii=False)
+
+
+def is_store_fresh(jtl_file):
+    """True if the columnar store exists and matches the JTL it came from"""
+    path = os.path.join(store_path(jtl_file), INDEX_FILE)
+    if not os.path.exists(path) or not os.path.exists(jtl_file):
+        return False
+    with open(path, 'r') as f:
+        index = json.load(f)
+    return index.get('version') == FORMAT_VERSION and index.get('source_size') == os.path.getsize(jtl_file)
+
+
+class ColumnarJtl:
+    """Memory-mapped view of a columnar JTL store"""
+
+    def __init__(self, path, mmap=True):
+        self.path = str(path)
+        with open(os.path.join(self.path, INDEX_FILE), 'r') as f:
+            self.index = json.load(f)
+        self.rows = self.index['rows']
+        self.categories = self.index['categories']
+        self.label_ranges = self.index['label_ranges']
+        self._mmap_mode = 'r' if mmap else None
+        self._columns = {}
+
+    def __contains__(self, name):
+        return name in self.index['columns']
+
+    def __getitem__(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            column = np.load(os.path.join(self.path, name + '.npy'), mmap_mode=self._mmap_mode)
+            self._columns[name] = column
+        return column
+
+    def labels(self):
+        return list(self.label_ranges)
+
+    def label_slice(self, label):
+        start, end = self.label_ranges[label]
+        return slice(start, end)
+
+    def decode(self, name, codes):
+        """Turn category codes back into their string values"""
+        values = np.asarray(self.categories[name], dtype=object)
+        return values[np.asarray(codes)]
+
+
+def load_jtl(jtl_file, convert=True):
+    """Open the columnar store for a JTL, converting it first when needed"""
+    path = store_path(jtl_file)
+    if not is_store_fresh(jtl_file):
+        if not convert:
+            return None
+        with _conversion_lock(path):
+            # 等待锁期间其他线程可能已经完成转换
+            if not is_store_fresh(jtl_file):
+                convert_jtl_to_columnar(jtl_file)
+    return ColumnarJtl(path)
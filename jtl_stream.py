@@ -0,0 +1,787 @@
+# -*- coding: utf-8 -*-
+# JTL 文件流式处理工具
+#
+# JTL 文件在多 slave 压测下可能达到数 GB，这里的函数都按固定大小的块读取，
+# 内存占用与文件大小无关。
+
+import csv
+import ctypes
+import ctypes.util
+import hashlib
+import io
+import json
+import os
+import re
+import select
+import shutil
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from histogram import LatencyHistogram
+
+# 每次读取的块大小
+CHUNK_SIZE = 1024 * 1024
+# 单条记录的最大长度，超过后认为引号未闭合导致格式损坏
+MAX_RECORD_BYTES = 1024 * 1024
+# 最多记录多少个异常行的字节偏移
+MAX_REPORTED_OFFSETS = 20
+# JMeter 可配置的分隔符（jmeter.save.saveservice.default_delimiter）
+CANDIDATE_DELIMITERS = [',', '\t', ';', '|']
+# JMeter 汇总输出，例如 "summary =   1234 in 00:00:30 =   41.1/s Avg: ..."
+SUMMARY_PATTERN = re.compile(r'summary =\s+(\d+)\s+in')
+
+
+def detect_delimiter(header):
+    """Guess the JTL delimiter from the header line"""
+    for delimiter in CANDIDATE_DELIMITERS:
+        if delimiter in header:
+            return delimiter
+    return ','
+
+
+def parse_header(header):
+    """Split a JTL header line into column names"""
+    header = header.strip('\r\n')
+    delimiter = detect_delimiter(header)
+    return next(csv.reader([header], delimiter=delimiter)), delimiter
+
+
+def read_jtl_tail(jtl_file, max_bytes=64 * 1024):
+    """Read the last complete line of a JTL by seeking from the end
+
+    Returns:
+        (last_line, ends_with_newline)，文件为空时返回 ('', False)
+    """
+    file_size = os.path.getsize(jtl_file)
+    if file_size == 0:
+        return '', False
+    with open(jtl_file, 'rb') as f:
+        read_size = min(file_size, max_bytes)
+        f.seek(file_size - read_size)
+        data = f.read(read_size)
+    ends_with_newline = data.endswith(b'\n')
+    lines = data.rstrip(b'\r\n').split(b'\n')
+    return lines[-1].decode('utf-8', errors='replace').rstrip('\r'), ends_with_newline
+
+
+def _record_field_count(record, delimiter):
+    """Field count of a record that contains quoted fields"""
+    text = record.decode('utf-8', errors='replace')
+    rows = list(csv.reader(io.StringIO(text, newline=''), delimiter=delimiter))
+    if len(rows) != 1:
+        return -1
+    return len(rows[0])
+
+
+def _rows_have_seps(body, sep, expected_seps):
+    """True if every newline-terminated row in body has exactly expected_seps separators
+
+    用 numpy 定位分隔符和换行符，按行统计分隔符个数；多字节分隔符返回 False，
+    由调用方走逐行检查。
+    """
+    if len(sep) != 1:
+        return False
+    data = np.frombuffer(body, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord(b'\n'))
+    seps_before = np.searchsorted(np.flatnonzero(data == sep[0]), newlines)
+    per_row = np.diff(seps_before, prepend=0)
+    return bool((per_row == expected_seps).all())
+
+
+def scan_jtl(jtl_file, chunk_size=CHUNK_SIZE):
+    """Validate a JTL file in a single buffered pass
+
+    检查标题行、统计数据行数、检查文件末尾是否完整，并记录字段数与标题不一致
+    的异常行的字节偏移。不含引号的块用 numpy 按行统计分隔符个数判断，只有
+    对不上或者含有引号（字段中可能带分隔符或换行）的块才逐行解析。
+
+    Returns:
+        dict: valid, message, rows, bytes, columns, malformed,
+              malformed_offsets, tail_complete
+    """
+    result = {
+        'valid': False,
+        'message': '',
+        'rows': 0,
+        'bytes': 0,
+        'columns': [],
+        'malformed': 0,
+        'malformed_offsets': [],
+        'tail_complete': False
+    }
+
+    if not os.path.exists(jtl_file):
+        result['message'] = "文件不存在"
+        return result
+
+    file_size = os.path.getsize(jtl_file)
+    result['bytes'] = file_size
+    if file_size == 0:
+        result['message'] = "文件大小为0"
+        return result
+
+    with open(jtl_file, 'rb') as f:
+        header = f.readline()
+        columns, delimiter = parse_header(header.decode('utf-8', errors='replace'))
+        result['columns'] = columns
+        if 'timeStamp' not in columns:
+            result['message'] = "文件格式不正确，缺少timeStamp列"
+            return result
+
+        sep = delimiter.encode('utf-8')
+        expected_seps = len(columns) - 1
+        offset = len(header)
+        rows = 0
+        malformed_offsets = []
+        malformed = 0
+        last_ok = True
+        # 跨块的未完成行（或未闭合引号的多行记录）
+        pending = b''
+        pending_offset = offset
+
+        def check_record(record, record_offset):
+            nonlocal malformed
+            if b'"' in record:
+                ok = _record_field_count(record, delimiter) == len(columns)
+            else:
+                ok = record.count(sep) == expected_seps
+            if not ok:
+                malformed += 1
+                if len(malformed_offsets) < MAX_REPORTED_OFFSETS:
+                    malformed_offsets.append(record_offset)
+            return ok
+
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            data = pending + chunk
+            data_offset = pending_offset
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                pending = data
+                continue
+            body = data[:end]
+            pending = data[end:]
+            pending_offset = data_offset + end
+
+            if b'"' not in body and _rows_have_seps(body, sep, expected_seps):
+                # 快速路径: 每行分隔符数量正确
+                rows += body.count(b'\n')
+                last_ok = True
+                continue
+
+            # 慢速路径: 逐行检查，处理引号内的分隔符和换行
+            record = b''
+            record_offset = data_offset
+            line_offset = data_offset
+            for line in body.split(b'\n')[:-1]:
+                if not record:
+                    record_offset = line_offset
+                    record = line
+                else:
+                    record += b'\n' + line
+                line_offset += len(line) + 1
+                if record.count(b'"') % 2 and len(record) < MAX_RECORD_BYTES:
+                    continue  # 引号未闭合，记录跨行
+                rows += 1
+                last_ok = check_record(record, record_offset)
+                record = b''
+            if record:
+                # 未闭合的记录留到下一块继续拼接
+                pending = record + b'\n' + pending
+                pending_offset = record_offset
+
+        if pending:
+            # 文件末尾没有换行，最后一条记录可能正在写入或已被截断
+            rows += 1
+            last_ok = check_record(pending, pending_offset)
+        else:
+            result['tail_complete'] = True
+
+    result['rows'] = rows
+    result['malformed'] = malformed
+    result['malformed_offsets'] = malformed_offsets
+
+    if not result['tail_complete'] or not last_ok:
+        result['message'] = "最后一行数据不完整"
+        return result
+
+    result['valid'] = True
+    message = f"文件验证通过，包含{rows}条数据记录"
+    if malformed:
+        offsets = ', '.join(str(o) for o in malformed_offsets)
+        message += f"，其中{malformed}条格式异常（字节偏移: {offsets}）"
+    result['message'] = message
+    return result
+
+
+class LiveStats:
+    """Running per-label aggregates fed by JtlTailer"""
+
+    PERCENTS = [50, 90, 95, 99]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.labels = {}
+        self.total = self._new_entry()
+
+    @staticmethod
+    def _new_entry():
+        return {
+            'count': 0,
+            'errors': 0,
+            'sum': 0,
+            'min': None,
+            'max': None,
+            'first_ts': None,
+            'last_end': None,
+            'histogram': LatencyHistogram()
+        }
+
+    @staticmethod
+    def _update_entry(entry, timestamps, elapsed, errors):
+        entry['count'] += len(elapsed)
+        entry['errors'] += int(errors)
+        entry['sum'] += int(elapsed.sum())
+        low, high = int(elapsed.min()), int(elapsed.max())
+        entry['min'] = low if entry['min'] is None else min(entry['min'], low)
+        entry['max'] = high if entry['max'] is None else max(entry['max'], high)
+        first = int(timestamps.min())
+        last = int((timestamps + elapsed).max())
+        entry['first_ts'] = first if entry['first_ts'] is None else min(entry['first_ts'], first)
+        entry['last_end'] = last if entry['last_end'] is None else max(entry['last_end'], last)
+        entry['histogram'].add(elapsed)
+
+    def add_samples(self, labels, timestamps, elapsed, success):
+        """Aggregate a batch of parsed samples (parallel lists)"""
+        if not labels:
+            return
+        labels = np.asarray(labels, dtype=object)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        elapsed = np.asarray(elapsed, dtype=np.int64)
+        failed = ~np.asarray(success, dtype=bool)
+        with self.lock:
+            self._update_entry(self.total, timestamps, elapsed, failed.sum())
+            for label in set(labels.tolist()):
+                mask = labels == label
+                entry = self.labels.get(label)
+                if entry is None:
+                    entry = self.labels[label] = self._new_entry()
+                self._update_entry(entry, timestamps[mask], elapsed[mask], failed[mask].sum())
+
+    def _summarize(self, entry):
+        count = entry['count']
+        summary = {
+            'count': count,
+            'errors': entry['errors'],
+            'error_pct': entry['errors'] * 100.0 / count if count else 0.0,
+            'mean': entry['sum'] / count if count else None,
+            'min': entry['min'],
+            'max': entry['max'],
+            'throughput': 0.0
+        }
+        if count and entry['last_end'] > entry['first_ts']:
+            summary['throughput'] = count * 1000.0 / (entry['last_end'] - entry['first_ts'])
+        for percent, value in zip(self.PERCENTS, entry['histogram'].percentiles(self.PERCENTS)):
+            summary[f'p{percent}'] = value
+        return summary
+
+    def snapshot(self):
+        """Return a JSON-serializable view of the current aggregates"""
+        with self.lock:
+            return {
+                'total': self._summarize(self.total),
+                'labels': {label: self._summarize(entry) for label, entry in self.labels.items()}
+            }
+
+
+class JtlTailer:
+    """Follow a growing JTL file by byte offset and feed LiveStats
+
+    只解析新增的完整行，已读取的部分不会重复读取。
+    """
+
+    def __init__(self, jtl_file, interval=1.0):
+        self.jtl_file = jtl_file
+        self.interval = interval
+        self.stats = LiveStats()
+        self.offset = 0
+        self.rows = 0
+        self.columns = None
+        self.delimiter = ','
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._poll_lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop following and consume whatever is left in the file"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 5)
+        self.poll()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                pass  # 文件可能正在被创建或轮转，下次继续
+
+    def _read_header(self, f):
+        header = f.readline()
+        if not header.endswith(b'\n'):
+            return False
+        self.columns, self.delimiter = parse_header(header.decode('utf-8', errors='replace'))
+        self.offset = len(header)
+        return True
+
+    def poll(self):
+        """Read newly appended complete records; returns the number parsed"""
+        with self._poll_lock:
+            if not os.path.exists(self.jtl_file):
+                return 0
+            with open(self.jtl_file, 'rb') as f:
+                if self.columns is None and not self._read_header(f):
+                    return 0
+                f.seek(self.offset)
+                parsed = 0
+                # 未消费的尾部保留在缓冲区里，单条记录超过一个块时继续读，直到出现完整记录
+                buffer = bytearray()
+                while True:
+                    data = f.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    buffer += data
+                    end = buffer.rfind(b'\n') + 1
+                    if end == 0:
+                        continue
+                    body = buffer[:end]
+                    if body.count(b'"') % 2:
+                        # 引号未闭合，说明最后一条记录还没写完整
+                        end = body.rfind(b'\n', 0, end - 1) + 1
+                        if end == 0:
+                            continue
+                        body = body[:end]
+                    parsed += self._parse(bytes(body))
+                    self.offset += end
+                    del buffer[:end]
+            self.rows += parsed
+            return parsed
+
+    def _parse(self, body):
+        columns = self.columns
+        try:
+            ts_idx = columns.index('timeStamp')
+            elapsed_idx = columns.index('elapsed')
+            label_idx = columns.index('label')
+        except ValueError:
+            return 0
+        success_idx = columns.index('success') if 'success' in columns else None
+        width = len(columns)
+
+        labels, timestamps, elapsed, success = [], [], [], []
+        text = body.decode('utf-8', errors='replace')
+        for row in csv.reader(io.StringIO(text, newline=''), delimiter=self.delimiter):
+            if len(row) != width:
+                continue
+            try:
+                timestamp, duration = int(row[ts_idx]), int(row[elapsed_idx])
+            except ValueError:
+                continue
+            timestamps.append(timestamp)
+            elapsed.append(duration)
+            labels.append(row[label_idx])
+            success.append(success_idx is None or row[success_idx] == 'true')
+        self.stats.add_samples(labels, timestamps, elapsed, success)
+        return len(labels)
+
+    def snapshot(self):
+        snapshot = self.stats.snapshot()
+        snapshot['jtl_file'] = self.jtl_file
+        snapshot['rows'] = self.rows
+        snapshot['offset'] = self.offset
+        return snapshot
+
+
+# inotify 事件掩码（linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class FileChangeWatcher:
+    """Block until a file changes, using inotify with a polling fallback
+
+    监听文件所在目录，这样文件尚未创建时也能收到创建事件。
+    非 Linux 平台或 inotify 不可用时退化为按 poll_interval 轮询 size/mtime。
+    """
+
+    def __init__(self, path, poll_interval=0.25):
+        self.path = str(path)
+        self.name = os.path.basename(self.path).encode()
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.mode = 'polling'
+        self._last_stat = self._stat()
+        self._init_inotify()
+
+    def _init_inotify(self):
+        if not sys.platform.startswith('linux'):
+            return
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                os.close(fd)
+                return
+            self.fd = fd
+            self.mode = 'inotify'
+        except (OSError, AttributeError):
+            self.fd = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def _drain(self):
+        """Read pending inotify events; True if any concerns our file"""
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            if not data:
+                return changed
+            pos = 0
+            while pos + _INOTIFY_EVENT.size <= len(data):
+                _, _, _, name_len = _INOTIFY_EVENT.unpack_from(data, pos)
+                pos += _INOTIFY_EVENT.size
+                name = data[pos:pos + name_len].rstrip(b'\0')
+                pos += name_len
+                if name == self.name:
+                    changed = True
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds; return True if the file changed"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.fd is not None:
+                readable, _, _ = select.select([self.fd], [], [], remaining)
+                if readable and self._drain():
+                    return True
+            else:
+                time.sleep(min(self.poll_interval, remaining))
+                current = self._stat()
+                if current != self._last_stat:
+                    self._last_stat = current
+                    return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def find_summary_count(text_lines):
+    """Return the sample count of the last JMeter 'summary =' line, or None"""
+    count = None
+    for line in text_lines:
+        match = SUMMARY_PATTERN.search(line)
+        if match:
+            count = int(match.group(1))
+    return count
+
+
+def read_log_summary_count(log_file, max_bytes=256 * 1024):
+    """Find the final 'summary =' sample count near the end of a JMeter log"""
+    if not os.path.exists(log_file):
+        return None
+    file_size = os.path.getsize(log_file)
+    with open(log_file, 'rb') as f:
+        f.seek(max(0, file_size - max_bytes))
+        data = f.read().decode('utf-8', errors='replace')
+    return find_summary_count(data.splitlines())
+
+
+def wait_for_transfer(jtl_file, count_rows, expected_rows=None, timeout=120,
+                      quiet_period=2.0, short_quiet_grace=10.0, on_progress=None, max_wait=None):
+    """Wait until the JTL is complete, driven by file change events
+
+    完成条件（满足任一即可）:
+      1. 已知期望样本数（JMeter "summary =" 行）且 JTL 行数已达到，末尾行完整
+      2. 未知期望样本数时，文件在 quiet_period 内没有变化且末尾行完整
+      3. 已知期望样本数但行数不足时，文件静默超过 short_quiet_grace 秒
+
+    Args:
+        count_rows: 返回当前已写入 JTL 的记录数的函数（通常是 JtlTailer.poll 后的行数）
+        expected_rows: 期望样本数，可以是整数或返回整数/None 的函数
+        on_progress: 每次检查后调用 on_progress(rows, size)
+        timeout: 无活动超时（秒），从文件最后一次变化算起，slave 仍在回传数据时一直等待
+        max_wait: 总等待时间上限（秒），None 表示不限制
+
+    Returns:
+        dict: complete, reason, rows, bytes, seconds, events, mode
+    """
+    start = time.monotonic()
+    watcher = FileChangeWatcher(jtl_file)
+    events = 0
+    last_change = start
+    last_size = -1
+    result = {'complete': False, 'reason': 'timeout', 'rows': 0, 'bytes': 0,
+              'events': 0, 'mode': watcher.mode}
+    try:
+        while True:
+            exists = os.path.exists(jtl_file)
+            rows = count_rows() if exists else 0
+            size = os.path.getsize(jtl_file) if exists else 0
+            tail_complete = exists and size > 0 and read_jtl_tail(jtl_file)[1]
+            expected = expected_rows() if callable(expected_rows) else expected_rows
+            result['rows'], result['bytes'] = rows, size
+            if on_progress:
+                on_progress(rows, size)
+
+            now = time.monotonic()
+            if size != last_size:
+                # 轮询模式下没有写入事件，按文件大小变化判断活动
+                if last_size >= 0:
+                    last_change = now
+                last_size = size
+            quiet_for = now - last_change
+            if tail_complete:
+                if expected is not None and rows >= expected:
+                    result['complete'], result['reason'] = True, 'expected_rows'
+                    break
+                if expected is None and quiet_for >= quiet_period:
+                    result['complete'], result['reason'] = True, 'quiet'
+                    break
+                if expected is not None and quiet_for >= short_quiet_grace:
+                    result['complete'], result['reason'] = True, 'quiet_below_expected'
+                    break
+
+            remaining = timeout - quiet_for
+            if remaining <= 0:
+                break
+            if max_wait is not None:
+                if now - start >= max_wait:
+                    result['reason'] = 'max_wait'
+                    break
+                remaining = min(remaining, max_wait - (now - start))
+            # 等待下一次写入事件，最长等到静默期结束
+            target = quiet_period if expected is None else short_quiet_grace
+            wait_time = target - quiet_for if quiet_for < target else target
+            if watcher.wait(min(remaining, wait_time)):
+                events += 1
+                last_change = time.monotonic()
+    finally:
+        watcher.close()
+    result['events'] = events
+    result['seconds'] = time.monotonic() - start
+    return result
+
+
+class JtlCheckpoint:
+    """Incremental checkpoint of a growing JTL file
+
+    每次只处理上次检查点之后新增的完整记录：记录该段的字节偏移、长度和
+    SHA-256 到清单文件（{jtl}.ckpt.json）；copy_data 为 True 时同时把新增
+    数据追加到 {jtl}.ckpt，JTL 损坏或被截断时可以据此恢复。总磁盘 I/O 与
+    文件大小成正比，而不是每次全量复制。
+    """
+
+    def __init__(self, jtl_file, copy_data=True):
+        self.jtl_file = str(jtl_file)
+        self.copy_data = copy_data
+        self.data_file = f"{self.jtl_file}.ckpt"
+        self.manifest_file = f"{self.jtl_file}.ckpt.json"
+        self.segments = []
+        self.size = 0
+        if os.path.exists(self.manifest_file):
+            self._load()
+
+    def _load(self):
+        with open(self.manifest_file, 'r') as f:
+            manifest = json.load(f)
+        self.segments = manifest.get('segments', [])
+        self.size = manifest.get('size', 0)
+        self.copy_data = manifest.get('copy_data', self.copy_data)
+
+    def _save(self):
+        manifest = {
+            'jtl_file': self.jtl_file,
+            'size': self.size,
+            'copy_data': self.copy_data,
+            'updated': time.time(),
+            'segments': self.segments
+        }
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    def update(self):
+        """Checkpoint the complete records appended since the last call
+
+        Returns:
+            新增检查点的字节数
+        """
+        if not os.path.exists(self.jtl_file):
+            return 0
+        file_size = os.path.getsize(self.jtl_file)
+        if file_size <= self.size:
+            return 0
+
+        digest = hashlib.sha256()
+        length = 0
+        out = open(self.data_file, 'ab') if self.copy_data else None
+        try:
+            with open(self.jtl_file, 'rb') as f:
+                f.seek(self.size)
+                remaining = file_size - self.size
+                while remaining > 0:
+                    data = f.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    if remaining <= 0:
+                        # 只保存到最后一个换行符，未写完的记录留到下次
+                        data = data[:data.rfind(b'\n') + 1]
+                    digest.update(data)
+                    if out:
+                        out.write(data)
+                    length += len(data)
+        finally:
+            if out:
+                out.close()
+
+        if length:
+            self.segments.append({
+                'offset': self.size,
+                'length': length,
+                'sha256': digest.hexdigest()
+            })
+            self.size += length
+            self._save()
+        return length
+
+    def verify(self):
+        """Check the JTL against the manifest
+
+        Returns:
+            第一个不一致的分段的起始偏移，全部一致时返回 None
+        """
+        if not os.path.exists(self.jtl_file):
+            return 0
+        file_size = os.path.getsize(self.jtl_file)
+        with open(self.jtl_file, 'rb') as f:
+            for segment in self.segments:
+                if segment['offset'] + segment['length'] > file_size:
+                    return segment['offset']
+                f.seek(segment['offset'])
+                digest = hashlib.sha256()
+                remaining = segment['length']
+                while remaining > 0:
+                    data = f.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    digest.update(data)
+                    remaining -= len(data)
+                if digest.hexdigest() != segment['sha256']:
+                    return segment['offset']
+        return None
+
+    def recover(self):
+        """Repair the JTL from the checkpoint if it no longer matches
+
+        有检查点数据时，用检查点数据加上 JTL 中检查点之后的数据重建文件；
+        只有清单时，把 JTL 截断到最后一个校验通过的分段末尾。原文件保留为
+        {jtl}.corrupt。
+
+        Returns:
+            (recovered, message)
+        """
+        bad_offset = self.verify()
+        if bad_offset is None:
+            return False, "JTL文件与检查点一致，无需恢复"
+
+        corrupt_file = f"{self.jtl_file}.corrupt"
+        recovered_file = f"{self.jtl_file}.recovered"
+        jtl_exists = os.path.exists(self.jtl_file)
+        if self.copy_data and os.path.exists(self.data_file):
+            with open(recovered_file, 'wb') as out:
+                with open(self.data_file, 'rb') as f:
+                    shutil.copyfileobj(f, out, CHUNK_SIZE)
+                # 检查点之后新写入的数据仍然从原文件追加
+                if jtl_exists and os.path.getsize(self.jtl_file) > self.size:
+                    with open(self.jtl_file, 'rb') as f:
+                        f.seek(self.size)
+                        shutil.copyfileobj(f, out, CHUNK_SIZE)
+            message = f"已从检查点恢复JTL文件，损坏位置字节偏移: {bad_offset}"
+        elif jtl_exists:
+            with open(self.jtl_file, 'rb') as f, open(recovered_file, 'wb') as out:
+                remaining = bad_offset
+                while remaining > 0:
+                    data = f.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    out.write(data)
+                    remaining -= len(data)
+            message = f"JTL文件已截断到最后一个校验通过的位置: {bad_offset}"
+        else:
+            return False, "JTL文件不存在且没有检查点数据，无法恢复"
+
+        if jtl_exists:
+            os.replace(self.jtl_file, corrupt_file)
+        os.replace(recovered_file, self.jtl_file)
+        return True, message
+
+    def discard(self):
+        """Remove checkpoint files once the JTL is known to be good"""
+        for path in [self.data_file, self.manifest_file]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def cleanup_checkpoints(directory, max_age_seconds):
+    """Delete checkpoint (and legacy .bak) files older than max_age_seconds
+
+    Returns:
+        删除的文件数
+    """
+    removed = 0
+    now = time.time()
+    for name in os.listdir(directory):
+        if not (name.endswith('.ckpt') or name.endswith('.ckpt.json') or
+                (name.endswith('.bak') and '.jtl.' in name)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > max_age_seconds:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
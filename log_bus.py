@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# 日志广播总线
+#
+# 每条日志分配递增的序号，发布给所有订阅者。每个订阅者有独立的有界缓冲区，
+# 缓冲区满时丢弃最旧的消息并计数（不会阻塞发布者，内存占用有上限）。总线保留
+# 最近的一段历史，客户端断线重连时根据 Last-Event-ID 从断点继续。
+
+import itertools
+import threading
+from collections import deque
+
+HISTORY_SIZE = 2000
+SUBSCRIBER_BUFFER = 2000
+
+
+class Subscription:
+    """One subscriber's bounded buffer of (seq, payload) events"""
+
+    def __init__(self, bus, maxlen):
+        self.bus = bus
+        self.events = deque(maxlen=maxlen)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def _put(self, event):
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Wait for events and return all pending ones
+
+        Returns:
+            tuple: ([(seq, payload), ...], 自上次读取以来丢弃的消息数)，超时返回空列表
+        """
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class LogBus:
+    """Publish/subscribe log fan-out with sequence ids and replay"""
+
+    def __init__(self, history_size=HISTORY_SIZE, subscriber_buffer=SUBSCRIBER_BUFFER):
+        self.history = deque(maxlen=history_size)
+        self.subscriber_buffer = subscriber_buffer
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+
+    def publish(self, payload):
+        """Send a payload to every subscriber; returns its sequence number"""
+        with self.lock:
+            seq = next(self._seq)
+            self.last_seq = seq
+            event = (seq, payload)
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription._put(event)
+        return seq
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber
+
+        Args:
+            last_event_id: 客户端最后收到的序号，之后仍在历史中的消息会先补发
+        """
+        subscription = Subscription(self, self.subscriber_buffer)
+        with self.lock:
+            if last_event_id is not None:
+                missed, gap = self._events_since(last_event_id)
+                for event in missed:
+                    subscription._put(event)
+                subscription.dropped += gap
+            self.subscribers.add(subscription)
+        return subscription
+
+    def _events_since(self, last_event_id):
+        missed = [event for event in self.history if event[0] > last_event_id]
+        gap = 0
+        if missed and missed[0][0] > last_event_id + 1:
+            # 断线期间的部分消息已不在历史中
+            gap = missed[0][0] - last_event_id - 1
+        return missed, gap
+
+    def events_since(self, last_event_id):
+        """History after last_event_id
+
+        Returns:
+            tuple: ([(seq, payload), ...], 已不在历史中的消息数)
+        """
+        with self.lock:
+            return self._events_since(last_event_id)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def queue_depth(self):
+        """Events waiting in subscriber buffers: (total, deepest single buffer)"""
+        with self.lock:
+            depths = [len(subscription.events) for subscription in self.subscribers]
+        return sum(depths), max(depths) if depths else 0
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+# Backend Listener 指标接收
+#
+# slave 上的 JMeter Backend Listener 每秒发送一次按标签预聚合的指标，控制端在
+# 同一个端口上通过 UDP 和 TCP 接收（也可以通过 HTTP /write 接收 InfluxDB 格式），
+# 自动识别两种行协议:
+#   Graphite:  <前缀>.<标签>.<ok|ko|a>.<count|avg|min|max|pct90...> <值> <秒级时间戳>
+#              <前缀>.test.<minAT|maxAT|meanAT|startedT|endedT> <值> <时间戳>
+#   InfluxDB:  jmeter,application=<应用>,transaction=<标签>,statut=<ok|ko|all> count=..,avg=.. <纳秒时间戳>
+# 数据按 application（Graphite 为前缀）匹配到正在运行的测试（只有一个测试时直接归入），
+# 在内存中按"标签 x 秒"聚合，测试结束时保存为 JTL 旁边的 <运行ID>.metrics.npz。
+# 高并发时可以不回传原始 JTL（RAW_JTL_ENABLED），统计数据由这些聚合结果计算。
+#
+# 多台 slave 同一秒的百分位无法精确合并，按样本数加权平均；整个测试的百分位取各秒
+# 百分位按样本数加权后的同一百分位，都是近似值。
+
+import os
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+METRICS_SUFFIX = '.metrics.npz'
+PERCENTILES = (90, 95, 99)
+THREAD_METRICS = ('minAT', 'maxAT', 'meanAT', 'startedT', 'endedT')
+# Graphite 的各项指标分行发送，同一发送方同一秒的指标等待该时间（秒）后再合并
+GRAPHITE_SETTLE = 2.0
+MAX_LINE_LENGTH = 65536
+
+
+def metrics_path(jtl_file):
+    """File holding the aggregated Backend Listener series of the run that writes jtl_file"""
+    base = str(jtl_file)
+    if base.endswith('.jtl'):
+        base = base[:-4]
+    return base + METRICS_SUFFIX
+
+
+def _number(value):
+    try:
+        return float(value.rstrip('i'))
+    except ValueError:
+        return None
+
+
+def _split_escaped(text, separator):
+    parts, current, escaped = [], [], False
+    for char in text:
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == separator:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append(''.join(current))
+    return parts
+
+
+def parse_influx_line(line):
+    """One InfluxDB line-protocol line -> (application, record) or None
+
+    record: {'label', 'status', 'ts', 'fields'}，ts 为秒
+    """
+    parts = _split_escaped(line, ' ')
+    if len(parts) < 2:
+        return None
+    series = _split_escaped(parts[0], ',')
+    if series[0] != 'jmeter':
+        return None
+    tags = dict(tag.split('=', 1) for tag in series[1:] if '=' in tag)
+    fields = {}
+    for field in _split_escaped(parts[1], ','):
+        if '=' in field:
+            name, value = field.split('=', 1)
+            number = _number(value)
+            if number is not None:
+                fields[name] = number
+    ts = time.time()
+    if len(parts) > 2 and parts[2].isdigit():
+        ts = int(parts[2]) / 1e9
+    record = {'label': tags.get('transaction'), 'status': tags.get('statut', 'all'),
+              'ts': int(ts), 'fields': fields}
+    return tags.get('application'), record
+
+
+def parse_graphite_line(line):
+    """One Graphite plaintext line -> (path, value, ts) or None"""
+    parts = line.split()
+    if len(parts) < 2:
+        return None
+    value = _number(parts[1])
+    if value is None:
+        return None
+    ts = int(float(parts[2])) if len(parts) > 2 and _number(parts[2]) is not None else int(time.time())
+    return parts[0], value, ts
+
+
+def _graphite_record(path, prefix):
+    """Split a Graphite metric path (without the run prefix) into (label, status, metric)"""
+    if prefix and path.startswith(prefix + '.'):
+        path = path[len(prefix) + 1:]
+    elif '.' in path:
+        # 默认前缀 "jmeter."
+        path = path.split('.', 1)[1]
+    segments = path.split('.')
+    if len(segments) == 2 and segments[0] == 'test' and segments[1] in THREAD_METRICS:
+        return 'internal', 'all', segments[1]
+    if len(segments) < 3 or segments[-2] not in ('ok', 'ko', 'a'):
+        return None
+    return '.'.join(segments[:-2]), segments[-2], segments[-1]
+
+
+class RunMetrics:
+    """Per-label per-second aggregates of one run"""
+
+    def __init__(self, run_id, path):
+        self.run_id = run_id
+        self.path = str(path)
+        self.lock = threading.Lock()
+        # (标签, 秒) -> [成功数, 失败数, 响应时间总和, 最小, 最大, p90*n, p95*n, p99*n, 百分位权重]
+        self.buckets = {}
+        # (秒, 发送方) -> 活动线程数
+        self.threads = {}
+        self.records = 0
+        self.rows = 0
+
+    def add(self, record, source):
+        """Fold one record ({'label', 'status', 'ts', 'fields'}) into the buckets"""
+        label, status, fields = record['label'], record['status'], record['fields']
+        second = record['ts']
+        with self.lock:
+            self.records += 1
+            if label == 'internal':
+                if 'meanAT' in fields:
+                    self.threads[(second, source)] = fields['meanAT']
+                return
+            if not label or label == 'all':
+                return
+            bucket = self.buckets.get((label, second))
+            if bucket is None:
+                bucket = self.buckets[(label, second)] = [0, 0, 0.0, None, None, 0.0, 0.0, 0.0, 0]
+            count = int(fields.get('count', 0))
+            if status in ('ok', 'ko') and count:
+                bucket[0 if status == 'ok' else 1] += count
+                self.rows += count
+                bucket[2] += fields.get('avg', 0.0) * count
+                if 'min' in fields:
+                    bucket[3] = fields['min'] if bucket[3] is None else min(bucket[3], fields['min'])
+                if 'max' in fields:
+                    bucket[4] = fields['max'] if bucket[4] is None else max(bucket[4], fields['max'])
+            elif status in ('all', 'a') and count:
+                # 百分位来自包含成功和失败样本的 all 记录
+                values = [fields.get(f'pct{percent}.0', fields.get(f'pct{percent}')) for percent in PERCENTILES]
+                if all(value is not None for value in values):
+                    for i, value in enumerate(values):
+                        bucket[5 + i] += value * count
+                    bucket[8] += count
+
+    def arrays(self):
+        """Columnar copy of the buckets, sorted by label and second"""
+        with self.lock:
+            items = sorted(self.buckets.items())
+            threads = {}
+            for (second, _), value in self.threads.items():
+                threads[second] = threads.get(second, 0.0) + value
+        labels = sorted(set(label for (label, _), _ in items))
+        label_index = {label: i for i, label in enumerate(labels)}
+        values = np.array([bucket for _, bucket in items], dtype=object).reshape(len(items), 9)
+
+        def column(i):
+            return np.array([np.nan if value is None else value for value in values[:, i]], dtype=np.float64)
+
+        weight = column(8)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percentiles = {f'p{percent}': np.where(weight > 0, column(5 + i) / weight, np.nan)
+                           for i, percent in enumerate(PERCENTILES)}
+        thread_seconds = sorted(threads)
+        result = {
+            'labels': np.array(labels, dtype=np.str_),
+            'label': np.array([label_index[label] for (label, _), _ in items], dtype=np.int32),
+            'second': np.array([second for (_, second), _ in items], dtype=np.int64),
+            'ok': column(0).astype(np.int64),
+            'ko': column(1).astype(np.int64),
+            'sum': column(2),
+            'min': column(3),
+            'max': column(4),
+            'weight': weight.astype(np.int64),
+            'thread_second': np.array(thread_seconds, dtype=np.int64),
+            'threads': np.array([threads[second] for second in thread_seconds], dtype=np.float64)
+        }
+        result.update(percentiles)
+        return result
+
+    def save(self):
+        """Persist the series atomically; returns the path or None when nothing was received"""
+        if not self.buckets and not self.threads:
+            return None
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **self.arrays())
+        os.replace(tmp_file, self.path)
+        return self.path
+
+    def snapshot(self):
+        """Live aggregates in the same layout as jtl_stream.LiveStats.snapshot()"""
+        snapshot = snapshot_from_arrays(self.arrays())
+        snapshot['rows'] = self.rows
+        return snapshot
+
+    # JtlTailer 接口，raw JTL 关闭时作为运行的实时统计来源
+    def poll(self):
+        return self.rows
+
+    def stop(self):
+        self.save()
+
+
+def load_metrics(path):
+    """Arrays saved by RunMetrics.save, or None"""
+    if not os.path.exists(str(path)):
+        return None
+    with np.load(str(path)) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _summarize(arrays, rows):
+    ok, ko = arrays['ok'][rows], arrays['ko'][rows]
+    count = int(ok.sum() + ko.sum())
+    if not count:
+        return None
+    seconds = arrays['second'][rows]
+    duration = int(seconds.max() - seconds.min()) + 1
+    summary = {
+        'count': count,
+        'errors': int(ko.sum()),
+        'error_pct': ko.sum() * 100.0 / count,
+        'mean': float(arrays['sum'][rows].sum()) / count,
+        'min': float(np.nanmin(arrays['min'][rows])) if not np.all(np.isnan(arrays['min'][rows])) else None,
+        'max': float(np.nanmax(arrays['max'][rows])) if not np.all(np.isnan(arrays['max'][rows])) else None,
+        'throughput': count / float(duration),
+        'p50': None
+    }
+    weight = arrays['weight'][rows]
+    for percent in PERCENTILES:
+        values = arrays[f'p{percent}'][rows]
+        valid = (weight > 0) & ~np.isnan(values)
+        summary[f'p{percent}'] = None
+        if valid.any():
+            # 各秒百分位按样本数加权后取同一百分位
+            order = np.argsort(values[valid])
+            cumulative = np.cumsum(weight[valid][order])
+            index = np.searchsorted(cumulative, cumulative[-1] * percent / 100.0)
+            summary[f'p{percent}'] = float(values[valid][order][min(index, len(order) - 1)])
+    return summary
+
+
+def snapshot_from_arrays(arrays):
+    labels = {}
+    for i, label in enumerate(arrays['labels'].tolist()):
+        summary = _summarize(arrays, arrays['label'] == i)
+        if summary:
+            labels[label] = summary
+    total = _summarize(arrays, np.ones(len(arrays['label']), dtype=bool)) if len(arrays['label']) else None
+    return {'total': total or {'count': 0, 'errors': 0, 'error_pct': 0.0, 'mean': None, 'min': None,
+                               'max': None, 'throughput': 0.0, 'p50': None, 'p90': None, 'p95': None, 'p99': None},
+            'labels': labels}
+
+
+def statistics_from_arrays(arrays):
+    """statistics.json content (Total first, then labels by name) from saved series"""
+    snapshot = snapshot_from_arrays(arrays)
+    statistics = {}
+    for name, summary in [('Total', snapshot['total'])] + sorted(snapshot['labels'].items()):
+        if not summary or not summary['count']:
+            continue
+        statistics[name] = {
+            'transaction': name,
+            'sampleCount': summary['count'],
+            'errorCount': summary['errors'],
+            'errorPct': summary['error_pct'],
+            'meanResTime': summary['mean'],
+            'medianResTime': None,
+            'minResTime': summary['min'],
+            'maxResTime': summary['max'],
+            'pct1ResTime': summary['p90'],
+            'pct2ResTime': summary['p95'],
+            'pct3ResTime': summary['p99'],
+            'throughput': summary['throughput'],
+            'receivedKBytesPerSec': None,
+            'sentKBytesPerSec': None
+        }
+    return statistics
+
+
+def series_from_arrays(arrays):
+    """Per-label per-second series for charts"""
+    if not len(arrays['second']):
+        return {'start': None, 'seconds': [], 'labels': {}, 'threads': []}
+    start = int(arrays['second'].min())
+    length = int(arrays['second'].max()) - start + 1
+
+    def to_list(values):
+        return [None if np.isnan(value) else round(float(value), 2) for value in values]
+
+    labels = {}
+    for i, label in enumerate(arrays['labels'].tolist()):
+        rows = arrays['label'] == i
+        offsets = arrays['second'][rows] - start
+        count = np.zeros(length)
+        errors = np.zeros(length)
+        mean = np.full(length, np.nan)
+        p95 = np.full(length, np.nan)
+        total = arrays['ok'][rows] + arrays['ko'][rows]
+        count[offsets] = total
+        errors[offsets] = arrays['ko'][rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean[offsets] = np.where(total > 0, arrays['sum'][rows] / total, np.nan)
+        p95[offsets] = arrays['p95'][rows]
+        labels[label] = {'count': to_list(count), 'errors': to_list(errors), 'mean': to_list(mean), 'p95': to_list(p95)}
+    threads = np.full(length, np.nan)
+    inside = (arrays['thread_second'] >= start) & (arrays['thread_second'] < start + length)
+    threads[arrays['thread_second'][inside] - start] = arrays['threads'][inside]
+    return {'start': start, 'seconds': list(range(length)), 'labels': labels, 'threads': to_list(threads)}
+
+
+class MetricsReceiver:
+    """UDP/TCP receiver of Backend Listener metrics, routed to the runs in progress"""
+
+    def __init__(self, host='0.0.0.0', port=2003, on_log=None):
+        self.host = host
+        self.port = port
+        self.on_log = on_log
+        self.lock = threading.Lock()
+        self.runs = {}
+        self.unmatched = 0
+        self.lines = 0
+        # Graphite: (发送方, 运行ID, 标签, 状态, 秒) -> {指标: 值}
+        self._pending = {}
+        self._servers = []
+
+    def _log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    def start(self):
+        receiver = self
+
+        class UdpHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                receiver.ingest(self.request[0].decode('utf-8', errors='replace'), self.client_address[0])
+
+        class TcpHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    receiver.ingest(raw[:MAX_LINE_LENGTH].decode('utf-8', errors='replace'), self.client_address[0])
+
+        class TcpServer(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        try:
+            udp = socketserver.UDPServer((self.host, self.port), UdpHandler)
+            tcp = TcpServer((self.host, self.port), TcpHandler)
+        except OSError as e:
+            self._log(f"Metrics receiver could not bind {self.host}:{self.port}: {str(e)}")
+            return None
+        self._servers = [udp, tcp]
+        for server in self._servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+        flusher = threading.Thread(target=self._flush_loop)
+        flusher.daemon = True
+        flusher.start()
+        self._log(f"Metrics receiver listening on {self.host}:{self.port} (UDP/TCP, Graphite and InfluxDB line protocol)")
+        return self
+
+    def begin(self, run_id, path):
+        """Start aggregating metrics for a run; returns its RunMetrics"""
+        metrics = RunMetrics(run_id, path)
+        with self.lock:
+            self.runs[run_id] = metrics
+        return metrics
+
+    def end(self, run_id):
+        """Stop aggregating for a run and persist its series; returns the RunMetrics or None"""
+        self._flush(force_run=run_id)
+        with self.lock:
+            metrics = self.runs.pop(run_id, None)
+        if metrics is not None:
+            metrics.save()
+        return metrics
+
+    def get(self, run_id):
+        """RunMetrics of a run in progress, or None"""
+        with self.lock:
+            return self.runs.get(run_id)
+
+    def _match(self, application):
+        """Run that an application tag / metric prefix belongs to"""
+        with self.lock:
+            if application and application in self.runs:
+                return self.runs[application]
+            if application:
+                for run_id, metrics in self.runs.items():
+                    if application.startswith(run_id + '.'):
+                        return metrics
+            if len(self.runs) == 1:
+                return next(iter(self.runs.values()))
+        return None
+
+    def ingest(self, text, source='local'):
+        """Parse and route a chunk of line-protocol text; returns accepted line count"""
+        accepted = 0
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            self.lines += 1
+            # InfluxDB 的字段部分总是包含 "="，Graphite 的指标路径中没有
+            if '=' in line:
+                parsed = parse_influx_line(line)
+                if parsed is None:
+                    continue
+                metrics = self._match(parsed[0])
+                if metrics is None:
+                    self.unmatched += 1
+                    continue
+                metrics.add(parsed[1], source)
+            else:
+                parsed = parse_graphite_line(line)
+                if parsed is None:
+                    continue
+                path, value, second = parsed
+                metrics = self._match(path)
+                if metrics is None:
+                    self.unmatched += 1
+                    continue
+                split = _graphite_record(path, metrics.run_id)
+                if split is None:
+                    continue
+                label, status, metric = split
+                with self.lock:
+                    key = (source, metrics.run_id, label, status, second)
+                    self._pending.setdefault(key, {})[metric] = value
+            accepted += 1
+        return accepted
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(1.0)
+            try:
+                self._flush()
+            except Exception as e:
+                self._log(f"Metrics receiver flush failed: {str(e)}")
+
+    def _flush(self, force_run=None):
+        """Merge settled Graphite metrics into their runs"""
+        cutoff = time.time() - GRAPHITE_SETTLE
+        with self.lock:
+            ready = [key for key in self._pending if key[4] < cutoff or key[1] == force_run]
+            items = [(key, self._pending.pop(key)) for key in ready]
+            runs = dict(self.runs)
+        for (source, run_id, label, status, second), values in items:
+            metrics = runs.get(run_id)
+            if metrics is None:
+                continue
+            fields = {('pct' + name[3:] if name.startswith('pct') else name): value for name, value in values.items()}
+            metrics.add({'label': label, 'status': 'all' if status == 'a' else status,
+                         'ts': second, 'fields': fields}, source)
+
+    def stats(self):
+        with self.lock:
+            return {'port': self.port, 'runs': list(self.runs), 'lines': self.lines, 'unmatched': self.unmatched,
+                    'pending': len(self._pending)}
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""两次测试之间的性能回归检测
+
+基于原始 JTL 样本（列式存储）逐个标签比较基线和本次测试:
+    - 响应时间分布: Mann-Whitney U 检验（正态近似，含结校正）
+    - 百分位变化: bootstrap 置信区间
+    - 错误率: 两比例 z 检验
+统计显著且变化超过最小效应阈值时判定为回归。多个标签同时检验时显著性水平按
+标签数做 Bonferroni 校正。
+
+响应时间是整数毫秒，所有计算都在"取值 -> 样本数"的计数表上进行，秩和检验和
+bootstrap 的耗时与样本数基本无关，千万级样本的对比在数秒内完成。
+
+用法:
+    python regression.py baseline.jtl current.jtl [--alpha 0.05] [--min-effect 5] [--json]
+
+退出码: 0 通过, 1 检测到回归, 2 出错
+"""
+
+import argparse
+import json
+import math
+import sys
+
+import numpy as np
+
+from histogram import bucket_index, bucket_upper_value
+from jtl_store import load_jtl
+
+TOTAL_LABEL = 'Total'
+ALPHA = 0.05
+MIN_EFFECT_PCT = 5.0       # 百分位至少变化该百分比才算回归
+MIN_ERROR_DELTA = 0.1      # 错误率至少增加该百分点才算回归
+MIN_SAMPLES = 30           # 样本数少于该值的标签不做判定
+PERCENTILE = 95
+BOOTSTRAP_ROUNDS = 1000
+# 计数表的取值个数超过该值时按直方图桶合并后再做 bootstrap（相对误差 < 1/64）
+MAX_BOOTSTRAP_BINS = 2048
+# 最大响应时间低于该值时用 bincount 建计数表，否则排序去重
+BINCOUNT_LIMIT = 1 << 22
+
+REGRESSION = 'regression'
+IMPROVEMENT = 'improvement'
+NO_CHANGE = 'no_change'
+INSUFFICIENT = 'insufficient'
+
+
+def value_counts(baseline, current):
+    """Shared sorted value table of two integer samples
+
+    Returns:
+        tuple: (取值数组, 基线计数, 本次计数)，只包含至少出现一次的取值
+    """
+    baseline = np.asarray(baseline, dtype=np.int64)
+    current = np.asarray(current, dtype=np.int64)
+    high = max(int(baseline.max()), int(current.max()))
+    low = min(int(baseline.min()), int(current.min()))
+    if low >= 0 and high < BINCOUNT_LIMIT:
+        counts_a = np.bincount(baseline, minlength=high + 1)
+        counts_b = np.bincount(current, minlength=high + 1)
+        present = np.flatnonzero(counts_a + counts_b)
+        return present, counts_a[present], counts_b[present]
+    values, inverse = np.unique(np.concatenate([baseline, current]), return_inverse=True)
+    counts_a = np.bincount(inverse[:len(baseline)], minlength=len(values))
+    counts_b = np.bincount(inverse[len(baseline):], minlength=len(values))
+    return values, counts_a, counts_b
+
+
+def mann_whitney(counts_a, counts_b):
+    """Two-sided Mann-Whitney U test on a shared value table
+
+    Returns:
+        dict: u（本次样本的 U 值）、z、p_value，以及 prob_slower = P(本次 > 基线) + P(相等)/2
+              和 Cliff's delta（2 * prob_slower - 1）
+    """
+    counts_a = np.asarray(counts_a, dtype=np.float64)
+    counts_b = np.asarray(counts_b, dtype=np.float64)
+    n1, n2 = float(counts_a.sum()), float(counts_b.sum())
+    n = n1 + n2
+    ties = counts_a + counts_b
+    # 相同取值取平均秩
+    below = np.cumsum(ties) - ties
+    midranks = below + (ties + 1) / 2.0
+    rank_sum_b = float(np.dot(counts_b, midranks))
+    u = rank_sum_b - n2 * (n2 + 1) / 2.0
+    mean_u = n1 * n2 / 2.0
+    tie_term = float(np.sum(ties ** 3 - ties)) / (n * (n - 1)) if n > 1 else 0.0
+    variance = n1 * n2 / 12.0 * ((n + 1) - tie_term)
+    if variance <= 0:
+        z, p_value = 0.0, 1.0
+    else:
+        # 连续性校正
+        diff = u - mean_u
+        z = (diff - math.copysign(0.5, diff)) / math.sqrt(variance) if diff else 0.0
+        p_value = math.erfc(abs(z) / math.sqrt(2))
+    prob_slower = u / (n1 * n2)
+    return {'u': u, 'z': z, 'p_value': p_value, 'prob_slower': prob_slower,
+            'cliffs_delta': 2 * prob_slower - 1}
+
+
+def percentile_from_counts(values, counts, percent):
+    """Nearest-rank percentile of a value table"""
+    cumulative = np.cumsum(counts)
+    rank = max(1, int(math.ceil(percent / 100.0 * cumulative[-1])))
+    return float(values[np.searchsorted(cumulative, rank)])
+
+
+def _bootstrap_table(values, counts):
+    if len(values) <= MAX_BOOTSTRAP_BINS:
+        return values, counts
+    buckets = bucket_index(values)
+    merged = np.bincount(buckets, weights=counts)
+    present = np.flatnonzero(merged)
+    return bucket_upper_value(present), merged[present]
+
+
+def _bootstrap_percentiles(values, counts, percent, rounds, rng):
+    # 从计数表按多项分布重抽样，等价于对原始样本有放回抽样
+    total = int(np.sum(counts))
+    resampled = rng.multinomial(total, np.asarray(counts, dtype=np.float64) / total, size=rounds)
+    cumulative = np.cumsum(resampled, axis=1)
+    rank = max(1, int(math.ceil(percent / 100.0 * total)))
+    return np.asarray(values, dtype=np.float64)[(cumulative < rank).sum(axis=1)]
+
+
+def bootstrap_percentile_diff(values, counts_a, counts_b, percent=PERCENTILE, rounds=BOOTSTRAP_ROUNDS,
+                              confidence=0.95, seed=0):
+    """Bootstrap confidence interval of percentile(current) - percentile(baseline) in ms"""
+    rng = np.random.default_rng(seed)
+    table_values, table_a = _bootstrap_table(values, counts_a)
+    _, table_b = _bootstrap_table(values, counts_b)
+    diffs = (_bootstrap_percentiles(table_values, table_b, percent, rounds, rng)
+             - _bootstrap_percentiles(table_values, table_a, percent, rounds, rng))
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(diffs, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def two_proportion_test(errors_a, n_a, errors_b, n_b):
+    """Two-sided two-proportion z-test of error rates; returns (z, p_value)"""
+    pooled = (errors_a + errors_b) / float(n_a + n_b)
+    variance = pooled * (1 - pooled) * (1.0 / n_a + 1.0 / n_b)
+    if variance <= 0:
+        return 0.0, 1.0
+    z = (errors_b / float(n_b) - errors_a / float(n_a)) / math.sqrt(variance)
+    return z, math.erfc(abs(z) / math.sqrt(2))
+
+
+def _summary(values, counts, errors, percent):
+    count = int(np.sum(counts))
+    return {
+        'count': count,
+        'errors': errors,
+        'error_pct': errors * 100.0 / count,
+        'mean': float(np.dot(values, counts)) / count,
+        'median': percentile_from_counts(values, counts, 50),
+        f'p{percent:g}': percentile_from_counts(values, counts, percent)
+    }
+
+
+def compare_samples(label, baseline, current, alpha, percent=PERCENTILE, min_effect_pct=MIN_EFFECT_PCT,
+                    min_error_delta=MIN_ERROR_DELTA, min_samples=MIN_SAMPLES, rounds=BOOTSTRAP_ROUNDS, seed=0):
+    """Compare one label's samples
+
+    Args:
+        baseline, current: (elapsed, success) 数组对
+        alpha: 本标签使用的显著性水平（已做多重检验校正）
+    """
+    elapsed_a, success_a = baseline
+    elapsed_b, success_b = current
+    result = {'label': label, 'verdict': INSUFFICIENT}
+    if len(elapsed_a) < min_samples or len(elapsed_b) < min_samples:
+        result['message'] = f"样本数不足 {min_samples}"
+        result['baseline'] = {'count': int(len(elapsed_a))}
+        result['current'] = {'count': int(len(elapsed_b))}
+        return result
+    values, counts_a, counts_b = value_counts(elapsed_a, elapsed_b)
+    errors_a = int(len(success_a) - np.count_nonzero(success_a))
+    errors_b = int(len(success_b) - np.count_nonzero(success_b))
+    result['baseline'] = _summary(values, counts_a, errors_a, percent)
+    result['current'] = _summary(values, counts_b, errors_b, percent)
+
+    key = f'p{percent:g}'
+    base_value = result['baseline'][key]
+    change_pct = (result['current'][key] - base_value) * 100.0 / base_value if base_value else None
+    test = mann_whitney(counts_a, counts_b)
+    ci_low, ci_high = bootstrap_percentile_diff(values, counts_a, counts_b, percent, rounds,
+                                                confidence=1 - alpha, seed=seed)
+    significant = test['p_value'] < alpha
+    effect = change_pct is not None and abs(change_pct) >= min_effect_pct
+    latency = dict(test)
+    latency.update({
+        'percentile': percent,
+        'change_pct': change_pct,
+        'ci': [ci_low, ci_high],
+        'significant': significant,
+        'regression': bool(significant and effect and change_pct > 0 and ci_low > 0),
+        'improvement': bool(significant and effect and change_pct < 0 and ci_high < 0)
+    })
+
+    z, p_value = two_proportion_test(errors_a, len(success_a), errors_b, len(success_b))
+    delta = result['current']['error_pct'] - result['baseline']['error_pct']
+    error_significant = p_value < alpha
+    errors = {
+        'z': z,
+        'p_value': p_value,
+        'delta_pct': delta,
+        'significant': error_significant,
+        'regression': bool(error_significant and delta >= min_error_delta),
+        'improvement': bool(error_significant and -delta >= min_error_delta)
+    }
+    result['latency'] = latency
+    result['errors'] = errors
+    if latency['regression'] or errors['regression']:
+        result['verdict'] = REGRESSION
+    elif latency['improvement'] or errors['improvement']:
+        result['verdict'] = IMPROVEMENT
+    else:
+        result['verdict'] = NO_CHANGE
+    return result
+
+
+def _label_samples(data, label):
+    rows = slice(0, data.rows) if label == TOTAL_LABEL else data.label_slice(label)
+    return np.asarray(data['elapsed'][rows]), np.asarray(data['success'][rows])
+
+
+def compare_runs(baseline_jtl, current_jtl, labels=None, alpha=ALPHA, percentile=PERCENTILE,
+                 min_effect_pct=MIN_EFFECT_PCT, min_error_delta=MIN_ERROR_DELTA, min_samples=MIN_SAMPLES,
+                 rounds=BOOTSTRAP_ROUNDS, seed=0):
+    """Regression analysis of two runs from their JTL files
+
+    Returns:
+        dict: passed（无回归）、verdict、各标签的检验结果、只在一方出现的标签
+    """
+    baseline = load_jtl(str(baseline_jtl))
+    current = load_jtl(str(current_jtl))
+    common = sorted(set(baseline.labels()) & set(current.labels()))
+    if labels:
+        common = [label for label in common if label in labels]
+    compared = [TOTAL_LABEL] + common
+    # Bonferroni 校正: 每个标签的显著性水平为 alpha / 检验次数
+    label_alpha = alpha / len(compared)
+    results = [compare_samples(label, _label_samples(baseline, label), _label_samples(current, label),
+                               label_alpha, percentile, min_effect_pct, min_error_delta, min_samples,
+                               rounds, seed)
+               for label in compared]
+    regressions = [result['label'] for result in results if result['verdict'] == REGRESSION]
+    return {
+        'passed': not regressions,
+        'verdict': 'fail' if regressions else 'pass',
+        'regressions': regressions,
+        'improvements': [result['label'] for result in results if result['verdict'] == IMPROVEMENT],
+        'alpha': alpha,
+        'label_alpha': label_alpha,
+        'percentile': percentile,
+        'min_effect_pct': min_effect_pct,
+        'min_error_delta': min_error_delta,
+        'labels': results,
+        'only_in_baseline': sorted(set(baseline.labels()) - set(current.labels())),
+        'only_in_current': sorted(set(current.labels()) - set(baseline.labels()))
+    }
+
+
+def _format_row(result, percent):
+    key = f'p{percent:g}'
+    if result['verdict'] == INSUFFICIENT:
+        return f"{result['label'][:40]:<40} {'-':>10} {'-':>10} {'-':>9} {'-':>10} {'-':>9}  {result['verdict']}"
+    latency = result['latency']
+    change = f"{latency['change_pct']:+.1f}%" if latency['change_pct'] is not None else '-'
+    return (f"{result['label'][:40]:<40} {result['baseline'][key]:>10.0f} {result['current'][key]:>10.0f} "
+            f"{change:>9} {latency['p_value']:>10.2g} {result['errors']['delta_pct']:>+8.2f}%  {result['verdict']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect performance regressions between two JTL files")
+    parser.add_argument('baseline', help="基线 JTL 文件")
+    parser.add_argument('current', help="本次 JTL 文件")
+    parser.add_argument('--alpha', type=float, default=ALPHA, help="显著性水平")
+    parser.add_argument('--min-effect', type=float, default=MIN_EFFECT_PCT, help="百分位最小变化（%%）")
+    parser.add_argument('--min-error-delta', type=float, default=MIN_ERROR_DELTA, help="错误率最小增加（百分点）")
+    parser.add_argument('--percentile', type=float, default=PERCENTILE, help="比较的响应时间百分位")
+    parser.add_argument('--label', action='append', help="只比较指定标签（可重复）")
+    parser.add_argument('--json', action='store_true', help="输出 JSON")
+    args = parser.parse_args()
+
+    try:
+        result = compare_runs(args.baseline, args.current, labels=args.label, alpha=args.alpha,
+                              percentile=args.percentile, min_effect_pct=args.min_effect,
+                              min_error_delta=args.min_error_delta)
+    except Exception as e:
+        print(f"regression analysis failed: {str(e)}", file=sys.stderr)
+        return 2
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        key = f"p{args.percentile:g}"
+        print(f"{'label':<40} {'base ' + key:>10} {'cur ' + key:>10} {'change':>9} {'p-value':>10} {'err diff':>9}  verdict")
+        for label_result in result['labels']:
+            print(_format_row(label_result, args.percentile))
+        print(f"verdict: {result['verdict'].upper()}"
+              + (f" (regressions: {', '.join(result['regressions'])})" if result['regressions'] else ''))
+    return 0 if result['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# 报告静态文件
+#
+# 报告生成完成后为文本类文件（html/js/css/json/svg 等）生成预压缩的 .gz 副本，
+# 安装了 brotli 模块时同时生成 .br。请求时根据 Accept-Encoding 选择压缩副本，
+# 不在每次请求时压缩。
+
+import gzip
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIME_TYPES = {
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.json': 'application/json',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.ttf': 'font/ttf',
+    '.eot': 'application/vnd.ms-fontobject',
+    '.otf': 'font/otf',
+    '.txt': 'text/plain'
+}
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.txt', '.csv', '.ttf', '.eot', '.otf')
+# 小于该大小的文件压缩收益不大
+MIN_COMPRESS_SIZE = 1024
+# 报告中随 JMeter 版本固定的第三方资源目录，内容不会变化，可以使用 immutable 长缓存。
+# 其他文件（包括携带报告数据的 content/js/dashboard.js、graph.js）在重新生成报告时会
+# 被原地覆盖，URL 不变，必须每次校验 ETag
+IMMUTABLE_DIRS = ('sbadmin2-1.0.7/',)
+
+
+def mime_type(path):
+    _, ext = os.path.splitext(path)
+    return MIME_TYPES.get(ext.lower(), 'application/octet-stream')
+
+
+def is_immutable_asset(relative_path):
+    """True for vendored report assets whose content never changes
+
+    relative_path 为报告目录内的相对路径，例如 "sbadmin2-1.0.7/bower_components/jquery/dist/jquery.min.js"
+    """
+    return relative_path.replace('\\', '/').startswith(IMMUTABLE_DIRS)
+
+
+def _is_fresh(variant, source_mtime):
+    return os.path.exists(variant) and os.path.getmtime(variant) >= source_mtime
+
+
+def precompress_report(report_dir):
+    """Write .gz (and .br when brotli is installed) copies of a report's text assets
+
+    Returns:
+        新生成的压缩文件数
+    """
+    created = 0
+    for root, _, files in os.walk(str(report_dir)):
+        for name in files:
+            if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if stat.st_size < MIN_COMPRESS_SIZE:
+                continue
+            gz_path = path + '.gz'
+            if not _is_fresh(gz_path, stat.st_mtime):
+                with open(path, 'rb') as src, open(gz_path + '.tmp', 'wb') as raw:
+                    # mtime=0 使相同内容得到相同的压缩结果
+                    with gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=raw, mtime=0) as dst:
+                        shutil.copyfileobj(src, dst)
+                os.replace(gz_path + '.tmp', gz_path)
+                created += 1
+            br_path = path + '.br'
+            if brotli is not None and not _is_fresh(br_path, stat.st_mtime):
+                with open(path, 'rb') as src:
+                    data = brotli.compress(src.read())
+                with open(br_path + '.tmp', 'wb') as dst:
+                    dst.write(data)
+                os.replace(br_path + '.tmp', br_path)
+                created += 1
+    return created
+
+
+def pick_variant(path, accept_encoding):
+    """Choose the precompressed copy of a file the client accepts
+
+    Returns:
+        tuple: (文件路径, Content-Encoding 或 None)
+    """
+    accepted = set(part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(','))
+    source_mtime = os.path.getmtime(path)
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accepted and _is_fresh(path + suffix, source_mtime):
+            return path + suffix, encoding
+    return path, None
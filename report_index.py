@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+# 报告索引
+#
+# 报告目录的元数据（名称、日期、并发数、持续时间、主要指标）保存在 SQLite 中，
+# /api/reports 直接查询索引，不再每次遍历 report/html。测试结束或报告生成完成时
+# 更新对应的记录；报告根目录的 mtime 变化（新增/删除目录）时再做一次增量同步。
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# 目录名格式: "{jmx}-{N}Vuser_{yyyymmddHHMMSS}"，旧格式为 "{name}_{yyyymmddHHMMSS}"
+DATE_PATTERN = re.compile(r'^\d{14}$')
+USERS_PATTERN = re.compile(r'^(.*)-(\d+)Vuser$')
+
+SORT_COLUMNS = ('date', 'name', 'jmx', 'users', 'duration', 'samples', 'error_pct',
+                'mean', 'p90', 'p95', 'p99', 'throughput')
+METRIC_COLUMNS = ('samples', 'error_pct', 'mean', 'p90', 'p95', 'p99', 'throughput')
+# 索引结构版本，变化时重建索引
+INDEX_VERSION = '3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    dir_name TEXT PRIMARY KEY,
+    name TEXT,
+    jmx TEXT,
+    users INTEGER,
+    date TEXT,
+    duration REAL,
+    samples INTEGER,
+    error_pct REAL,
+    mean REAL,
+    p90 REAL,
+    p95 REAL,
+    p99 REAL,
+    throughput REAL,
+    has_index INTEGER,
+    has_statistics INTEGER,
+    dir_mtime REAL,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS reports_date ON reports (date);
+CREATE INDEX IF NOT EXISTS reports_jmx ON reports (jmx, users);
+CREATE TABLE IF NOT EXISTS report_labels (
+    dir_name TEXT,
+    label TEXT,
+    samples INTEGER,
+    error_pct REAL,
+    mean REAL,
+    p90 REAL,
+    p95 REAL,
+    p99 REAL,
+    throughput REAL,
+    PRIMARY KEY (dir_name, label)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def parse_report_name(dir_name):
+    """Split a report directory name into (test name, date, jmx, users)
+
+    名称中可能包含下划线，日期总是最后一个下划线之后的部分。
+    """
+    if '_' not in dir_name:
+        return None
+    test_name, date_str = dir_name.rsplit('_', 1)
+    if not test_name or not DATE_PATTERN.match(date_str):
+        return None
+    match = USERS_PATTERN.match(test_name)
+    if match:
+        return test_name, date_str, match.group(1), int(match.group(2))
+    return test_name, date_str, test_name, None
+
+
+def statistics_metrics(entry):
+    """Metric columns of one statistics.json entry"""
+    return {
+        'samples': entry.get('sampleCount'),
+        'error_pct': entry.get('errorPct'),
+        'mean': entry.get('meanResTime'),
+        'p90': entry.get('pct1ResTime'),
+        'p95': entry.get('pct2ResTime'),
+        'p99': entry.get('pct3ResTime'),
+        'throughput': entry.get('throughput')
+    }
+
+
+def read_report_metrics(report_dir):
+    """Headline metrics and per-label metrics from a report's statistics.json
+
+    Returns:
+        tuple: (Total 指标, {标签: 指标})
+    """
+    path = os.path.join(report_dir, 'statistics.json')
+    if not os.path.exists(path):
+        return {}, {}
+    try:
+        with open(path, 'r') as f:
+            statistics = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+    total = statistics.get('Total')
+    if not total:
+        return {}, {}
+    metrics = statistics_metrics(total)
+    throughput = total.get('throughput') or 0
+    # JMeter 的吞吐量 = 样本数 / 测试时长，反推持续时间
+    metrics['duration'] = round(total['sampleCount'] / throughput, 1) if throughput else None
+    labels = {label: statistics_metrics(entry) for label, entry in statistics.items()
+              if label != 'Total' and isinstance(entry, dict)}
+    return metrics, labels
+
+
+class ReportIndex:
+    """SQLite index of the report directories"""
+
+    def __init__(self, db_file, html_dir):
+        self.db_file = str(db_file)
+        self.html_dir = str(html_dir)
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if not row or row[0] != INDEX_VERSION:
+                # 结构变化后清空索引，下一次同步时全部重新读取
+                conn.execute("DELETE FROM reports")
+                conn.execute("DELETE FROM report_labels")
+                conn.execute("DELETE FROM meta")
+                conn.execute("INSERT INTO meta (key, value) VALUES ('version', ?)", (INDEX_VERSION,))
+
+    @contextmanager
+    def _connect(self):
+        """Serialized connection that commits on success and is always closed"""
+        with self.lock:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def _record(self, dir_name):
+        """Index record of a report directory and its per-label metrics, or (None, None)"""
+        parsed = parse_report_name(dir_name)
+        report_dir = os.path.join(self.html_dir, dir_name)
+        if parsed is None or not os.path.isdir(report_dir):
+            return None, None
+        test_name, date_str, jmx, users = parsed
+        record = {
+            'dir_name': dir_name,
+            'name': test_name,
+            'jmx': jmx,
+            'users': users,
+            'date': date_str,
+            'duration': None,
+            'has_index': int(os.path.exists(os.path.join(report_dir, 'index.html'))),
+            # 不回传原始JTL的运行没有HTML报告，只有由 Backend Listener 指标计算的 statistics.json
+            'has_statistics': int(os.path.exists(os.path.join(report_dir, 'statistics.json'))),
+            'dir_mtime': os.stat(report_dir).st_mtime,
+            'updated': time.time()
+        }
+        record.update({column: None for column in METRIC_COLUMNS})
+        metrics, labels = read_report_metrics(report_dir)
+        record.update(metrics)
+        return record, labels
+
+    @staticmethod
+    def _upsert(conn, record, labels):
+        columns = list(record)
+        conn.execute(
+            f"INSERT OR REPLACE INTO reports ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            [record[column] for column in columns]
+        )
+        conn.execute("DELETE FROM report_labels WHERE dir_name = ?", (record['dir_name'],))
+        conn.executemany(
+            f"INSERT INTO report_labels (dir_name, label, {', '.join(METRIC_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in METRIC_COLUMNS)})",
+            [[record['dir_name'], label] + [metrics[column] for column in METRIC_COLUMNS]
+             for label, metrics in labels.items()]
+        )
+
+    @staticmethod
+    def _delete(conn, dir_names):
+        params = [(name,) for name in dir_names]
+        conn.executemany("DELETE FROM reports WHERE dir_name = ?", params)
+        conn.executemany("DELETE FROM report_labels WHERE dir_name = ?", params)
+
+    def update(self, dir_name):
+        """(Re)index one report directory, e.g. when a run or report job completes"""
+        record, labels = self._record(dir_name)
+        with self._connect() as conn:
+            if record is None:
+                self._delete(conn, [dir_name])
+            else:
+                self._upsert(conn, record, labels)
+        return record
+
+    def sync(self, force=False):
+        """Bring the index in line with the report directory
+
+        报告根目录 mtime 未变化时直接返回；否则只为新增或 mtime 变化的目录读取
+        statistics.json，删除已不存在的目录。force=True 时忽略根目录 mtime。
+        """
+        if not os.path.isdir(self.html_dir):
+            return 0
+        root_mtime = str(os.stat(self.html_dir).st_mtime)
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'root_mtime'").fetchone()
+            if not force and row and row[0] == root_mtime:
+                return 0
+            known = dict(conn.execute("SELECT dir_name, dir_mtime FROM reports"))
+            changed = 0
+            present = set()
+            for entry in os.scandir(self.html_dir):
+                if not entry.is_dir() or parse_report_name(entry.name) is None:
+                    continue
+                present.add(entry.name)
+                if known.get(entry.name) == entry.stat().st_mtime:
+                    continue
+                record, labels = self._record(entry.name)
+                if record is not None:
+                    self._upsert(conn, record, labels)
+                    changed += 1
+            removed = [name for name in known if name not in present]
+            self._delete(conn, removed)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root_mtime', ?)", (root_mtime,))
+        return changed + len(removed)
+
+    def query(self, search=None, jmx=None, min_users=None, max_users=None, date_from=None, date_to=None,
+              sort='date', order='desc', page=None, page_size=50, include_incomplete=False):
+        """Filtered, sorted (and optionally paginated) report list
+
+        Returns:
+            tuple: (符合条件的总数, [报告记录, ...])
+        """
+        conditions = []
+        params = []
+        if not include_incomplete:
+            conditions.append("(has_index = 1 OR has_statistics = 1)")
+        if search:
+            conditions.append("dir_name LIKE ? ESCAPE '\\'")
+            params.append('%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if jmx:
+            conditions.append("jmx = ?")
+            params.append(jmx)
+        if min_users is not None:
+            conditions.append("users >= ?")
+            params.append(min_users)
+        if max_users is not None:
+            conditions.append("users <= ?")
+            params.append(max_users)
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            # 允许只给日期前缀，例如 20250506
+            conditions.append("date <= ?")
+            params.append(date_to.ljust(14, '9'))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sort = sort if sort in SORT_COLUMNS else 'date'
+        order = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+        sql = f"SELECT * FROM reports {where} ORDER BY {sort} {order}, dir_name {order}"
+        query_params = list(params)
+        if page is not None:
+            sql += " LIMIT ? OFFSET ?"
+            query_params += [page_size, (max(page, 1) - 1) * page_size]
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            total = conn.execute(f"SELECT COUNT(*) FROM reports {where}", params).fetchone()[0]
+            rows = [dict(row) for row in conn.execute(sql, query_params)]
+        return total, rows
+
+    def label_metrics(self, dir_names, labels=None):
+        """Per-label metrics of the given reports
+
+        Returns:
+            dict: {目录名: {标签: 指标}}
+        """
+        result = {name: {} for name in dir_names}
+        if not dir_names:
+            return result
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            # SQLite 参数个数有限制，分批查询
+            names = list(dir_names)
+            for start in range(0, len(names), 500):
+                batch = names[start:start + 500]
+                sql = (f"SELECT * FROM report_labels WHERE dir_name IN ({', '.join('?' for _ in batch)})")
+                params = list(batch)
+                if labels:
+                    sql += f" AND label IN ({', '.join('?' for _ in labels)})"
+                    params += list(labels)
+                for row in conn.execute(sql, params):
+                    result[row['dir_name']][row['label']] = {column: row[column] for column in METRIC_COLUMNS}
+        return result
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# HTML 报告异步生成队列
+#
+# 延迟生成模式下压测只写 JTL，结束后把 "jmeter -g <jtl> -o <dir>" 提交到这里，
+# 由有界线程池在后台执行（每个任务是一个独立的 JMeter JVM），下一次压测可以
+# 立即开始。
+
+import itertools
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import LOG_LEVEL_INFO, LOG_LEVEL_ERROR
+
+# 内存中保留的已结束任务数量
+MAX_FINISHED_JOBS = 200
+
+
+class ReportJobQueue:
+    """Bounded worker pool that runs JMeter dashboard generation jobs"""
+
+    def __init__(self, jmeter_bin, log_dir, workers, on_log=None, on_complete=None):
+        self.jmeter_bin = str(jmeter_bin)
+        self.log_dir = str(log_dir)
+        self.workers = workers
+        self.on_log = on_log
+        self.on_complete = on_complete
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _log(self, level, message):
+        if self.on_log:
+            self.on_log(level, message)
+
+    def submit(self, jtl_file, report_dir):
+        """Queue dashboard generation for a JTL; returns the job dict
+
+        同一报告已有排队或运行中的任务时不重复提交，返回该任务。
+        """
+        report_name = os.path.basename(str(report_dir))
+        with self.lock:
+            pending = self._pending(report_name)
+            if pending is not None:
+                return dict(pending)
+            job_id = str(next(self._ids))
+            job = {
+                'id': job_id,
+                'jtl_file': str(jtl_file),
+                'report_dir': str(report_dir),
+                'report_name': report_name,
+                'status': 'queued',
+                'submitted': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'started': None,
+                'finished': None,
+                'duration': None,
+                'message': None
+            }
+            self.jobs[job_id] = job
+            self._trim()
+        self.executor.submit(self._run, job)
+        self._log(LOG_LEVEL_INFO, f"Report generation job {job_id} queued for {job['report_name']}")
+        return dict(job)
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self, job):
+        report_dir = job['report_dir']
+        tmp_dir = None
+        gen_log = os.path.join(self.log_dir, f"report_gen_{job['report_name']}.log")
+        start = time.time()
+        job['status'] = 'running'
+        job['started'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            # JMeter 要求输出目录为空，先生成到本任务独立的临时目录再合并到报告目录
+            tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(report_dir) + '.', suffix='.tmp',
+                                       dir=os.path.dirname(os.path.abspath(report_dir)))
+            cmd = [
+                f"{self.jmeter_bin}/jmeter",
+                "-g", job['jtl_file'],
+                "-o", tmp_dir,
+                "-j", gen_log
+            ]
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    universal_newlines=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"jmeter -g exited with code {result.returncode}: "
+                                   f"{result.stdout.strip()[-500:]}")
+            os.makedirs(report_dir, exist_ok=True)
+            for name in os.listdir(tmp_dir):
+                target = os.path.join(report_dir, name)
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                os.replace(os.path.join(tmp_dir, name), target)
+            shutil.rmtree(tmp_dir)
+            job['status'] = 'done'
+            job['message'] = "报告生成完成"
+            job['duration'] = round(time.time() - start, 1)
+            self._log(LOG_LEVEL_INFO, f"Report generation job {job['id']} finished: {report_dir}")
+        except Exception as e:
+            job['status'] = 'failed'
+            job['message'] = str(e)
+            self._log(LOG_LEVEL_ERROR, f"Report generation job {job['id']} failed: {str(e)}")
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        finally:
+            job['finished'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            job['duration'] = round(time.time() - start, 1)
+        if self.on_complete:
+            # 回调失败（例如更新索引出错）不影响已经生成的报告
+            try:
+                self.on_complete(job)
+            except Exception as e:
+                self._log(LOG_LEVEL_ERROR, f"Report generation job {job['id']} completion handler failed: {str(e)}")
+
+    def _pending(self, report_name):
+        for job in self.jobs.values():
+            if job['report_name'] == report_name and job['status'] in ('queued', 'running'):
+                return job
+        return None
+
+    def find(self, report_name):
+        """Return a copy of the queued or running job for the report, or None"""
+        with self.lock:
+            job = self._pending(report_name)
+            return dict(job) if job else None
+
+    def is_pending(self, report_name):
+        """True if a job for the report is queued or running"""
+        with self.lock:
+            return self._pending(report_name) is not None
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
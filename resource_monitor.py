@@ -0,0 +1,496 @@
+# -*- coding: utf-8 -*-
+"""压测期间的资源监控
+
+采集代理（agent）部署在 slave 和被测服务器上，每秒从 /proc 读取 CPU、内存、负载、
+网络、磁盘，指定 JVM 进程时通过 jstat 读取 GC 时间，按批次推送给压测控制端:
+
+    POST /api/resources
+    {"host": "10.0.0.5", "role": "target", "sent": 1700000000123,
+     "fields": ["ts", "cpu", ...], "samples": [[1700000000000, 35.2, ...], ...]}
+
+控制端把测试运行期间收到的批次追加写入 JTL 旁边的 <运行ID>.resources.jsonl，
+slave 的数据只记入使用该 slave 的测试，其他主机（被测服务器等）记入所有正在运行的
+测试。分析时按秒与 JTL 的吞吐量、响应时间对齐（用每批的发送时间校正主机时钟偏差），
+并找出最先饱和的主机，判断是被测服务器还是压测机先到达瓶颈。
+
+控制端本机由进程内的本地代理采集（role 为 master）。在其他主机上运行代理:
+    python resource_monitor.py --runner http://192.168.89.157:5001 --role target [--jvm-pid 1234]
+该脚本只依赖标准库（分析部分需要 numpy）。
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from urllib import request as urllib_request
+
+try:
+    import numpy as np
+except ImportError:
+    # 采集代理只需要标准库，numpy 只在控制端分析时使用
+    np = None
+
+FIELDS = ('ts', 'cpu', 'mem', 'mem_used_mb', 'load1', 'net_rx_kbps', 'net_tx_kbps',
+          'disk_read_kbps', 'disk_write_kbps', 'gc_ms')
+ROLES = ('slave', 'target', 'master')
+RESOURCE_SUFFIX = '.resources.jsonl'
+
+# 饱和判定: 指标连续 SATURATION_SECONDS 秒不低于阈值
+SATURATION_THRESHOLDS = {'cpu': 90.0, 'mem': 90.0}
+SATURATION_SECONDS = 3
+# 单批最多样本数，超出部分丢弃
+MAX_BATCH_SAMPLES = 600
+
+
+def resources_path(jtl_file):
+    """File holding the resource samples of the run that writes jtl_file"""
+    base = str(jtl_file)
+    if base.endswith('.jtl'):
+        base = base[:-4]
+    return base + RESOURCE_SUFFIX
+
+
+def _read_cpu_times():
+    with open('/proc/stat', 'r') as f:
+        values = [int(value) for value in f.readline().split()[1:]]
+    # user nice system idle iowait irq softirq steal
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    return sum(values[:8]), idle
+
+
+def _read_meminfo():
+    info = {}
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
+            name, value = line.split(':', 1)
+            info[name] = int(value.split()[0])
+    total = info.get('MemTotal', 0)
+    available = info.get('MemAvailable', info.get('MemFree', 0) + info.get('Cached', 0))
+    return total, total - available
+
+
+def _read_net_bytes():
+    rx = tx = 0
+    with open('/proc/net/dev', 'r') as f:
+        for line in f.readlines()[2:]:
+            name, data = line.split(':', 1)
+            if name.strip() == 'lo':
+                continue
+            values = data.split()
+            rx += int(values[0])
+            tx += int(values[8])
+    return rx, tx
+
+
+def _read_disk_sectors():
+    read = written = 0
+    with open('/proc/diskstats', 'r') as f:
+        for line in f:
+            values = line.split()
+            # 只统计整块设备，分区的数据已包含在设备中
+            if len(values) < 10 or not os.path.exists(f'/sys/block/{values[2]}'):
+                continue
+            if values[2].startswith(('loop', 'ram')):
+                continue
+            read += int(values[5])
+            written += int(values[9])
+    return read, written
+
+
+def _read_load1():
+    with open('/proc/loadavg', 'r') as f:
+        return float(f.read().split()[0])
+
+
+class JstatReader:
+    """GC time of a JVM from a long-running `jstat -gc <pid> <interval>`"""
+
+    def __init__(self, pid, interval_ms=1000):
+        self.pid = pid
+        self.gc_total = None
+        self._process = None
+        self._interval_ms = interval_ms
+
+    def start(self):
+        try:
+            self._process = subprocess.Popen(['jstat', '-gc', str(self.pid), str(self._interval_ms)],
+                                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                             universal_newlines=True)
+        except OSError:
+            return None
+        thread = threading.Thread(target=self._read)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def _read(self):
+        columns = None
+        for line in self._process.stdout:
+            values = line.split()
+            if not values:
+                continue
+            if 'GCT' in values:
+                columns = values
+                continue
+            if columns and len(values) == len(columns):
+                try:
+                    self.gc_total = float(values[columns.index('GCT')])
+                except ValueError:
+                    pass
+
+    def stop(self):
+        if self._process:
+            self._process.terminate()
+
+
+def find_jmeter_pid():
+    """PID of a local JMeter JVM (jmeter-server on slaves), or None"""
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/cmdline', 'rb') as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if b'ApacheJMeter' in cmdline and int(name) != os.getpid():
+            return int(name)
+    return None
+
+
+class ProcSampler:
+    """Per-interval resource rates computed from /proc counters"""
+
+    def __init__(self, jstat=None):
+        self.jstat = jstat
+        self._last = None
+
+    def _counters(self):
+        return {
+            'time': time.time(),
+            'cpu': _read_cpu_times(),
+            'net': _read_net_bytes(),
+            'disk': _read_disk_sectors(),
+            'gc': self.jstat.gc_total if self.jstat else None
+        }
+
+    def sample(self):
+        """One row in FIELDS order, or None for the first call (rates need two readings)"""
+        current = self._counters()
+        last, self._last = self._last, current
+        if last is None:
+            return None
+        seconds = max(current['time'] - last['time'], 1e-3)
+        total = current['cpu'][0] - last['cpu'][0]
+        idle = current['cpu'][1] - last['cpu'][1]
+        mem_total, mem_used = _read_meminfo()
+        gc_ms = None
+        if current['gc'] is not None and last['gc'] is not None:
+            gc_ms = round((current['gc'] - last['gc']) * 1000.0, 1)
+        return [
+            int(current['time'] * 1000),
+            round((total - idle) * 100.0 / total, 1) if total > 0 else 0.0,
+            round(mem_used * 100.0 / mem_total, 1) if mem_total else 0.0,
+            mem_used // 1024,
+            _read_load1(),
+            round((current['net'][0] - last['net'][0]) / 1024.0 / seconds, 1),
+            round((current['net'][1] - last['net'][1]) / 1024.0 / seconds, 1),
+            round((current['disk'][0] - last['disk'][0]) * 0.5 / seconds, 1),
+            round((current['disk'][1] - last['disk'][1]) * 0.5 / seconds, 1),
+            gc_ms
+        ]
+
+
+class ResourceAgent:
+    """Sample local resources every interval and hand them to sink(batch) in batches
+
+    Args:
+        sink: sink(batch)，batch 为推送协议中的字典；远程代理通过 HTTP 发送，
+              本地代理直接交给 ResourceCollector.ingest
+    """
+
+    def __init__(self, sink, host=None, role='target', interval=1.0, batch_size=5, jvm_pid=None, on_log=None):
+        self.sink = sink
+        self.host = host or socket.gethostname()
+        self.role = role
+        self.interval = interval
+        self.batch_size = batch_size
+        self.jvm_pid = jvm_pid
+        self.on_log = on_log
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        jstat = JstatReader(self.jvm_pid).start() if self.jvm_pid else None
+        sampler = ProcSampler(jstat)
+        pending = []
+        next_time = time.time()
+        try:
+            while not self._stop_event.is_set():
+                row = sampler.sample()
+                if row is not None:
+                    pending.append(row)
+                if len(pending) >= self.batch_size:
+                    pending = self._send(pending)
+                next_time += self.interval
+                self._stop_event.wait(max(0.0, next_time - time.time()))
+            if pending:
+                self._send(pending)
+        finally:
+            if jstat:
+                jstat.stop()
+
+    def _send(self, samples):
+        batch = {'host': self.host, 'role': self.role, 'sent': int(time.time() * 1000),
+                 'fields': list(FIELDS), 'samples': samples}
+        try:
+            self.sink(batch)
+        except Exception as e:
+            self._log(f"Failed to send resource samples: {str(e)}")
+            # 控制端暂时不可用时保留样本，下次一起发送
+            return samples[-MAX_BATCH_SAMPLES:]
+        return []
+
+
+def http_sink(runner_url, timeout=5):
+    """sink that POSTs batches to a runner's /api/resources"""
+    url = runner_url.rstrip('/') + '/api/resources'
+
+    def send(batch):
+        data = json.dumps(batch, separators=(',', ':')).encode('utf-8')
+        req = urllib_request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        with urllib_request.urlopen(req, timeout=timeout) as response:
+            response.read()
+    return send
+
+
+def _is_number(value):
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+
+def valid_sample(row, width):
+    """True if row is a list of width numbers (None for a missing value)"""
+    return isinstance(row, list) and len(row) == width and all(_is_number(value) for value in row)
+
+
+class ResourceCollector:
+    """Runner-side store of agent batches for the runs in progress"""
+
+    def __init__(self, on_log=None):
+        self.on_log = on_log
+        self.lock = threading.Lock()
+        self.runs = {}
+        self.hosts = {}
+
+    def begin(self, run_id, path, servers):
+        """Start recording batches for a run into path"""
+        with self.lock:
+            self.runs[run_id] = {'path': str(path), 'servers': set(servers), 'batches': 0}
+
+    def end(self, run_id):
+        """Stop recording for a run; returns the number of batches stored"""
+        with self.lock:
+            run = self.runs.pop(run_id, None)
+        return run['batches'] if run else 0
+
+    def ingest(self, batch):
+        """Validate a batch and append it to the matching runs
+
+        Returns:
+            list: 记录了该批次的运行ID
+        """
+        if not isinstance(batch, dict):
+            raise ValueError("batch must be a JSON object")
+        host = str(batch.get('host') or '').strip()
+        fields = batch.get('fields')
+        samples = batch.get('samples')
+        if (not host or not isinstance(fields, list) or not all(isinstance(name, str) for name in fields)
+                or 'ts' not in fields or not isinstance(samples, list)):
+            raise ValueError("batch requires host, fields (with ts) and samples")
+        # 只保留数值（或 null）组成且带时间戳的行，写入的文件总能被 load_resources 读取
+        ts_index = fields.index('ts')
+        samples = [row for row in samples[:MAX_BATCH_SAMPLES]
+                   if valid_sample(row, len(fields)) and row[ts_index] is not None]
+        role = batch.get('role') if batch.get('role') in ROLES else 'target'
+        received = int(time.time() * 1000)
+        record = {'host': host, 'role': role, 'received': received,
+                  # 主机时钟偏差: 控制端收到时间 - 代理发送时间（忽略网络延迟）
+                  'clock_offset_ms': received - int(batch['sent']) if batch.get('sent') else 0,
+                  'fields': fields, 'samples': samples}
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        stored = []
+        with self.lock:
+            self.hosts[host] = {'role': role, 'last_seen': received, 'samples': len(samples)}
+            for run_id, run in self.runs.items():
+                # slave 的数据只属于使用该 slave 的测试
+                if role == 'slave' and host not in run['servers']:
+                    continue
+                with open(run['path'], 'a') as f:
+                    f.write(line)
+                run['batches'] += 1
+                stored.append(run_id)
+        return stored
+
+    def agents(self):
+        with self.lock:
+            return {host: dict(info) for host, info in self.hosts.items()}
+
+
+def load_resources(path):
+    """Samples of a run grouped by host
+
+    Returns:
+        dict: {主机: {'role', 'fields': {字段: numpy 数组}}}，时间已按时钟偏差校正
+    """
+    hosts = {}
+    if not os.path.exists(path):
+        return hosts
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            entry = hosts.setdefault(record['host'], {'role': record['role'], 'rows': [], 'offsets': []})
+            index = {name: i for i, name in enumerate(record['fields'])}
+            for row in record['samples']:
+                if not valid_sample(row, len(record['fields'])):
+                    continue
+                entry['rows'].append([row[index[name]] if name in index else None for name in FIELDS])
+            entry['offsets'].append(record.get('clock_offset_ms', 0))
+    result = {}
+    for host, entry in hosts.items():
+        if not entry['rows']:
+            continue
+        table = np.array(entry['rows'], dtype=object)
+        columns = {name: np.array([np.nan if value is None else value for value in table[:, i]], dtype=float)
+                   for i, name in enumerate(FIELDS)}
+        columns['ts'] = columns['ts'] + float(np.median(entry['offsets']))
+        order = np.argsort(columns['ts'], kind='stable')
+        result[host] = {'role': entry['role'], 'fields': {name: values[order] for name, values in columns.items()}}
+    return result
+
+
+def _first_saturation(values, threshold, seconds=SATURATION_SECONDS):
+    over = np.asarray(values) >= threshold
+    if over.size < seconds:
+        return None
+    # 连续 seconds 个点都超过阈值的第一个位置
+    window = np.convolve(over.astype(np.int32), np.ones(seconds, dtype=np.int32), mode='valid')
+    hits = np.flatnonzero(window >= seconds)
+    return int(hits[0]) if hits.size else None
+
+
+def align_with_jtl(resources, data, bin_ms=1000):
+    """Per-second series of the JTL and every host on a common time axis
+
+    Args:
+        resources: load_resources 的结果
+        data: jtl_store.ColumnarJtl
+
+    Returns:
+        dict: offsets（距测试开始的秒数）、jtl（吞吐量、平均响应时间、错误数、线程数）、
+              hosts（各主机按秒对齐的指标，没有数据的秒为 null）、saturation（各主机首次
+              饱和的时间，按时间排序）
+    """
+    timestamps = np.asarray(data['timeStamp'][:], dtype=np.int64)
+    start = int(timestamps.min())
+    bins = (timestamps - start) // bin_ms
+    count = np.bincount(bins).astype(np.float64)
+    length = len(count)
+    elapsed_sum = np.bincount(bins, weights=np.asarray(data['elapsed'][:], dtype=np.float64), minlength=length)
+    errors = np.bincount(bins, weights=~np.asarray(data['success'][:], dtype=bool), minlength=length)
+    active = count > 0
+    mean = np.full(length, np.nan)
+    mean[active] = elapsed_sum[active] / count[active]
+    threads = np.full(length, np.nan)
+    if 'all_threads' in data:
+        thread_sum = np.bincount(bins, weights=np.asarray(data['all_threads'][:], dtype=np.float64), minlength=length)
+        threads[active] = thread_sum[active] / count[active]
+
+    def to_list(values):
+        return [None if np.isnan(value) else round(float(value), 2) for value in values]
+
+    result = {
+        'start_ms': start,
+        'bin_ms': bin_ms,
+        'offsets': list(range(length)),
+        'jtl': {'throughput': to_list(count * 1000.0 / bin_ms), 'mean': to_list(mean),
+                'errors': to_list(errors), 'threads': to_list(threads)},
+        'hosts': {},
+        'saturation': []
+    }
+    for host, entry in resources.items():
+        fields = entry['fields']
+        host_bins = ((fields['ts'] - start) // bin_ms).astype(np.int64)
+        inside = (host_bins >= 0) & (host_bins < length)
+        series = {}
+        for name in FIELDS[1:]:
+            values = np.full(length, np.nan)
+            # 同一秒有多个样本时取最后一个
+            values[host_bins[inside]] = fields[name][inside]
+            series[name] = values
+        result['hosts'][host] = {'role': entry['role'],
+                                 'samples': int(inside.sum()),
+                                 'metrics': {name: to_list(values) for name, values in series.items()}}
+        for metric, threshold in SATURATION_THRESHOLDS.items():
+            offset = _first_saturation(np.nan_to_num(series[metric]), threshold)
+            if offset is not None:
+                result['saturation'].append({'host': host, 'role': entry['role'], 'metric': metric,
+                                             'threshold': threshold, 'offset_s': offset})
+    result['saturation'].sort(key=lambda item: item['offset_s'])
+    result['first_saturated'] = result['saturation'][0] if result['saturation'] else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resource collector agent: samples /proc every second "
+                                                 "and pushes batches to the load-test runner")
+    parser.add_argument('--runner', required=True, help="控制端地址，例如 http://192.168.89.157:5001")
+    parser.add_argument('--role', choices=ROLES, default='target', help="本机角色")
+    parser.add_argument('--host', help="上报的主机名，默认使用本机 IP（与 slave 资源池一致）")
+    parser.add_argument('--interval', type=float, default=1.0, help="采样间隔（秒）")
+    parser.add_argument('--batch', type=int, default=5, help="每批样本数")
+    parser.add_argument('--jvm-pid', type=int, help="读取 GC 时间的 JVM 进程号；slave 上默认查找 JMeter 进程")
+    args = parser.parse_args()
+
+    host = args.host
+    if not host:
+        # 通过连接控制端得到本机对外的 IP
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            probe.connect((args.runner.split('//')[-1].split(':')[0].split('/')[0], 80))
+            host = probe.getsockname()[0]
+        except OSError:
+            host = socket.gethostname()
+        finally:
+            probe.close()
+    jvm_pid = args.jvm_pid or (find_jmeter_pid() if args.role == 'slave' else None)
+    agent = ResourceAgent(http_sink(args.runner), host=host, role=args.role, interval=args.interval,
+                          batch_size=args.batch, jvm_pid=jvm_pid, on_log=print)
+    print(f"Reporting {host} ({args.role}) to {args.runner} every {args.interval:g}s"
+          + (f", GC of JVM {jvm_pid}" if jvm_pid else ''))
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        agent.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# 压测任务队列与调度器
+#
+# 任务持久化在 JSON 文件中，服务重启后未执行的任务仍然保留。调度线程按优先级
+# 依次启动任务，上一个任务结束后立即启动下一个；使用的 slave 互不重叠的任务
+# 可以同时运行。被阻塞的高优先级任务会预留它需要的 slave，低优先级任务不能
+# 抢占，避免高优先级任务一直等待。
+
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# 持久化文件中保留的已结束任务数量
+MAX_FINISHED_JOBS = 500
+
+
+class JobScheduler:
+    """Persistent priority queue of test runs with a background scheduler
+
+    Args:
+        queue_file: 持久化文件路径
+        launch: launch(job) -> run_id 或 None，启动一个压测任务；按数量分配的任务使用
+                job['assigned'] 中的 slave
+        busy_servers: busy_servers() -> set，当前正在使用的 slave
+        default_servers: default_servers() -> list，任务未指定 slave 时从中选择，按优先
+                         使用的顺序排列
+        stop_run: stop_run(run_id)，终止正在运行的任务
+    """
+
+    def __init__(self, queue_file, launch, busy_servers, default_servers, stop_run, on_log=None):
+        self.queue_file = str(queue_file)
+        self.launch = launch
+        self.busy_servers = busy_servers
+        self.default_servers = default_servers
+        self.stop_run = stop_run
+        self.on_log = on_log
+        self.condition = threading.Condition()
+        self.jobs = []
+        self._seq = itertools.count(1)
+        self._thread = None
+        # 已结束但尚未关联到任务的运行: run_id -> success
+        self._early_finished = {}
+        self._load()
+
+    def _log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    def _load(self):
+        if not os.path.exists(self.queue_file):
+            return
+        with open(self.queue_file, 'r') as f:
+            self.jobs = json.load(f)
+        for job in self.jobs:
+            if job['status'] == RUNNING:
+                # 服务重启时正在运行的任务已经丢失
+                job['status'] = FAILED
+                job['message'] = "服务重启时任务中断"
+        if self.jobs:
+            self._seq = itertools.count(max(int(job['id']) for job in self.jobs) + 1)
+
+    def _save(self):
+        finished = [job for job in self.jobs if job['status'] in FINISHED_STATES]
+        if len(finished) > MAX_FINISHED_JOBS:
+            drop = set(job['id'] for job in finished[:len(finished) - MAX_FINISHED_JOBS])
+            self.jobs = [job for job in self.jobs if job['id'] not in drop]
+        tmp_file = f"{self.queue_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.jobs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.queue_file)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _find(self, job_id):
+        for job in self.jobs:
+            if job['id'] == str(job_id):
+                return job
+        return None
+
+    def enqueue(self, jmx_file, thread_num, test_duration, step_num=None, servers=None,
+                priority=0, defer_report=None, slave_count=None, raw_jtl=None):
+        """Add a run to the queue; returns a copy of the job
+
+        未指定 servers 时，slave_count 为从资源池中使用的节点数（默认全部空闲节点）。
+        """
+        with self.condition:
+            job = {
+                'id': str(next(self._seq)),
+                'jmx_file': jmx_file,
+                'thread_num': thread_num,
+                'test_duration': test_duration,
+                'step_num': step_num,
+                'servers': servers,
+                'slave_count': slave_count,
+                # 调度时为按数量分配的任务选定的 slave
+                'assigned': None,
+                'priority': priority,
+                'defer_report': defer_report,
+                'raw_jtl': raw_jtl,
+                'status': QUEUED,
+                'submitted': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'started': None,
+                'finished': None,
+                'run_id': None,
+                'message': None
+            }
+            self.jobs.append(job)
+            self._save()
+            self.condition.notify_all()
+            return dict(job)
+
+    def list(self):
+        with self.condition:
+            queued = sorted((job for job in self.jobs if job['status'] == QUEUED),
+                            key=lambda job: (-job['priority'], int(job['id'])))
+            others = [job for job in self.jobs if job['status'] != QUEUED]
+            return [dict(job) for job in others + queued]
+
+    def get(self, job_id):
+        with self.condition:
+            job = self._find(job_id)
+            return dict(job) if job else None
+
+    def cancel(self, job_id):
+        """Cancel a queued job or stop a running one; returns the job or None"""
+        with self.condition:
+            job = self._find(job_id)
+            if job is None:
+                return None
+            if job['status'] == QUEUED:
+                job['status'] = CANCELLED
+                job['finished'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                self._save()
+            run_id = job['run_id'] if job['status'] == RUNNING else None
+        if run_id:
+            # 运行中的任务由 notify_finished 更新状态
+            job['message'] = "已手动取消"
+            self.stop_run(run_id)
+        return dict(job)
+
+    def reprioritize(self, job_id, priority):
+        with self.condition:
+            job = self._find(job_id)
+            if job is None or job['status'] != QUEUED:
+                return None
+            job['priority'] = priority
+            self._save()
+            self.condition.notify_all()
+            return dict(job)
+
+    def notify_finished(self, run_id, success):
+        """Called when a run ends so the next queued job can start"""
+        with self.condition:
+            matched = False
+            for job in self.jobs:
+                if job['run_id'] == run_id and job['status'] == RUNNING:
+                    self._finish(job, success)
+                    matched = True
+            if not matched and any(job['status'] == RUNNING and not job['run_id'] for job in self.jobs):
+                # 运行可能在 launch 返回、记录 run_id 之前就已结束
+                self._early_finished[run_id] = success
+            self.condition.notify_all()
+
+    def _finish(self, job, success):
+        job['status'] = DONE if success else FAILED
+        job['finished'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._save()
+
+    def _job_servers(self, job, reserved):
+        """Slaves a job needs given the reserved ones; None if too few are free
+
+        Returns:
+            tuple: (需要的 slave 集合或 None, 是否按数量从资源池中选择)
+        """
+        if job['servers']:
+            return set(job['servers']), False
+        pool = self.default_servers()
+        count = job.get('slave_count')
+        if not count:
+            return set(pool), False
+        free = [host for host in pool if host not in reserved]
+        if len(free) < count:
+            return None, True
+        return set(free[:count]), True
+
+    def _pick(self):
+        """Mark every queued job whose slaves are free as running, in priority order
+
+        调用时必须持有 self.condition。
+        """
+        reserved = set(self.busy_servers())
+        queued = sorted((job for job in self.jobs if job['status'] == QUEUED),
+                        key=lambda job: (-job['priority'], int(job['id'])))
+        picked = []
+        for job in queued:
+            servers, by_count = self._job_servers(job, reserved)
+            if servers is None:
+                # 空闲节点不足，预留剩余的全部节点，低优先级任务不能抢先使用
+                reserved |= set(self.default_servers())
+                continue
+            if servers & reserved:
+                reserved |= servers
+                continue
+            reserved |= servers
+            if by_count:
+                job['assigned'] = sorted(servers)
+            job['status'] = RUNNING
+            job['started'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            picked.append(job)
+        if picked:
+            self._save()
+        return picked
+
+    def _start(self, job):
+        """Launch one picked job; called without holding the lock"""
+        self._log(f"Scheduler: starting queued job {job['id']} ({job['jmx_file']}, {job['thread_num']} users)")
+        message = None
+        try:
+            run_id = self.launch(dict(job))
+        except Exception as e:
+            run_id = None
+            message = str(e)
+        with self.condition:
+            if run_id:
+                job['run_id'] = run_id
+                if run_id in self._early_finished:
+                    self._finish(job, self._early_finished.pop(run_id))
+                if not any(other['status'] == RUNNING and not other['run_id'] for other in self.jobs):
+                    self._early_finished.clear()
+            else:
+                job['status'] = FAILED
+                job['finished'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                job['message'] = message or job['message'] or "启动压测失败"
+            self._save()
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            # 只在选择任务时持有锁，启动压测（slave 检查、启动 JMeter）期间队列接口和
+            # notify_finished 不会被阻塞
+            with self.condition:
+                try:
+                    picked = self._pick()
+                except Exception as e:
+                    picked = []
+                    self._log(f"Scheduler error: {str(e)}")
+                if not picked:
+                    # 定期重新检查，slave 可能被队列之外启动的测试释放
+                    self.condition.wait(timeout=5)
+                    continue
+            for job in picked:
+                try:
+                    self._start(job)
+                except Exception as e:
+                    self._log(f"Scheduler error: {str(e)}")
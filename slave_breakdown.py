@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# 按压测机（slave）拆分的统计
+#
+# 分布式压测时 JTL 的 hostname / threadName 记录了每个样本来自哪台 slave（列式存储中的
+# host 列）。某台 slave 过载（CPU、GC、网络）时，它发出的请求响应时间和连接时间会偏高，
+# 看起来像是被测系统变慢了。这里按 slave 拆分响应时间、连接时间和吞吐量，并把每台
+# slave 与其余 slave 的合并样本做比较:
+#   - 响应时间 / 连接时间分布: Mann-Whitney U 检验（在直方图桶上计算）
+#   - 按标签加权的平均响应时间比值，排除各 slave 标签比例不同带来的差异
+#   - 错误率: 两比例 z 检验
+# 显著性水平按 slave 数做 Bonferroni 校正，统计显著且偏差超过阈值时标记为异常。
+#
+# 所有聚合都是对 host 编码（以及 host x 标签、host x 直方图桶的组合编码）的一次 bincount。
+
+import json
+import os
+
+import numpy as np
+
+from histogram import BUCKET_COUNT, bucket_index, percentiles_from_counts
+from regression import mann_whitney, two_proportion_test
+
+SLAVE_BREAKDOWN_FILE = 'slave_breakdown.json'
+ALPHA = 0.01
+# 比其余 slave 慢该比例以上才视为异常
+MIN_LATENCY_RATIO = 1.2
+MIN_CONNECT_RATIO = 1.5
+# 连接时间均值低于该值（毫秒）时不判断连接时间
+MIN_CONNECT_MS = 5.0
+# 错误率至少高出该百分点
+MIN_ERROR_DELTA = 1.0
+MIN_SAMPLES = 100
+PERCENTS = (50, 95, 99)
+
+
+def _ratio(a, b):
+    return a / b if b else None
+
+
+def _histogram_rows(codes, values, hosts):
+    """Per-host latency histograms as a (hosts, BUCKET_COUNT) array"""
+    combined = codes * BUCKET_COUNT + bucket_index(values)
+    return np.bincount(combined, minlength=hosts * BUCKET_COUNT).reshape(hosts, BUCKET_COUNT)
+
+
+def slave_breakdown(data, alpha=ALPHA, min_latency_ratio=MIN_LATENCY_RATIO,
+                    min_connect_ratio=MIN_CONNECT_RATIO, min_error_delta=MIN_ERROR_DELTA,
+                    min_samples=MIN_SAMPLES):
+    """Per-slave statistics of a run and the slaves that deviate from the rest
+
+    Args:
+        data: jtl_store.ColumnarJtl
+
+    Returns:
+        dict: hosts（每台 slave 的统计和检验结果）、outliers（异常 slave 列表）；
+              JTL 中没有 host 信息或只有一台 slave 时返回 None
+    """
+    if data.rows == 0 or 'host' not in data:
+        return None
+    names = data.categories['host']
+    codes = np.asarray(data['host'][:], dtype=np.int64)
+    host_count = len(names)
+    # 非分布式测试的线程名没有主机前缀，host 为空字符串
+    counts = np.bincount(codes, minlength=host_count)
+    present = [i for i in range(host_count) if counts[i] and names[i]]
+    if len(present) < 2:
+        return None
+
+    elapsed = np.asarray(data['elapsed'][:], dtype=np.int64)
+    timestamps = np.asarray(data['timeStamp'][:], dtype=np.int64)
+    success = np.asarray(data['success'][:], dtype=bool)
+    errors = np.bincount(codes, weights=~success, minlength=host_count)
+    elapsed_sum = np.bincount(codes, weights=elapsed, minlength=host_count)
+    latency_hist = _histogram_rows(codes, elapsed, host_count)
+    connect_hist = connect_sum = None
+    if 'connect' in data:
+        connect = np.asarray(data['connect'][:], dtype=np.int64)
+        connect_sum = np.bincount(codes, weights=connect, minlength=host_count)
+        connect_hist = _histogram_rows(codes, connect, host_count)
+
+    # 每台 slave 的活动秒数，用于计算吞吐量
+    seconds = (timestamps - timestamps.min()) // 1000
+    span = int(seconds.max()) + 1
+    per_second = np.bincount(codes * span + seconds, minlength=host_count * span).reshape(host_count, span)
+    active_seconds = np.count_nonzero(per_second, axis=1)
+
+    # host x 标签的平均响应时间，用于按标签加权的比值
+    label_codes = np.asarray(data['label'][:], dtype=np.int64)
+    label_count = len(data.categories['label'])
+    cell = codes * label_count + label_codes
+    cell_counts = np.bincount(cell, minlength=host_count * label_count).reshape(host_count, label_count)
+    cell_sums = np.bincount(cell, weights=elapsed, minlength=host_count * label_count).reshape(host_count,
+                                                                                               label_count)
+
+    rows = present
+    total_count = float(counts[rows].sum())
+    latency_total = latency_hist[rows].sum(axis=0)
+    connect_total = connect_hist[rows].sum(axis=0) if connect_hist is not None else None
+    label_total_counts = cell_counts[rows].sum(axis=0)
+    label_total_sums = cell_sums[rows].sum(axis=0)
+    corrected_alpha = alpha / len(rows)
+
+    hosts = []
+    for i in rows:
+        count = int(counts[i])
+        rest_count = total_count - count
+        host_errors = int(errors[i])
+        rest_errors = float(errors[rows].sum()) - host_errors
+        rest_hist = latency_total - latency_hist[i]
+        entry = {
+            'host': names[i],
+            'count': count,
+            'share_pct': count * 100.0 / total_count,
+            'errors': host_errors,
+            'error_pct': host_errors * 100.0 / count,
+            'throughput': count / float(active_seconds[i]) if active_seconds[i] else 0.0,
+            'active_seconds': int(active_seconds[i]),
+            'mean': float(elapsed_sum[i]) / count,
+            'connect_mean': float(connect_sum[i]) / count if connect_sum is not None else None,
+            'reasons': []
+        }
+        for percent, value in zip(PERCENTS, percentiles_from_counts(latency_hist[i], PERCENTS)):
+            entry[f'p{percent}'] = value
+        rest_p95 = percentiles_from_counts(rest_hist, [95])[0]
+        rest_mean = (float(elapsed_sum[rows].sum()) - elapsed_sum[i]) / rest_count
+        entry['mean_ratio'] = _ratio(entry['mean'], rest_mean)
+        entry['p95_ratio'] = _ratio(entry['p95'], rest_p95)
+
+        # 同一标签内与其余 slave 比较，再按本机各标签的样本数加权
+        label_counts = cell_counts[i]
+        other_counts = label_total_counts - label_counts
+        valid = (label_counts > 0) & (other_counts > 0)
+        entry['label_ratio'] = None
+        if valid.any():
+            own_mean = cell_sums[i][valid] / label_counts[valid]
+            other_mean = (label_total_sums[valid] - cell_sums[i][valid]) / other_counts[valid]
+            usable = other_mean > 0
+            if usable.any():
+                weights = label_counts[valid][usable]
+                entry['label_ratio'] = float(np.dot(own_mean[usable] / other_mean[usable], weights) / weights.sum())
+
+        if count < min_samples or rest_count < min_samples:
+            entry['outlier'] = False
+            entry['reasons'].append('insufficient_samples')
+            hosts.append(entry)
+            continue
+
+        test = mann_whitney(rest_hist, latency_hist[i])
+        entry['p_value'] = test['p_value']
+        entry['prob_slower'] = test['prob_slower']
+        ratio = max(value for value in (entry['label_ratio'], entry['p95_ratio'], 1.0) if value is not None)
+        if test['p_value'] < corrected_alpha and test['prob_slower'] > 0.5 and ratio >= min_latency_ratio:
+            entry['reasons'].append('latency')
+
+        if connect_hist is not None:
+            connect_test = mann_whitney(connect_total - connect_hist[i], connect_hist[i])
+            rest_connect = (float(connect_sum[rows].sum()) - connect_sum[i]) / rest_count
+            entry['connect_p_value'] = connect_test['p_value']
+            entry['connect_ratio'] = _ratio(entry['connect_mean'], rest_connect)
+            if (connect_test['p_value'] < corrected_alpha and connect_test['prob_slower'] > 0.5
+                    and entry['connect_mean'] >= MIN_CONNECT_MS
+                    and (entry['connect_ratio'] is None or entry['connect_ratio'] >= min_connect_ratio)):
+                entry['reasons'].append('connect')
+
+        _, error_p = two_proportion_test(rest_errors, rest_count, host_errors, count)
+        entry['error_p_value'] = error_p
+        rest_error_pct = rest_errors * 100.0 / rest_count
+        if error_p < corrected_alpha and entry['error_pct'] - rest_error_pct >= min_error_delta:
+            entry['reasons'].append('errors')
+        entry['outlier'] = bool(entry['reasons'])
+        hosts.append(entry)
+
+    return {
+        'hosts': hosts,
+        'outliers': [entry['host'] for entry in hosts if entry['outlier']],
+        'alpha': alpha,
+        'corrected_alpha': corrected_alpha,
+        'samples': int(total_count)
+    }
+
+
+def write_slave_breakdown(breakdown, report_dir):
+    path = os.path.join(str(report_dir), SLAVE_BREAKDOWN_FILE)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(breakdown, f, indent=2)
+    os.replace(tmp_file, path)
+    return path
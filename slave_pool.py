@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# JMeter slave 资源池
+#
+# 维护所有 slave 的注册信息（端口、CPU 核数、堆内存、可承载的最大线程数）和
+# 最近一次健康检查结果。每次压测从池中分配一组健康且空闲的 slave，不健康的
+# 节点自动剔除或用空闲节点替换，并按各节点的承载能力分配线程数。
+
+import ipaddress
+import json
+import os
+import socket
+import threading
+from datetime import datetime
+
+DEFAULT_PORT = 1099
+DEFAULT_CORES = 4
+DEFAULT_HEAP_MB = 1024
+# 未测量最大线程数时，每个 CPU 核按多少线程估算承载能力
+THREADS_PER_CORE = 250
+
+
+def machine_ip(host):
+    """IP address of a slave as JMeter's __machineIP() reports it, or None if it cannot be resolved"""
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        pass
+    try:
+        return socket.gethostbyname(host)
+    except (OSError, UnicodeError):
+        return None
+
+
+class SlavePoolError(Exception):
+    """Raised when no usable set of slaves can be allocated"""
+
+
+class SlavePool:
+    """Registry of JMeter slaves with capacity and health information"""
+
+    def __init__(self, pool_file, default_servers):
+        self.pool_file = str(pool_file)
+        self.lock = threading.Lock()
+        self.slaves = {}
+        if os.path.exists(self.pool_file):
+            with open(self.pool_file, 'r') as f:
+                for slave in json.load(f):
+                    self.slaves[slave['host']] = self._normalize(slave)
+        for host in default_servers:
+            if host not in self.slaves:
+                self.slaves[host] = self._normalize({'host': host})
+
+    @staticmethod
+    def _normalize(slave):
+        entry = {
+            'host': slave['host'],
+            'port': DEFAULT_PORT,
+            'cores': DEFAULT_CORES,
+            'heap_mb': DEFAULT_HEAP_MB,
+            'max_threads': None,          # 实测可承载的最大线程数，优先于按核数估算
+            'max_threads_run': 0,         # 成功完成过的最大单机线程数
+            'enabled': True,
+            'healthy': None,
+            'last_check': None,
+            'message': None
+        }
+        entry.update(slave)
+        return entry
+
+    def _save(self):
+        tmp_file = f"{self.pool_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(list(self.slaves.values()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.pool_file)
+
+    @staticmethod
+    def capacity(slave):
+        """Thread capacity used as the weight of a slave"""
+        if slave.get('max_threads'):
+            return int(slave['max_threads'])
+        return int(slave['cores']) * THREADS_PER_CORE
+
+    def list(self):
+        with self.lock:
+            return [dict(slave, capacity=self.capacity(slave)) for slave in self.slaves.values()]
+
+    def get(self, host):
+        with self.lock:
+            slave = self.slaves.get(host)
+            return dict(slave) if slave else None
+
+    def register(self, host, **fields):
+        """Add a slave or update its capacity fields"""
+        allowed = ('port', 'cores', 'heap_mb', 'max_threads', 'enabled')
+        with self.lock:
+            slave = self.slaves.get(host) or self._normalize({'host': host})
+            for key, value in fields.items():
+                if key in allowed and value is not None:
+                    slave[key] = value
+            self.slaves[host] = slave
+            self._save()
+            return dict(slave)
+
+    def remove(self, host):
+        with self.lock:
+            removed = self.slaves.pop(host, None)
+            if removed:
+                self._save()
+            return removed is not None
+
+    def update_health(self, results):
+        """Store health results: {host: (healthy, message)}"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            for host, (healthy, message) in results.items():
+                slave = self.slaves.get(host)
+                if slave is None:
+                    continue
+                slave['healthy'] = healthy
+                slave['message'] = message
+                slave['last_check'] = now
+            self._save()
+
+    def record_run(self, threads, success):
+        """Remember the largest per-slave thread count that completed successfully"""
+        if not success:
+            return
+        with self.lock:
+            for host, count in threads.items():
+                slave = self.slaves.get(host)
+                if slave and count > slave['max_threads_run']:
+                    slave['max_threads_run'] = count
+            self._save()
+
+    def ports(self, hosts):
+        with self.lock:
+            return {host: self.slaves[host]['port'] if host in self.slaves else DEFAULT_PORT for host in hosts}
+
+    def distribute(self, thread_num, hosts):
+        """Split thread_num across hosts in proportion to their capacity
+
+        所有节点承载能力相同时保持原来的向上取整平均分配；否则每台先分 1 个线程，
+        其余按权重分配，使用最大余数法保证总数等于 thread_num。线程数少于节点数时
+        只使用承载能力最大的 thread_num 台，每台 1 个线程，返回结果中不包含其余节点。
+        """
+        thread_num = max(int(thread_num), 1)
+        with self.lock:
+            capacities = [self.capacity(self.slaves[host]) if host in self.slaves
+                          else DEFAULT_CORES * THREADS_PER_CORE for host in hosts]
+        if thread_num < len(hosts):
+            ranked = sorted(range(len(hosts)), key=lambda i: capacities[i], reverse=True)[:thread_num]
+            return {hosts[i]: 1 for i in sorted(ranked)}
+        if len(set(capacities)) <= 1:
+            per_server = -(-thread_num // len(hosts))
+            return {host: per_server for host in hosts}
+
+        spare = thread_num - len(hosts)
+        total_capacity = float(sum(capacities))
+        shares = [spare * capacity / total_capacity for capacity in capacities]
+        threads = [int(share) for share in shares]
+        remainders = sorted(range(len(hosts)), key=lambda i: shares[i] - threads[i], reverse=True)
+        for i in remainders[:spare - sum(threads)]:
+            threads[i] += 1
+        return {host: count + 1 for host, count in zip(hosts, threads)}
+
+    def allocate(self, thread_num, health_check, servers=None, slave_count=None, exclude=()):
+        """Choose healthy, free slaves for a run and distribute threads
+
+        Args:
+            health_check: health_check(hosts) -> {host: (healthy, message)}
+            servers: 指定使用的 slave 列表；不健康的节点会用池中其他空闲健康节点替换
+            slave_count: 未指定 servers 时，从池中按承载能力选择的节点数（默认全部）
+            exclude: 已被其他测试占用的 slave
+
+        Returns:
+            dict: servers, threads, dropped, replaced, unused（线程数少于节点数时未使用的健康节点）
+
+        Raises:
+            SlavePoolError: 没有可用的 slave
+        """
+        exclude = set(exclude)
+        with self.lock:
+            enabled = [host for host, slave in self.slaves.items() if slave['enabled']]
+            by_capacity = sorted(enabled, key=lambda host: self.capacity(self.slaves[host]), reverse=True)
+        if servers:
+            wanted = list(servers)
+        else:
+            wanted = [host for host in by_capacity if host not in exclude]
+            if slave_count:
+                wanted = wanted[:slave_count]
+
+        busy = [host for host in wanted if host in exclude]
+        if busy:
+            raise SlavePoolError(f"slave 已被其他测试占用: {', '.join(busy)}")
+        if not wanted:
+            raise SlavePoolError("没有可用的空闲 slave")
+
+        results = health_check(wanted)
+        self.update_health({host: result for host, result in results.items() if host in self.slaves})
+        healthy = [host for host in wanted if results.get(host, (False, None))[0]]
+        dropped = [host for host in wanted if host not in healthy]
+
+        # 用池中其他空闲节点替换不健康的节点
+        replaced = {}
+        if dropped:
+            spares = [host for host in by_capacity
+                      if host not in exclude and host not in wanted]
+            spare_results = health_check(spares) if spares else {}
+            if spare_results:
+                self.update_health(spare_results)
+            healthy_spares = [host for host in spares if spare_results.get(host, (False, None))[0]]
+            for host in dropped:
+                if not healthy_spares:
+                    break
+                replacement = healthy_spares.pop(0)
+                replaced[host] = replacement
+                healthy.append(replacement)
+
+        if not healthy:
+            raise SlavePoolError("没有健康的 slave 可用")
+
+        threads = self.distribute(thread_num, healthy)
+        return {
+            # 线程数少于节点数时未分到线程的节点不参与本次测试
+            'servers': [host for host in healthy if host in threads],
+            'threads': threads,
+            'unused': [host for host in healthy if host not in threads],
+            'dropped': dropped,
+            'replaced': replaced
+        }
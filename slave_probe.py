@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# JMeter slave 健康检查
+#
+# 并发探测所有 slave，整体有截止时间，单个节点不可达不会拖慢整个检查。除了 TCP
+# 连接外还做一次 JRMP 握手（RMI 传输层协议），确认端口上确实是响应正常的 RMI
+# 服务，而不只是端口开着。结果放在带 TTL 的缓存中，由后台线程定期刷新，页面和
+# 压测前的检查可以直接读取缓存。
+
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+# JRMP 握手: magic "JRMI"、版本 2、StreamProtocol；服务端应答 ProtocolAck (0x4E)
+JRMP_HEADER = b'JRMI' + struct.pack('>H', 2) + b'\x4b'
+JRMP_PROTOCOL_ACK = 0x4e
+JRMP_PROTOCOL_NOT_SUPPORTED = 0x4f
+
+MAX_PROBE_WORKERS = 32
+
+
+def probe_server(host, port, timeout=3.0, rmi_check=True):
+    """Probe one slave
+
+    Returns:
+        tuple: (是否正常, 说明, 耗时毫秒)
+    """
+    start = time.monotonic()
+    try:
+        sock = socket.create_connection((host, port), timeout=timeout)
+    except socket.timeout:
+        return False, "连接超时", None
+    except OSError as e:
+        return False, f"无法连接: {e.strerror or str(e)}", None
+    try:
+        if not rmi_check:
+            return True, "正常", round((time.monotonic() - start) * 1000, 1)
+        sock.sendall(JRMP_HEADER)
+        reply = sock.recv(1)
+        latency = round((time.monotonic() - start) * 1000, 1)
+        if not reply:
+            return False, "RMI握手失败: 连接被关闭", latency
+        if reply[0] == JRMP_PROTOCOL_ACK:
+            return True, "正常", latency
+        if reply[0] == JRMP_PROTOCOL_NOT_SUPPORTED:
+            return False, "RMI握手失败: 协议不支持", latency
+        return False, f"RMI握手失败: 非RMI应答 0x{reply[0]:02x}", latency
+    except socket.timeout:
+        return False, "RMI握手超时", None
+    except OSError as e:
+        return False, f"RMI握手失败: {e.strerror or str(e)}", None
+    finally:
+        sock.close()
+
+
+def probe_servers(targets, timeout=3.0, deadline=5.0, rmi_check=True):
+    """Probe many slaves concurrently, bounded by an overall deadline
+
+    Args:
+        targets: {host: port}
+
+    Returns:
+        dict: {host: (是否正常, 说明, 耗时毫秒)}，截止时间内未完成的节点视为不健康
+    """
+    if not targets:
+        return {}
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=min(MAX_PROBE_WORKERS, len(targets)))
+    try:
+        futures = {executor.submit(probe_server, host, port, timeout, rmi_check): host
+                   for host, port in targets.items()}
+        done, _ = wait(futures, timeout=deadline)
+        for future, host in futures.items():
+            if future in done:
+                results[host] = future.result()
+            else:
+                results[host] = (False, "检查超时", None)
+    finally:
+        # 不等待超时的探测线程，它们会在 socket 超时后自行结束
+        executor.shutdown(wait=False)
+    return results
+
+
+class SlaveHealthCache:
+    """TTL cache of slave health kept fresh by a background prober
+
+    Args:
+        targets: targets() -> {host: port}，后台线程探测的全部节点
+        on_update: on_update({host: (是否正常, 说明)})，每次探测后回调（例如写入资源池）
+    """
+
+    def __init__(self, targets, ttl=30, interval=10, timeout=3.0, deadline=5.0, rmi_check=True,
+                 on_update=None, on_log=None):
+        self.targets = targets
+        self.ttl = ttl
+        self.interval = interval
+        self.timeout = timeout
+        self.deadline = deadline
+        self.rmi_check = rmi_check
+        self.on_update = on_update
+        self.on_log = on_log
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._thread = None
+
+    def _store(self, results):
+        now = time.monotonic()
+        checked_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            for host, (healthy, message, latency) in results.items():
+                self.entries[host] = {
+                    'healthy': healthy,
+                    'message': message,
+                    'latency_ms': latency,
+                    'checked_at': checked_at,
+                    'checked_monotonic': now
+                }
+        if self.on_update:
+            self.on_update({host: (result[0], result[1]) for host, result in results.items()})
+
+    def refresh(self, targets):
+        """Probe the given {host: port} now and update the cache"""
+        results = probe_servers(targets, self.timeout, self.deadline, self.rmi_check)
+        self._store(results)
+        return results
+
+    def check(self, targets, max_age=None, force=False):
+        """Health of the given {host: port}, probing only stale or missing entries
+
+        Returns:
+            dict: {host: 缓存条目}
+        """
+        max_age = self.ttl if max_age is None else max_age
+        now = time.monotonic()
+        with self.lock:
+            stale = {host: port for host, port in targets.items()
+                     if force or host not in self.entries
+                     or now - self.entries[host]['checked_monotonic'] > max_age}
+        if stale:
+            self.refresh(stale)
+        with self.lock:
+            return {host: self._public(self.entries[host]) for host in targets}
+
+    @staticmethod
+    def _public(entry):
+        return {key: value for key, value in entry.items() if key != 'checked_monotonic'}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh(self.targets())
+            except Exception as e:
+                if self.on_log:
+                    self.on_log(f"Slave health prober error: {str(e)}")
+            time.sleep(self.interval)
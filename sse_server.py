@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# 基于 asyncio 的 SSE 推送服务
+#
+# Flask 开发服务器中每个 /api/logs 连接都占用一个线程。这里用一个事件循环线程
+# 加一个桥接线程服务所有订阅者: 桥接线程从 LogBus 批量取出日志交给事件循环，
+# 由事件循环分发到每个客户端的有界缓冲区；实时统计每个运行每个周期只计算一次，
+# 所有订阅者共享。只依赖标准库，单独监听一个端口。
+#
+# 接口:
+#   GET /api/logs                    日志流，支持 Last-Event-ID / ?last_event_id=
+#   GET /api/live-stats?run_id=...   实时统计流
+#   GET /health                      连接数等状态
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+CLIENT_BUFFER = 2000
+HEARTBEAT_INTERVAL = 15
+LIVE_STATS_INTERVAL = 1.0
+MAX_HEADER_BYTES = 16384
+
+
+def encode_event(event):
+    """Encode a (seq, payload) log event as an SSE frame"""
+    seq, payload = event
+    data = payload if isinstance(payload, dict) else {'message': payload}
+    return seq, f"id: {seq}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+class _Client:
+    """Bounded buffer of encoded SSE frames of one connection (used inside the event loop)"""
+
+    def __init__(self, maxlen):
+        self.events = deque(maxlen=maxlen)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.last_seq = 0
+
+    def put(self, event):
+        # 补发的历史消息可能再次由桥接线程分发，按序号去重
+        if event[0] <= self.last_seq:
+            return
+        self.last_seq = event[0]
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+        self.ready.set()
+
+
+class SseServer:
+    """Asyncio SSE server bridging the log bus and live statistics
+
+    Args:
+        log_bus: log_bus.LogBus
+        live_stats: live_stats(run_id) -> dict，返回 {"running": ..., "stats": ...}
+    """
+
+    def __init__(self, host, port, log_bus, live_stats=None, client_buffer=CLIENT_BUFFER,
+                 heartbeat=HEARTBEAT_INTERVAL, live_interval=LIVE_STATS_INTERVAL, on_log=None):
+        self.host = host
+        self.port = port
+        self.log_bus = log_bus
+        self.live_stats = live_stats
+        self.client_buffer = client_buffer
+        self.heartbeat = heartbeat
+        self.live_interval = live_interval
+        self.on_log = on_log
+        self.loop = None
+        self.server = None
+        self.clients = set()
+        self.live_clients = 0
+        self._live_cache = {}
+        self._live_pending = {}
+        self._started = threading.Event()
+
+    def _log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    def start(self):
+        """Run the event loop and the log bridge in two daemon threads"""
+        thread = threading.Thread(target=self._run_loop)
+        thread.daemon = True
+        thread.start()
+        self._started.wait(10)
+        if self.server is None:
+            return self
+        bridge = threading.Thread(target=self._bridge)
+        bridge.daemon = True
+        bridge.start()
+        return self
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, backlog=1024))
+        except OSError as e:
+            self._log(f"SSE server could not listen on {self.host}:{self.port}: {str(e)}")
+            self._started.set()
+            return
+        if not self.port:
+            self.port = self.server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._log(f"SSE server listening on {self.host}:{self.port}")
+        self.loop.run_forever()
+
+    def _bridge(self):
+        """Move log events from the (thread based) bus into the event loop in batches"""
+        subscription = self.log_bus.subscribe()
+        while True:
+            events, dropped = subscription.get(timeout=1)
+            if events or dropped:
+                self.loop.call_soon_threadsafe(self._dispatch, events, dropped)
+
+    def _dispatch(self, events, dropped):
+        # 每条消息只编码一次，所有客户端共享同一个字节串
+        events = [encode_event(event) for event in events]
+        for client in self.clients:
+            client.dropped += dropped
+            for event in events:
+                client.put(event)
+            if dropped:
+                client.ready.set()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError):
+            writer.close()
+            return
+        if len(head) > MAX_HEADER_BYTES:
+            writer.close()
+            return
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) < 2 or parts[0] != 'GET':
+            await self._send_simple(writer, 405, {'error': 'Method not allowed'})
+            return
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        url = urlsplit(parts[1])
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        try:
+            if url.path == '/api/logs':
+                last_event_id = headers.get('last-event-id') or query.get('last_event_id')
+                try:
+                    last_event_id = int(last_event_id) if last_event_id else None
+                except ValueError:
+                    last_event_id = None
+                await self._stream_logs(writer, last_event_id)
+            elif url.path == '/api/live-stats':
+                await self._stream_live_stats(writer, query.get('run_id'))
+            elif url.path == '/health':
+                await self._send_simple(writer, 200, {
+                    'log_clients': len(self.clients),
+                    'live_stats_clients': self.live_clients,
+                    'last_seq': self.log_bus.last_seq
+                })
+            else:
+                await self._send_simple(writer, 404, {'error': 'Not found'})
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send_simple(self, writer, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}.get(status, '')
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nAccess-Control-Allow-Origin: *\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    @staticmethod
+    def _start_stream(writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n")
+
+    async def _stream_logs(self, writer, last_event_id):
+        client = _Client(self.client_buffer)
+        if last_event_id is not None:
+            missed, gap = self.log_bus.events_since(last_event_id)
+            client.dropped += gap
+            for event in missed:
+                client.put(encode_event(event))
+        self.clients.add(client)
+        self._start_stream(writer)
+        try:
+            while True:
+                if not client.events and not client.dropped:
+                    client.ready.clear()
+                    try:
+                        await asyncio.wait_for(client.ready.wait(), timeout=self.heartbeat)
+                    except asyncio.TimeoutError:
+                        writer.write(f"data: {json.dumps({'heartbeat': True})}\n\n".encode('utf-8'))
+                        await writer.drain()
+                        continue
+                chunks = []
+                if client.dropped:
+                    chunks.append(f"data: {json.dumps({'dropped': client.dropped})}\n\n".encode('utf-8'))
+                    client.dropped = 0
+                while client.events:
+                    chunks.append(client.events.popleft()[1])
+                writer.write(b''.join(chunks))
+                await writer.drain()
+        finally:
+            self.clients.discard(client)
+
+    async def _live_payload(self, run_id):
+        """Live stats shared by all subscribers of a run, computed at most once per interval"""
+        cached = self._live_cache.get(run_id)
+        if cached is not None and time.monotonic() - cached[0] < self.live_interval:
+            return cached[1]
+        pending = self._live_pending.get(run_id)
+        if pending is None:
+            # 统计快照在线程池中计算，不阻塞事件循环
+            pending = self.loop.run_in_executor(None, lambda: json.dumps(self.live_stats(run_id)))
+            self._live_pending[run_id] = pending
+            pending.add_done_callback(lambda future: self._live_done(run_id, future))
+        return await asyncio.shield(pending)
+
+    def _live_done(self, run_id, future):
+        self._live_pending.pop(run_id, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        now = time.monotonic()
+        if len(self._live_cache) > 100:
+            self._live_cache = {key: value for key, value in self._live_cache.items()
+                                if now - value[0] < self.live_interval}
+        self._live_cache[run_id] = (now, future.result())
+
+    async def _stream_live_stats(self, writer, run_id):
+        if self.live_stats is None:
+            await self._send_simple(writer, 404, {'error': 'Not found'})
+            return
+        self.live_clients += 1
+        self._start_stream(writer)
+        try:
+            while True:
+                try:
+                    payload = await self._live_payload(run_id)
+                    frame = f"data: {payload}\n\n"
+                except Exception as e:
+                    # 统计计算失败时通知客户端，下个周期重试
+                    self._log(f"Live stats for {run_id} failed: {str(e)}")
+                    frame = f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+                writer.write(frame.encode('utf-8'))
+                await writer.drain()
+                await asyncio.sleep(self.live_interval)
+        finally:
+            self.live_clients -= 1
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# 稳态窗口检测
+#
+# 从 JTL 时间序列中找出测试的稳态区间，去掉加压（ramp-up）和减压（ramp-down）阶段:
+#   1. 按秒统计活动线程数（allThreads 的平均值），保留线程数达到峰值 95% 的最长连续区间
+#   2. 在该区间内按秒统计吞吐量，用均值突变点（两段平方误差和最小的切分点）去掉
+#      开头吞吐量明显偏低的预热段和结尾明显偏低的收尾段
+# 之后只用窗口内的样本重新计算 statistics.json（statistics_steady.json），并保留
+# 未裁剪的统计结果用于对照。
+
+import json
+import os
+
+import numpy as np
+
+from jtl_stats import compute_statistics
+
+STEADY_STATISTICS_FILE = 'statistics_steady.json'
+STEADY_WINDOW_FILE = 'steady_state.json'
+
+BIN_MS = 1000
+# 线程数不低于峰值的该比例时视为满负载
+THREAD_PLATEAU_RATIO = 0.95
+# 突变点前后吞吐量均值相差超过该比例才裁剪
+THROUGHPUT_SHIFT_RATIO = 0.1
+# 突变点只在窗口的前/后该比例范围内查找
+EDGE_FRACTION = 1 / 3.0
+# 稳态窗口至少包含的秒数，且不短于整个测试的该比例，否则视为不可靠
+MIN_WINDOW_BINS = 10
+MIN_WINDOW_FRACTION = 0.3
+
+
+def _longest_run(flags):
+    """(start, end) of the longest run of True values, end exclusive"""
+    if not flags.any():
+        return None
+    padded = np.concatenate([[False], flags, [False]]).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    starts, ends = edges[::2], edges[1::2]
+    best = int(np.argmax(ends - starts))
+    return int(starts[best]), int(ends[best])
+
+
+def mean_shift_point(series, lo, hi):
+    """Best single mean-shift split of series among split positions lo..hi
+
+    切分点 k 把序列分成 series[:k] 和 series[k:]，使两段的平方误差和最小。
+
+    Returns:
+        tuple 或 None: (k, 左段均值, 右段均值)
+    """
+    n = len(series)
+    lo, hi = max(lo, 1), min(hi, n - 1)
+    if hi <= lo:
+        return None
+    cumsum = np.concatenate([[0.0], np.cumsum(series)])
+    cumsq = np.concatenate([[0.0], np.cumsum(series * series)])
+    k = np.arange(lo, hi + 1)
+    left_sum, left_sq = cumsum[k], cumsq[k]
+    right_sum, right_sq = cumsum[n] - left_sum, cumsq[n] - left_sq
+    cost = (left_sq - left_sum ** 2 / k) + (right_sq - right_sum ** 2 / (n - k))
+    best = int(np.argmin(cost))
+    split = int(k[best])
+    return split, float(left_sum[best] / split), float(right_sum[best] / (n - split))
+
+
+def detect_steady_window(data):
+    """Find the steady-state window of a run
+
+    Args:
+        data: jtl_store.ColumnarJtl
+
+    Returns:
+        dict: start_ms/end_ms（样本开始时间的范围，左闭右开）、各阶段裁剪的秒数、
+              reliable（窗口是否足够长）等；没有样本时返回 None
+    """
+    if data.rows == 0:
+        return None
+    timestamps = np.asarray(data['timeStamp'][:], dtype=np.int64)
+    first = int(timestamps.min())
+    bins = (timestamps - first) // BIN_MS
+    counts = np.bincount(bins).astype(np.float64)
+    total_bins = len(counts)
+    # 首尾两个不完整的秒不参与判断
+    lo, hi = (1, total_bins - 1) if total_bins > 2 else (0, total_bins)
+    method = ['edges']
+
+    threads_peak = None
+    if 'all_threads' in data:
+        threads = np.bincount(bins, weights=np.asarray(data['all_threads'][:], dtype=np.float64),
+                              minlength=total_bins)
+        active = counts > 0
+        mean_threads = np.zeros(total_bins)
+        mean_threads[active] = threads[active] / counts[active]
+        threads_peak = float(mean_threads[lo:hi].max()) if hi > lo else 0.0
+        if threads_peak > 0:
+            plateau = _longest_run(mean_threads[lo:hi] >= threads_peak * THREAD_PLATEAU_RATIO)
+            if plateau:
+                lo, hi = lo + plateau[0], lo + plateau[1]
+                method.append('threads')
+
+    # 吞吐量突变点: 预热段在窗口前部，收尾段在窗口后部
+    throughput = counts[lo:hi]
+    edge = max(1, int(len(throughput) * EDGE_FRACTION))
+    warmup = mean_shift_point(throughput, 1, edge)
+    if warmup and warmup[2] > 0 and warmup[1] < warmup[2] * (1 - THROUGHPUT_SHIFT_RATIO):
+        lo += warmup[0]
+        method.append('warmup')
+    throughput = counts[lo:hi]
+    cooldown = mean_shift_point(throughput, len(throughput) - edge, len(throughput) - 1)
+    if cooldown and cooldown[1] > 0 and cooldown[2] < cooldown[1] * (1 - THROUGHPUT_SHIFT_RATIO):
+        hi = lo + cooldown[0]
+        method.append('cooldown')
+
+    length = hi - lo
+    reliable = length >= MIN_WINDOW_BINS and length >= total_bins * MIN_WINDOW_FRACTION
+    return {
+        'start_ms': first + lo * BIN_MS,
+        'end_ms': first + hi * BIN_MS,
+        'start_offset_s': lo,
+        'end_offset_s': hi,
+        'duration_s': length,
+        'total_duration_s': total_bins,
+        'trimmed_head_s': lo,
+        'trimmed_tail_s': total_bins - hi,
+        'threads_peak': threads_peak,
+        'steady_throughput': float(counts[lo:hi].mean()) if length > 0 else None,
+        'method': '+'.join(method),
+        'reliable': bool(reliable)
+    }
+
+
+def steady_mask(data, window):
+    """Boolean mask of the samples that started inside the window"""
+    timestamps = np.asarray(data['timeStamp'][:], dtype=np.int64)
+    return (timestamps >= window['start_ms']) & (timestamps < window['end_ms'])
+
+
+def steady_statistics(data, **kwargs):
+    """Steady-state window and the statistics recomputed over it
+
+    Returns:
+        tuple: (窗口, 稳态统计, 样本数) 或 (None, None, 0)
+    """
+    window = detect_steady_window(data)
+    if window is None or window['duration_s'] <= 0:
+        return window, None, 0
+    mask = steady_mask(data, window)
+    statistics = compute_statistics(data, mask=mask, **kwargs)
+    window['samples'] = int(mask.sum())
+    window['total_samples'] = int(data.rows)
+    return window, statistics, window['samples']
+
+
+def write_steady_window(window, report_dir):
+    path = os.path.join(str(report_dir), STEADY_WINDOW_FILE)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(window, f, indent=2)
+    os.replace(tmp_file, path)
+    return path
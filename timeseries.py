@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# 多分辨率时间序列（响应时间、吞吐量、活动线程数随时间变化）
+#
+# 测试结束后从列式 JTL 预先计算 1s / 10s / 1min / 10min 四级汇总。每级中每个标签
+# （另加 Total）每个时间桶保存样本数、错误数、响应时间总和、最小、最大，以及一个
+# 可合并的百分位草图（histogram.py 的直方图桶，只保存非空桶）。粗粒度级别和 Total
+# 都由已有的汇总合并得到，不再读取原始样本。结果保存在 JTL 旁边的
+# <运行ID>.timeseries.npz，查询时按标签和时间范围切片，长时间测试的图表
+# 也可以按需缩放。
+
+import os
+
+import numpy as np
+
+from histogram import bucket_index, bucket_upper_value
+
+TIMESERIES_SUFFIX = '.timeseries.npz'
+FORMAT_VERSION = 1
+TOTAL_LABEL = 'Total'
+# 级别名称 -> 时间桶宽度（秒）
+RESOLUTIONS = (('1s', 1), ('10s', 10), ('1m', 60), ('10m', 600))
+PERCENTS = (50, 90, 95, 99)
+# resolution=auto 时选择点数不超过该值的最细级别
+MAX_POINTS = 1500
+_BUCKET_BITS = 16
+
+
+def timeseries_path(jtl_file):
+    """File holding the time-series pyramid of a JTL"""
+    base = str(jtl_file)
+    if base.endswith('.jtl'):
+        base = base[:-4]
+    return base + TIMESERIES_SUFFIX
+
+
+def is_timeseries_fresh(path, jtl_file):
+    """True if the saved pyramid is newer than the JTL and has the current format"""
+    path = str(path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(str(jtl_file)):
+        return False
+    with np.load(path) as data:
+        return 'version' in data.files and int(data['version']) == FORMAT_VERSION
+
+
+def _merge(keys, level, entry_rows):
+    """Merge the rows of a level that map to the same key
+
+    level 为 (count, errors, sum, min, max, sketch_bucket, sketch_count)，草图条目通过
+    entry_rows 指向所属的行。
+
+    Returns:
+        tuple: (唯一键, (count, errors, sum, min, max, sketch_offsets, sketch_bucket, sketch_count))
+    """
+    count, errors, total, low, high, sketch_bucket, sketch_count = level
+    unique, inverse = np.unique(keys, return_inverse=True)
+    size = len(unique)
+    merged_min = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+    merged_max = np.zeros(size, dtype=np.int64)
+    np.minimum.at(merged_min, inverse, low)
+    np.maximum.at(merged_max, inverse, high)
+
+    # 草图按 (新行, 桶) 合并，合并后按行、桶有序
+    entry_keys = (inverse[entry_rows] << _BUCKET_BITS) + sketch_bucket
+    entry_unique, entry_inverse = np.unique(entry_keys, return_inverse=True)
+    counts = np.bincount(entry_inverse, weights=sketch_count, minlength=len(entry_unique))
+    return unique, (
+        np.bincount(inverse, weights=count, minlength=size).astype(np.int64),
+        np.bincount(inverse, weights=errors, minlength=size).astype(np.int64),
+        np.bincount(inverse, weights=total, minlength=size),
+        merged_min,
+        merged_max,
+        np.searchsorted(entry_unique >> _BUCKET_BITS, np.arange(size + 1)).astype(np.int64),
+        (entry_unique & ((1 << _BUCKET_BITS) - 1)).astype(np.uint16),
+        counts.astype(np.uint32)
+    )
+
+
+def _entry_rows(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def build_timeseries(data):
+    """Compute the time-series pyramid of a run
+
+    Args:
+        data: jtl_store.ColumnarJtl
+
+    Returns:
+        dict: 可直接用 np.savez 保存的数组；没有样本时返回 None
+    """
+    if data.rows == 0:
+        return None
+    timestamps = np.asarray(data['timeStamp'][:], dtype=np.int64)
+    start = int(timestamps.min()) // 1000 * 1000
+    seconds = (timestamps - start) // 1000
+    span = int(seconds.max()) + 1
+    labels = list(data.categories['label']) + [TOTAL_LABEL]
+    total_code = len(labels) - 1
+    elapsed = np.asarray(data['elapsed'][:], dtype=np.int64)
+    failed = ~np.asarray(data['success'][:], dtype=bool)
+    ones = np.ones(data.rows)
+
+    # 1s 级别: 键为 标签 * 时间桶数 + 秒
+    keys = np.asarray(data['label'][:], dtype=np.int64) * span + seconds
+    keys, level = _merge(keys, (ones, failed, elapsed, elapsed, elapsed, bucket_index(elapsed), ones),
+                         np.arange(data.rows))
+
+    result = {'version': np.int32(FORMAT_VERSION), 'labels': np.array(labels, dtype=np.str_),
+              'start': np.int64(start)}
+    # 活动线程数: 每秒 allThreads 的平均值，粗粒度级别取时间桶内各秒的最大值
+    thread_seconds = None
+    if 'all_threads' in data:
+        counts = np.bincount(seconds, minlength=span)
+        sums = np.bincount(seconds, weights=np.asarray(data['all_threads'][:], dtype=np.float64), minlength=span)
+        thread_seconds = np.flatnonzero(counts)
+        thread_values = sums[thread_seconds] / counts[thread_seconds]
+
+    slots, previous = span, 1
+    for name, width in RESOLUTIONS:
+        if width != previous:
+            # 由上一级合并，只需要重新映射时间桶
+            new_slots = -(-span // width)
+            keys, level = _merge(keys // slots * new_slots + keys % slots * previous // width,
+                                 level[:5] + level[6:], _entry_rows(level[5]))
+            slots, previous = new_slots, width
+        # Total 由各标签的同一时间桶合并，键都大于标签行，拼接后仍然有序
+        total_keys, total = _merge(total_code * slots + keys % slots, level[:5] + level[6:],
+                                   _entry_rows(level[5]))
+        offset = level[5][-1]
+        columns = [np.concatenate([a, b]) for a, b in zip(level, total)]
+        columns[5] = np.concatenate([level[5], total[5][1:] + offset])
+        all_keys = np.concatenate([keys, total_keys])
+        result.update({
+            f'{name}_label': (all_keys // slots).astype(np.int32),
+            f'{name}_time': start + all_keys % slots * width * 1000,
+            f'{name}_count': columns[0],
+            f'{name}_errors': columns[1],
+            f'{name}_sum': columns[2],
+            f'{name}_min': columns[3],
+            f'{name}_max': columns[4],
+            f'{name}_sketch_offsets': columns[5],
+            f'{name}_sketch_bucket': columns[6],
+            f'{name}_sketch_count': columns[7]
+        })
+        if thread_seconds is not None:
+            unique, first = np.unique(thread_seconds // width, return_index=True)
+            result[f'{name}_threads_time'] = start + unique * width * 1000
+            result[f'{name}_threads'] = np.maximum.reduceat(thread_values, first)
+    return result
+
+
+def write_timeseries(pyramid, path):
+    path = str(path)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.savez_compressed(f, **pyramid)
+    os.replace(tmp_file, path)
+    return path
+
+
+class TimeSeries:
+    """Read access to a saved time-series pyramid"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._data = np.load(self.path)
+        self.labels = self._data['labels'].tolist()
+        self.start = int(self._data['start'])
+        self._cache = {}
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _array(self, name):
+        array = self._cache.get(name)
+        if array is None:
+            array = self._cache[name] = self._data[name]
+        return array
+
+    def pick_resolution(self, time_from, time_to, max_points=MAX_POINTS):
+        """Finest resolution whose point count over the range stays within max_points"""
+        span_s = max(1.0, (time_to - time_from) / 1000.0)
+        for name, width in RESOLUTIONS:
+            if span_s / width <= max_points:
+                return name
+        return RESOLUTIONS[-1][0]
+
+    def time_range(self):
+        times = self._array('1s_time')
+        return int(times.min()), int(times.max()) + 1000
+
+    def series(self, label, resolution, time_from=None, time_to=None, percents=PERCENTS):
+        """Points of one label within [time_from, time_to) (epoch ms)"""
+        if label not in self.labels:
+            return None
+        width_ms = dict(RESOLUTIONS)[resolution] * 1000
+        code = self.labels.index(label)
+        codes = self._array(f'{resolution}_label')
+        lo, hi = np.searchsorted(codes, code), np.searchsorted(codes, code, side='right')
+        times = self._array(f'{resolution}_time')[lo:hi]
+        # 包含与范围有重叠的时间桶
+        first = lo + (np.searchsorted(times, time_from - width_ms + 1) if time_from is not None else 0)
+        last = lo + (np.searchsorted(times, time_to) if time_to is not None else len(times))
+        rows = slice(first, last)
+        count = self._array(f'{resolution}_count')[rows]
+        point = {
+            'time': self._array(f'{resolution}_time')[rows].tolist(),
+            'count': count.tolist(),
+            'errors': self._array(f'{resolution}_errors')[rows].tolist(),
+            'throughput': (count / (width_ms / 1000.0)).round(3).tolist(),
+            'mean': (self._array(f'{resolution}_sum')[rows] / np.maximum(count, 1)).round(2).tolist(),
+            'min': self._array(f'{resolution}_min')[rows].tolist(),
+            'max': self._array(f'{resolution}_max')[rows].tolist()
+        }
+        point.update(self._percentiles(resolution, first, last, percents))
+        return point
+
+    def _percentiles(self, resolution, first, last, percents):
+        """Percentiles of rows first..last from their sketches, vectorized over rows"""
+        offsets = self._array(f'{resolution}_sketch_offsets')[first:last + 1]
+        if len(offsets) < 2:
+            return {f'p{percent:g}': [] for percent in percents}
+        buckets = self._array(f'{resolution}_sketch_bucket')[offsets[0]:offsets[-1]]
+        cumulative = np.cumsum(self._array(f'{resolution}_sketch_count')[offsets[0]:offsets[-1]], dtype=np.int64)
+        local = offsets - offsets[0]
+        base = np.concatenate([[0], cumulative])[local[:-1]]
+        totals = np.concatenate([[0], cumulative])[local[1:]] - base
+        result = {}
+        for percent in percents:
+            rank = np.maximum(np.ceil(totals * percent / 100.0).astype(np.int64), 1)
+            index = np.minimum(np.searchsorted(cumulative, base + rank), len(buckets) - 1)
+            result[f'p{percent:g}'] = bucket_upper_value(buckets[index].astype(np.int64)).tolist()
+        return result
+
+    def threads(self, resolution, time_from=None, time_to=None):
+        name = f'{resolution}_threads_time'
+        if name not in self._data.files:
+            return None
+        times = self._array(name)
+        width_ms = dict(RESOLUTIONS)[resolution] * 1000
+        first = np.searchsorted(times, time_from - width_ms + 1) if time_from is not None else 0
+        last = np.searchsorted(times, time_to) if time_to is not None else len(times)
+        return {'time': times[first:last].tolist(),
+                'threads': self._array(f'{resolution}_threads')[first:last].round(2).tolist()}
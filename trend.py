@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# 多次测试趋势分析
+#
+# 同一个 JMX 在不同并发数下的多次测试，按并发数对齐成"并发数 - 吞吐量/响应时间/
+# 错误率"曲线（总体和各个标签），并找出吞吐量的饱和拐点。数据来自报告索引中已
+# 保存的汇总指标，不重新读取各报告的 statistics.json。
+
+import numpy as np
+
+from report_index import METRIC_COLUMNS
+
+TOTAL_LABEL = 'Total'
+AGGREGATES = ('median', 'latest', 'best')
+# 吞吐量增量低于初始斜率的该比例时视为已饱和
+SATURATION_SLOPE_RATIO = 0.1
+
+
+def _as_array(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+
+def _to_list(values, digits=3):
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+def group_runs(runs, aggregate='median'):
+    """Group runs by user count
+
+    Args:
+        runs: 报告索引记录，需要 users 和 date
+        aggregate: median 取各指标中位数; latest 取最近一次; best 取吞吐量最高的一次
+
+    Returns:
+        list: [(并发数, [同一并发数的记录, ...], 代表记录或 None), ...]，按并发数升序；
+              median 时代表记录为 None，由调用方按指标取中位数
+    """
+    groups = {}
+    for run in runs:
+        if run.get('users') is not None:
+            groups.setdefault(run['users'], []).append(run)
+    result = []
+    for users in sorted(groups):
+        members = sorted(groups[users], key=lambda run: run['date'])
+        if aggregate == 'latest':
+            chosen = members[-1]
+        elif aggregate == 'best':
+            chosen = max(members, key=lambda run: run.get('throughput') or 0)
+        else:
+            chosen = None
+        result.append((users, members, chosen))
+    return result
+
+
+def _curves(groups, metrics_of):
+    """Metric curves of one label, one value per user-count group"""
+    curves = {}
+    for column in METRIC_COLUMNS:
+        values = []
+        for _, members, chosen in groups:
+            if chosen is not None:
+                values.append((metrics_of(chosen) or {}).get(column))
+                continue
+            samples = _as_array([(metrics_of(run) or {}).get(column) for run in members])
+            samples = samples[~np.isnan(samples)]
+            values.append(float(np.median(samples)) if samples.size else None)
+        curves[column] = _as_array(values)
+    return curves
+
+
+def find_knee(users, throughput):
+    """Saturation knee of a users-vs-throughput curve
+
+    先用 Kneedle 方法（归一化后离首尾连线最远的点）找拐点；峰值之前点数不足时退回到
+    "吞吐量增量低于初始斜率 10%" 的第一个点。
+
+    Returns:
+        dict 或 None: {'users', 'throughput', 'index', 'method'}
+    """
+    users = np.asarray(users, dtype=float)
+    throughput = np.asarray(throughput, dtype=float)
+    valid = ~np.isnan(throughput)
+    if valid.sum() < 3:
+        return None
+    index_map = np.flatnonzero(valid)
+    x = users[valid]
+    y = throughput[valid]
+    # 超过峰值之后的下降部分不参与拐点计算
+    peak = int(np.argmax(y))
+    if peak >= 2:
+        x_range = x[peak] - x[0]
+        y_range = y[peak] - y[0]
+        if x_range > 0 and y_range > 0:
+            x_norm = (x[:peak + 1] - x[0]) / x_range
+            y_norm = (y[:peak + 1] - y[0]) / y_range
+            difference = y_norm - x_norm
+            knee = int(np.argmax(difference))
+            if difference[knee] > 0:
+                return {'users': int(x[knee]), 'throughput': round(float(y[knee]), 3),
+                        'index': int(index_map[knee]), 'method': 'kneedle'}
+    slopes = np.diff(y) / np.maximum(np.diff(x), 1)
+    if slopes[0] <= 0:
+        return {'users': int(x[0]), 'throughput': round(float(y[0]), 3),
+                'index': int(index_map[0]), 'method': 'slope'}
+    flat = np.flatnonzero(slopes < slopes[0] * SATURATION_SLOPE_RATIO)
+    if not flat.size:
+        return None
+    knee = int(flat[0])
+    return {'users': int(x[knee]), 'throughput': round(float(y[knee]), 3),
+            'index': int(index_map[knee]), 'method': 'slope'}
+
+
+def latency_knee(users, latency, factor=2.0):
+    """First user count whose latency exceeds `factor` times the lowest-load latency"""
+    latency = np.asarray(latency, dtype=float)
+    valid = np.flatnonzero(~np.isnan(latency))
+    if valid.size < 2 or latency[valid[0]] <= 0:
+        return None
+    over = valid[latency[valid] > latency[valid[0]] * factor]
+    if not over.size:
+        return None
+    index = int(over[0])
+    return {'users': int(users[index]), 'value': round(float(latency[index]), 3), 'index': index,
+            'baseline': round(float(latency[valid[0]]), 3), 'factor': factor}
+
+
+def summarize(users, curves):
+    """Knee, peak throughput and latency knee of one label's curves"""
+    throughput = curves['throughput']
+    summary = {'knee': find_knee(users, throughput), 'max_throughput': None,
+               'latency_knee': latency_knee(users, curves['p95'])}
+    if not np.all(np.isnan(throughput)):
+        peak = int(np.nanargmax(throughput))
+        summary['max_throughput'] = {'users': int(users[peak]),
+                                     'throughput': round(float(throughput[peak]), 3), 'index': peak}
+    return summary
+
+
+def build_trend(runs, label_metrics=None, labels=None, aggregate='median'):
+    """N-way trend of many runs of the same test plan
+
+    Args:
+        runs: 报告索引记录（含 Total 指标）
+        label_metrics: {目录名: {标签: 指标}}，为 None 时只计算 Total
+        labels: 只输出这些标签，为 None 时输出所有出现过的标签
+        aggregate: 同一并发数有多次测试时的取值方式，见 group_runs
+
+    Returns:
+        dict: users、各标签的曲线和拐点、参与计算的测试列表
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"aggregate must be one of {', '.join(AGGREGATES)}")
+    groups = group_runs(runs, aggregate)
+    users = np.array([group[0] for group in groups], dtype=float)
+    label_metrics = label_metrics or {}
+    if labels is None:
+        names = set()
+        for metrics in label_metrics.values():
+            names.update(metrics)
+        labels = sorted(names)
+
+    series = {TOTAL_LABEL: _curves(groups, lambda run: run)}
+    for label in labels:
+        if label == TOTAL_LABEL:
+            continue
+        series[label] = _curves(groups, lambda run: label_metrics.get(run['dir_name'], {}).get(label))
+
+    result = {
+        'aggregate': aggregate,
+        'users': [int(value) for value in users],
+        'runs': [{'users': group[0],
+                  'dir_names': [run['dir_name'] for run in group[1]],
+                  'selected': group[2]['dir_name'] if group[2] is not None else None}
+                 for group in groups],
+        'labels': {}
+    }
+    for label, curves in series.items():
+        entry = {column: _to_list(values) for column, values in curves.items()}
+        entry.update(summarize(users, curves))
+        result['labels'][label] = entry
+    return result